@@ -279,7 +279,7 @@ class _ACQ2106_423ST(MDSplus.Device):
     STOP=stop
 
     def trig(self):
-        uut = acq400_hapi.Acq400(self.node.data(), monitor=False)
+        uut = acq400_hapi.Acq400(self.node.data(), monitor=False, lazy=True)
         uut.s0.set_knob('soft_trigger','1')
     TRIG=trig
 
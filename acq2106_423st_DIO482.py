@@ -307,7 +307,7 @@ class _ACQ2106_423ST_DIO482(MDSplus.Device):
     INIT=init
 
     def stop(self):
-        uut = acq400_hapi.Acq400(self.node.data(), monitor=False)
+        uut = acq400_hapi.Acq400(self.node.data(), monitor=False, lazy=True)
 
         uut.s0.set_abort = '1'
 
@@ -325,7 +325,7 @@ class _ACQ2106_423ST_DIO482(MDSplus.Device):
 
     def trig(self, msg=''):
         message = str(msg)
-        uut = acq400_hapi.Acq400(self.node.data(), monitor=False)
+        uut = acq400_hapi.Acq400(self.node.data(), monitor=False, lazy=True)
         print("The message is: %s" %message)
 
         #wrtdtx = '1 --tx_id=' + message +' tx_immediate'  #triggered at once (equivalent to soft-trigger)
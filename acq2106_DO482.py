@@ -102,14 +102,14 @@ class ACQ2106_DO482(MDSplus.Device):
     STOP=stop
 
     def load_stl_file(self):
-        uut = acq400_hapi.Acq400(self.node.data(), monitor=False)
+        uut = acq400_hapi.Acq400(self.node.data(), monitor=False, lazy=True)
         print('Path to State Table: ', self.stl_file.data())
 
         with open(self.stl_file.data(), 'r') as fp:
             uut.load_wrpg(fp.read(), uut.s0.trace)
 
     def run_wrpg(self):
-        uut = acq400_hapi.Acq400(self.node.data(), monitor=False)
+        uut = acq400_hapi.Acq400(self.node.data(), monitor=False, lazy=True)
         self.load_stl_file()
 
     def set_stl(self):
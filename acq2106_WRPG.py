@@ -90,7 +90,7 @@ class ACQ2106_WRPG(MDSplus.Device):
         stl_table = self.stl_file.data()    
 
         print('Path to State Table: {}'.format(stl_table))
-        uut = acq400_hapi.Acq400(self.node.data(), monitor=False)
+        uut = acq400_hapi.Acq400(self.node.data(), monitor=False, lazy=True)
         uut.s0.trace = traces
         
         print('Loading STL table into WRPG')
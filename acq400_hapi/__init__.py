@@ -1,7 +1,20 @@
 from .netclient import Netclient
 from .netclient import Siteclient
 from .netclient import Logclient
+from .netclient import KnobCache
+from .netclient import KnobBatch
+from .netclient import SchemaCache
+from .netclient import RttHistogram, RttStats
 from .acq400 import Acq400, STATE, AcqPorts, ChannelClient, MgtDramPullClient
+from .acq400 import StreamClient
+from .stream_recorder import StreamRecorder, MultiStreamRecorder, WriteBehind
+from .stream_demux import StreamDemux, demux_files, demux_files_parallel
+from .sample_layout import SampleLayout
+from .event_sample import Bursts, find_es, find_es_file
+from .stream_tee import StreamTee
+from .stream_fanout import StreamFanout
+from .stream_replay import StreamReplay, FileSource, RampSource
+from .uut_emulator import UutEmulator
 from .acq400 import Acq2106
 from .acq400 import Acq2106_Mgtdram8
 from .rad_dds import RAD3DDS
@@ -12,6 +25,12 @@ from .intSIAction import intSI_cvt
 from . import cleanup 
 from . import awg_data
 from .acq400_ui import Acq400UI
+try:
+    from .async_netclient import AsyncNetclient, AsyncSiteclient, AsyncLogclient
+    from .async_acq400 import AsyncAcq400, AsyncChannelClient
+except (ImportError, SyntaxError):
+    # asyncio transport needs Python 3
+    pass
 from . import awg_data
 
 
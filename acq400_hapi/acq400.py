@@ -22,12 +22,16 @@ acq400.py interface to one acq400 appliance instance
 
 import threading
 import re
+import contextlib
 
 import os
 import errno
+import binascii
 import signal
 import sys
 from . import netclient
+from . import event_sample
+from .sample_layout import SampleLayout
 import numpy as np
 import socket
 import timeit
@@ -108,9 +112,168 @@ class Signals:
     MB_CLK_DX = 'd1'
 
 class StreamClient(netclient.Netclient):
-    """handles live streaming data"""
-    def __init__(self, addr):
-        print("worktodo")
+    """handles live streaming data from the stream port.
+
+    Receives with large recv_into() calls into a pool of reusable,
+    fixed size buffers, eg::
+
+        sc = StreamClient(uut, nchan=32, data_size=2)
+        for buf in sc.blocks(0x400000):
+            process(sc.np_block(buf))       # (nsam, nchan) view, no copy
+
+    By default a buffer is recycled when the next block is requested.
+    To keep it longer, use blocks(nbytes, recycle=False) and hand it
+    back with release(buf).
+
+    Args:
+        addr (str) : ip address or dns name
+
+        nchan (int) : channels per sample, for np_block(), default: flat
+
+        data_size : 2|4 short or int
+
+        nbuffers (int) : buffers in the pool, an empty pool allocates another,
+            counted in pool_misses, no data is lost
+
+        port (int) : stream port
+    """
+    def __init__(self, addr, nchan=None, data_size=2, nbuffers=8, port=AcqPorts.STREAM):
+        netclient.Netclient.__init__(self, addr, port)
+        self.nchan = nchan
+        self.data_size = data_size
+        self.dtype = np.dtype('i4' if data_size == 4 else 'i2')
+        self.nbuffers = nbuffers
+        self.pool = []
+        self.pool_lock = threading.Lock()
+        self.buffer_bytes = 0
+        self.maxbuf = 0x400000
+        self.nbytes = 0
+        self.nblocks = 0
+        self.pool_misses = 0
+        self.time0 = None
+
+    def sample_bytes(self):
+        return (self.nchan or 1) * self.data_size
+
+    def get_buffer(self, nbytes):
+        """returns an empty buffer from the pool, allocating if the pool is empty."""
+        with self.pool_lock:
+            if self.buffer_bytes != nbytes:
+                self.pool = [bytearray(nbytes) for ii in range(self.nbuffers)]
+                self.buffer_bytes = nbytes
+            if len(self.pool):
+                return self.pool.pop()
+            self.pool_misses += 1
+        return bytearray(nbytes)
+
+    def release(self, buf):
+        """return a buffer to the pool"""
+        if isinstance(buf, memoryview):
+            buf = buf.obj
+        with self.pool_lock:
+            if len(buf) == self.buffer_bytes and len(self.pool) < self.nbuffers:
+                self.pool.append(buf)
+
+    def fill(self, buf):
+        """receive into buf until full or end of stream, returns bytes received"""
+        view = memoryview(buf)
+        cursor = 0
+        while cursor < len(buf):
+            nrx = self.sock.recv_into(view[cursor:], min(self.maxbuf, len(buf)-cursor))
+            if nrx == 0:
+                break
+            if self.time0 == None:
+                self.time0 = timeit.default_timer()
+            cursor += nrx
+        self.nbytes += cursor
+        return cursor
+
+    def blocks(self, nbytes, recycle=True, maxblocks=0):
+        """generator: yields successive blocks of the stream.
+
+        Args:
+            nbytes (int) : block size, rounded down to whole samples
+
+            recycle=True (bool) : recycle each block on the next iteration
+
+            maxblocks (int) : stop after maxblocks from this call, 0: until
+                end of stream, self.nblocks is the total, for stats()
+
+        Yields:
+            buf : bytearray, or a memoryview for the short last block
+        """
+        nbytes -= nbytes % self.sample_bytes()
+        nblocks = 0
+        while maxblocks == 0 or nblocks < maxblocks:
+            buf = self.get_buffer(nbytes)
+            nrx = self.fill(buf)
+            if nrx == 0:
+                self.release(buf)
+                return
+            nblocks += 1
+            self.nblocks += 1
+            yield buf if nrx == nbytes else memoryview(buf)[:nrx]
+            if recycle:
+                self.release(buf)
+            if nrx < nbytes:
+                return
+
+    def np_block(self, buf):
+        """returns buf as a (nsam, nchan) numpy view, partial samples dropped."""
+        nsam = len(buf) // self.sample_bytes()
+        return np.frombuffer(buf, self.dtype, count=nsam*(self.nchan or 1)).reshape(nsam, self.nchan or 1)
+
+    def arrays(self, nbytes, maxblocks=0):
+        """generator: yields (nsam, nchan) numpy views of successive blocks, recycled."""
+        for buf in self.blocks(nbytes, maxblocks=maxblocks):
+            yield self.np_block(buf)
+
+    def rate(self):
+        """returns throughput in MB/s since the first byte"""
+        if self.time0 == None:
+            return 0.0
+        return self.nbytes/1000000/max(timeit.default_timer() - self.time0, 1e-9)
+
+    def stats(self):
+        return { "bytes": self.nbytes, "blocks": self.nblocks, "pool_misses": self.pool_misses, "MB/s": self.rate() }
+
+def recv_np(sock, nelems, _dtype, maxbuf=0x400000):
+    """receive nelems of _dtype from sock straight into a numpy array.
+
+    Args:
+        nelems (int) : number of elements, <= 0 : read until the end,
+            the buffer grows geometrically.
+
+        maxbuf : max bytes to read per recv_into()
+
+    Returns:
+        np: the elements received, may be short at end of data. A view of
+        the buffer, or a copy if the buffer is mostly unused, so a grown
+        buffer does not hold up to 2x the data.
+    """
+    _dtype = np.dtype(_dtype)
+    known = nelems > 0
+    buf = np.empty(nelems if known else max(maxbuf//_dtype.itemsize, 1), _dtype)
+    bview = buf.view(np.uint8)
+    cursor = 0
+    while True:
+        if cursor == len(bview):
+            if known:
+                break
+            grown = np.empty(2*len(buf), _dtype)
+            grown[:len(buf)] = buf
+            buf = grown
+            bview = buf.view(np.uint8)
+        nrx = sock.recv_into(bview[cursor:], min(maxbuf, len(bview)-cursor))
+        if nrx == 0:
+            break               # end of file
+        cursor += nrx
+
+    n = cursor//_dtype.itemsize
+    if n < len(buf)*3//4:
+        return buf[:n].copy()
+    return buf[:n]
+
 
 class RawClient(netclient.Netclient):
     """ handles raw data from any service port
@@ -129,20 +292,7 @@ class RawClient(netclient.Netclient):
             ncols : optional, to create a 2D array
         """
         _dtype = np.dtype('i4' if data_size == 4 else 'i2')   # hmm, what if unsigned?
-        if nelems <= 0:
-            nelems = 0x80000000             #2GB approximates infinity. what is infinity in python?
-
-        bytestogo = nelems * data_size * ncols
-        total_buf = ""
-
-        while bytestogo > 0:
-            new_buf = self.sock.recv(bytestogo)
-            if not new_buf:
-                break               # end of file
-            bytestogo = bytestogo - len(new_buf)
-            total_buf += new_buf    # still dubious of append :-)
-
-        return np.frombuffer(total_buf, _dtype)
+        return recv_np(self.sock, nelems*ncols, _dtype, maxbuf)
 
     def get_blocks(self, nelems, data_size=2, ncols=1):
         block = np.array([1])
@@ -175,37 +325,19 @@ class ChannelClient(netclient.Netclient):
     def read(self, ndata, data_size=2, maxbuf=0x400000):
         """read ndata from channel data server, return as np array.
         Args:
-            ndata (int): number of elements
+            ndata (int): number of elements, 0 or -1: read until the end
 
             data_size : 2|4 short or int
 
-            maxbuf=4096 : max bytes to read per packet
+            maxbuf=0x400000 : max bytes to read per packet
 
         Returns:
             np: data array 
 
-        * TODO buffer +=
-   
-         this is probably horribly inefficient probably better::
-
-          retbuf = np.array(dtype, ndata)
-          retbuf[cursor].
-
+        Data is received in place into a preallocated array, no copies.
         """
         _dtype = np.dtype('i4' if data_size == 4 else 'i2')
-        total_buffer = buffer = self.sock.recv(maxbuf)
-
-        if int(ndata) == 0 or int(ndata) == -1:
-            while True:
-                buffer = self.sock.recv(maxbuf)
-                if not buffer:
-                    return np.frombuffer(total_buffer, dtype=_dtype, count=-1)
-                total_buffer += buffer
-
-        while len(buffer) < ndata*data_size:
-            buffer += self.sock.recv(maxbuf)
-
-        return np.frombuffer(buffer, dtype=_dtype, count=ndata)
+        return recv_np(self.sock, int(ndata), _dtype, maxbuf)
 
 
 class ExitCommand(Exception):
@@ -335,17 +467,60 @@ class Acq400:
 
         monitor=True (bool) : set false to stub monitor, 
           useful for tracing on a second connection to an active system.
+
+        lazy=False (bool) : set true to connect sites on first use, see prefetch(),
+          useful for scripts that touch only a few knobs.
     """     
 
     def init_site_client(self, site):
-        svc = netclient.Siteclient(self.uut, AcqPorts.SITE0+site)
+        if self.lazy:
+            svc = netclient.LazySiteclient(self.uut, AcqPorts.SITE0+site, fw=self.fw)
+        else:
+            svc = netclient.Siteclient(self.uut, AcqPorts.SITE0+site, fw=self.fw)
         self.svc["s%d" % site] = svc
         self.modules[site] = svc
 
-        if self.awg_site == 0 and svc.module_name.startswith("ao"):
+        if not self.lazy and self.awg_site == 0 and svc.module_name.startswith("ao"):
             self.awg_site = site
         self.mod_count += 1
 
+    def find_awg_site(self):
+        for site in sorted(self.modules):
+            if self.modules[site].module_name.startswith("ao"):
+                return site
+        return 0
+
+    def prefetch(self, sites=None):
+        """connect lazy site services now, concurrently.
+
+        Args:
+            sites (list) : site numbers or service names eg [1, 'cA'], default: all
+        """
+        if sites == None:
+            sxs = list(self.svc.keys())
+        else:
+            sxs = [s if isinstance(s, str) else "s%d" % s for s in sites]
+        missing = []
+
+        def connect(sx):
+            try:
+                self.svc[sx].connect()
+            except socket.error:
+                print("uut {} service {} not populated".format(self.uut, sx))
+                missing.append(sx)
+
+        connectors = [threading.Thread(target=connect, args=(sx,))
+                        for sx in sxs if isinstance(self.svc[sx], netclient.LazySiteclient)]
+        for t in connectors:
+            t.start()
+        for t in connectors:
+            t.join(10.0)
+        # as eager mode: unpopulated sites are not in svc
+        for sx in missing:
+            svc = self.svc.pop(sx)
+            for site in [site for (site, m) in self.modules.items() if m is svc]:
+                del self.modules[site]
+
 
     @classmethod
     def create_uuts(cls, uut_names):
@@ -369,9 +544,10 @@ class Acq400:
         return uuts
 
     
-    def __init__(self, _uut, monitor=True):
+    def __init__(self, _uut, monitor=True, lazy=False):
         self.NL = re.compile(r"(\n)")
         self.uut = _uut
+        self.lazy = lazy
         self.trace = 0
         self.save_data = None
         self.svc = {}
@@ -383,9 +559,16 @@ class Acq400:
         self.mb_clk_min = 4000000
         
         s0 = self.svc["s0"] = netclient.Siteclient(self.uut, AcqPorts.SITE0)
+        # firmware version keys the knob schema cache for all sites
+        self.fw = s0.schema_key[3] if s0.schema_key != None else None
         sl = s0.SITELIST.split(",")
         sl.pop(0)
-        self.awg_site = 0
+        # lazy: awg_site is found on first load_awg()
+        self.awg_site = None if lazy else 0
+        if lazy:
+            for sm in sl:
+                self.init_site_client(int(sm.split("=").pop(0)))
+            sl = []
         site_enumerators = {} 
         for sm in sl:
             site_enumerators[sm] = \
@@ -399,9 +582,9 @@ class Acq400:
 #            print("join {}".format(site_enumerators[sm]))
             site_enumerators[sm].join(10.0)
 
-# init _status so that values are valid even if this Acq400 doesn't run a shot ..
-        _status = [int(x) for x in s0.state.split(" ")]
         if monitor:
+# init _status so that values are valid even if this Acq400 doesn't run a shot ..
+            _status = [int(x) for x in s0.state.split(" ")]
             self.statmon = Statusmonitor(self.uut, _status)        
 
 
@@ -412,6 +595,50 @@ class Acq400:
             msg = "'{0}' object has no attribute '{1}'"
             raise AttributeError(msg.format(type(self).__name__, name))
 
+    def enable_cache(self, ttls=netclient.KnobCache.DEFAULT_TTLS):
+        """cache slow-changing knobs on all site services, see netclient.KnobCache
+
+        a lazy site not yet connected enables its cache when it connects.
+        """
+        for svc in self.svc.values():
+            svc.enable_cache(ttls)
+
+    def connected_svc(self):
+        """returns dict of the site services connected, all but idle lazy sites"""
+        return dict((sx, svc) for (sx, svc) in self.svc.items()
+                    if not isinstance(svc, netclient.LazySiteclient) or svc.connected())
+
+    @contextlib.contextmanager
+    def batch(self, *sx):
+        """context: queue knob writes on services sx (default: all),
+        sent on exit in the order they were made, one write per run of
+        writes to the same service, see Siteclient.batch(), KnobBatch
+
+        eg::
+
+            with uut.batch('s0', 's1'):
+                uut.s0.transient = "PRE=0 POST=100000"
+                uut.s1.TRG = 1
+        """
+        # sx named: connect lazy sites to batch them, else idle lazy sites are left idle
+        svcs = [self.svc[s] for s in sx if s in self.svc] if len(sx) else list(self.connected_svc().values())
+        batch = netclient.KnobBatch()
+        began = [svc for svc in svcs if svc.begin_batch(batch)]
+        try:
+            yield
+        finally:
+            for svc in began:
+                svc.end_batch()
+
+    def cache_stats(self):
+        """returns dict of KnobCache stats per service"""
+        return dict((sx, svc.cache.stats()) for (sx, svc) in self.connected_svc().items() if svc.cache != None)
+
+    def create_stream_client(self, nbuffers=8):
+        """returns a StreamClient set up with this uut's NCHAN and data32"""
+        return StreamClient(self.uut, nchan=self.nchan(),
+                            data_size=(4 if self.s0.data32 == '1' else 2), nbuffers=nbuffers)
+
     def state(self):
         return self.statmon.status[SF.STATE]
     def post_samples(self):
@@ -467,11 +694,13 @@ class Acq400:
         return np.add(np.multiply(raw, eslo), eoff)
 
 
-    def read_chan(self, chan, nsam = 0):
+    def read_chan(self, chan, nsam = 0, data32 = None):
         if chan != 0 and nsam == 0:
             nsam = self.pre_samples()+self.post_samples()
-        cc = ChannelClient(self.uut, chan)
-        ccraw = cc.read(nsam, data_size=(4 if self.s0.data32 == '1' else 2))
+        if data32 == None:
+            data32 = self.s0.data32
+        with ChannelClient(self.uut, chan) as cc:
+            ccraw = cc.read(nsam, data_size=(4 if data32 == '1' else 2))
 
         if self.save_data:
             try:                
@@ -488,11 +717,20 @@ class Acq400:
     def nchan(self):
         return int(self.s0.NCHAN)
 
-    def read_channels(self, channels=(), nsam=0):
+    max_inflight = int(os.getenv("ACQ400_MAX_INFLIGHT", "1"))
+
+    def read_channels(self, channels=(), nsam=0, max_inflight=None, budget=None):
         """read all channels post shot data.
 
+        Args:
+            max_inflight (int) : max channels to upload concurrently,
+              default Acq400.max_inflight (env ACQ400_MAX_INFLIGHT), 1: serial
+
+            budget (threading.Semaphore) : optional connection limit shared
+              with other uploads, eg across UUTs
+
         Returns:
-            chx (list) of np arrays.
+            chx (list) of np arrays, in channel order.
         """
 
 
@@ -503,18 +741,61 @@ class Acq400:
 
     #      print("channels {}".format(channels))
 
-        chx = []
-        for ch in channels:
+        if max_inflight == None:
+            max_inflight = self.max_inflight
+        # query once: Siteclient is not thread safe
+        data32 = self.s0.data32
+        chx = [None] * len(channels)
+        time0 = timeit.default_timer()
+
+        def read1(ix):
+            ch = channels[ix]
             if self.trace:
                 print("%s CH%02d start.." % (self.uut, ch))
                 start = timeit.default_timer()
 
-            chx.append(self.read_chan(ch, nsam))
+            if budget != None:
+                with budget:
+                    chx[ix] = self.read_chan(ch, nsam, data32)
+            else:
+                chx[ix] = self.read_chan(ch, nsam, data32)
 
             if self.trace:
                 tt = timeit.default_timer() - start
                 print("%s CH%02d complete.. %.3f s %.2f MB/s" %
-                      (self.uut, ch, tt, len(chx[-1])*2/1000000/tt))
+                      (self.uut, ch, tt, chx[ix].nbytes/1000000/tt))
+
+        if max_inflight <= 1 or len(channels) == 1:
+            for ix in range(len(channels)):
+                read1(ix)
+        else:
+            jobs = iter(range(len(channels)))
+            jobs_lock = threading.Lock()
+            errors = []
+
+            def uploader():
+                while not errors:
+                    with jobs_lock:
+                        ix = next(jobs, None)
+                    if ix == None:
+                        return
+                    try:
+                        read1(ix)
+                    except Exception as e:
+                        errors.append(e)
+
+            uploaders = [threading.Thread(target=uploader) for t in range(min(max_inflight, len(channels)))]
+            for t in uploaders:
+                t.start()
+            for t in uploaders:
+                t.join()
+            if errors:
+                raise errors[0]
+
+        if self.trace:
+            tt = timeit.default_timer() - time0
+            print("%s read_channels %d channels complete.. %.3f s %.2f MB/s" %
+                  (self.uut, len(chx), tt, sum([c.nbytes for c in chx])/1000000/tt))
 
         return chx
 
@@ -561,27 +842,28 @@ class Acq400:
 
     def set_mb_clk(self, hz=4000000, src="zclk", fin=1000000):
         hz = int(hz)
-        if src == "zclk":
-            self.s0.SIG_ZCLK_SRC = "INT33M"
-            self.s0.SYS_CLK_FPMUX = "ZCLK"
-            self.s0.SIG_CLK_MB_FIN = 33333000
-        elif src == "xclk":
-            self.s0.SYS_CLK_FPMUX = "XCLK"
-            self.s0.SIG_CLK_MB_FIN = 32768000
-        else:
-            self.s0.SYS_CLK_FPMUX = "FPCLK"
-            self.s0.SIG_CLK_MB_FIN = fin
+        with self.batch('s0', 's1'):
+            if src == "zclk":
+                self.s0.SIG_ZCLK_SRC = "INT33M"
+                self.s0.SYS_CLK_FPMUX = "ZCLK"
+                self.s0.SIG_CLK_MB_FIN = 33333000
+            elif src == "xclk":
+                self.s0.SYS_CLK_FPMUX = "XCLK"
+                self.s0.SIG_CLK_MB_FIN = 32768000
+            else:
+                self.s0.SYS_CLK_FPMUX = "FPCLK"
+                self.s0.SIG_CLK_MB_FIN = fin
 
-        if hz >= self.mb_clk_min:
-            self.s0.SIG_CLK_MB_SET = hz
-            self.s1.CLKDIV = '1'
-        else:
-            for clkdiv in range(1,2000):
-                if hz*clkdiv >= self.mb_clk_min:
-                    self.s0.SIG_CLK_MB_SET = hz*clkdiv
-                    self.s1.CLKDIV = clkdiv
-                    return
-            raise ValueError("frequency out of range {}".format(hz))
+            if hz >= self.mb_clk_min:
+                self.s0.SIG_CLK_MB_SET = hz
+                self.s1.CLKDIV = '1'
+            else:
+                for clkdiv in range(1,2000):
+                    if hz*clkdiv >= self.mb_clk_min:
+                        self.s0.SIG_CLK_MB_SET = hz*clkdiv
+                        self.s1.CLKDIV = clkdiv
+                        return
+                raise ValueError("frequency out of range {}".format(hz))
 
     def load_stl(self, stl, port, trace = False, wait_eof = False):
         termex = re.compile("\n")
@@ -631,6 +913,8 @@ class Acq400:
             return repr(self.value)
 
     def load_awg(self, data, autorearm=False):
+        if self.awg_site == None:
+            self.awg_site = self.find_awg_site()
         if self.awg_site > 0:
             if self.modules[self.awg_site].task_active == '1':
                 raise self.AwgBusyError("awg busy")
@@ -689,25 +973,26 @@ class Acq400:
         Default post samples: 100k.
         """
         print(trigger)
-        self.s0.transient = "PRE=0 POST={} SOFT_TRIGGER={}".format(post, trigger[1])
+        with self.batch('s0', 's1'):
+            self.s0.transient = "PRE=0 POST={} SOFT_TRIGGER={}".format(post, trigger[1])
 
-        self.s1.TRG = 1
-        if role == "slave" or trigger[1] == 0:
-            self.s1.TRG_DX = 0
-        else:
-            self.s1.TRG_DX = 1
-        self.s1.TRG_SENSE = trigger[2]
+            self.s1.TRG = 1
+            if role == "slave" or trigger[1] == 0:
+                self.s1.TRG_DX = 0
+            else:
+                self.s1.TRG_DX = 1
+            self.s1.TRG_SENSE = trigger[2]
 
-        self.s1.EVENT0 = 0
-        self.s1.EVENT0_DX = 0
-        self.s1.EVENT0_SENSE = 0
+            self.s1.EVENT0 = 0
+            self.s1.EVENT0_DX = 0
+            self.s1.EVENT0_SENSE = 0
 
-        self.s1.RGM = 0
-        self.s1.RGM_DX = 0
-        self.s1.RGM_SENSE = 0
+            self.s1.RGM = 0
+            self.s1.RGM_DX = 0
+            self.s1.RGM_SENSE = 0
 
-        self.s1.RGM = 0 # Make sure RGM mode is turned off.
-        self.s0.SIG_EVENT_SRC_0 = 0
+            self.s1.RGM = 0 # Make sure RGM mode is turned off.
+            self.s0.SIG_EVENT_SRC_0 = 0
 
         return None
 
@@ -727,26 +1012,27 @@ class Acq400:
         if pre > post:
             print("PRE samples cannot be greater than POST samples. Config not set.")
             return None
-        trg = 1 if trigger[1] == 1 else 0
-        self.s0.transient = "PRE={} POST={} SOFT_TRIGGER={}".format(pre, post, trg)
+        with self.batch('s0', 's1'):
+            trg = 1 if trigger[1] == 1 else 0
+            self.s0.transient = "PRE={} POST={} SOFT_TRIGGER={}".format(pre, post, trg)
 
-        self.s1.TRG = trigger[0]
-        if role == "slave" or trigger[1] == 0:
-            self.s1.TRG_DX = 0
-        else:
-            self.s1.TRG_DX = 1
-        self.s1.TRG_SENSE = trigger[2]
+            self.s1.TRG = trigger[0]
+            if role == "slave" or trigger[1] == 0:
+                self.s1.TRG_DX = 0
+            else:
+                self.s1.TRG_DX = 1
+            self.s1.TRG_SENSE = trigger[2]
 
-        self.s1.EVENT0 = event[0]
-        self.s1.EVENT0_DX = event[1]
-        self.s1.EVENT0_SENSE = event[2]
+            self.s1.EVENT0 = event[0]
+            self.s1.EVENT0_DX = event[1]
+            self.s1.EVENT0_SENSE = event[2]
 
-        self.s1.RGM = 0
-        self.s1.RGM_DX = 0
-        self.s1.RGM_SENSE = 0
+            self.s1.RGM = 0
+            self.s1.RGM_DX = 0
+            self.s1.RGM_SENSE = 0
 
-        self.s1.RGM = 0 # Make sure RGM mode is turned off.
-        self.s0.SIG_EVENT_SRC_0 = 0
+            self.s1.RGM = 0 # Make sure RGM mode is turned off.
+            self.s0.SIG_EVENT_SRC_0 = 0
         return None
 
 
@@ -767,24 +1053,25 @@ class Acq400:
         then this function can put the GPG output onto the event bus (to use as
         an Event for RTM).
         """
-        self.s0.transient = "PRE=0 POST={}".format(post)
-        self.s1.rtm_translen = rtm_translen
-        self.s1.TRG = 1
-        if role == "slave" or trigger[1] == 0:
-            self.s1.TRG_DX = 0
-        else:
-            self.s1.TRG_DX = 1
-        self.s1.TRG_SENSE = trigger[2]
+        with self.batch('s0', 's1'):
+            self.s0.transient = "PRE=0 POST={}".format(post)
+            self.s1.rtm_translen = rtm_translen
+            self.s1.TRG = 1
+            if role == "slave" or trigger[1] == 0:
+                self.s1.TRG_DX = 0
+            else:
+                self.s1.TRG_DX = 1
+            self.s1.TRG_SENSE = trigger[2]
 
-        self.s1.EVENT0 = event[0]
-        self.s1.EVENT0_DX = event[1]
-        self.s1.EVENT0_SENSE = event[2]
+            self.s1.EVENT0 = event[0]
+            self.s1.EVENT0_DX = event[1]
+            self.s1.EVENT0_SENSE = event[2]
 
-        self.s1.RGM = 3
-        self.s1.RGM_DX = 0
-        self.s1.RGM_SENSE = 1
+            self.s1.RGM = 3
+            self.s1.RGM_DX = 0
+            self.s1.RGM_SENSE = 1
 
-        self.s0.SIG_EVENT_SRC_0 = 1 if gpg == 1 else 0
+            self.s0.SIG_EVENT_SRC_0 = 1 if gpg == 1 else 0
 
         return None
 
@@ -805,23 +1092,24 @@ class Acq400:
         Event for RGM).
 
         """
-        self.s0.transient = "PRE=0 POST={}".format(post)
-        self.s1.TRG = 1
-        if role == "slave" or trigger[1] == 0:
-            self.s1.TRG_DX = 0
-        else:
-            self.s1.TRG_DX = 1
-        self.s1.TRG_SENSE = trigger[2]
+        with self.batch('s0', 's1'):
+            self.s0.transient = "PRE=0 POST={}".format(post)
+            self.s1.TRG = 1
+            if role == "slave" or trigger[1] == 0:
+                self.s1.TRG_DX = 0
+            else:
+                self.s1.TRG_DX = 1
+            self.s1.TRG_SENSE = trigger[2]
 
-        self.s1.EVENT0 = 0#event[0]
-        self.s1.EVENT0_DX = 0#event[1]
-        self.s1.EVENT0_SENSE = 0
+            self.s1.EVENT0 = 0#event[0]
+            self.s1.EVENT0_DX = 0#event[1]
+            self.s1.EVENT0_SENSE = 0
 
-        self.s1.RGM = 2
-        self.s1.RGM_DX = 0
-        self.s1.RGM_SENSE = 1
+            self.s1.RGM = 2
+            self.s1.RGM_DX = 0
+            self.s1.RGM_SENSE = 1
 
-        self.s0.SIG_EVENT_SRC_0 = 1 if gpg == 1 else 0
+            self.s0.SIG_EVENT_SRC_0 = 1 if gpg == 1 else 0
 
         return None
 
@@ -944,7 +1232,57 @@ class Acq400:
         site_types = { "AISITES": AISITES, "AOSITES": AOSITES, "DIOSITES": DIOSITES }
         return site_types
 
-    def get_es_indices(self, file_path="default", nchan="default", human_readable=0, return_hex_string=0):
+    def es_samples(self, file_path="default", nchan="default"):
+        """
+        Returns the muxed data as a (nsam, nlongs) uint32 array, and the long
+        offset of each aggregator site in the sample, from the site widths.
+
+        The data is pulled from the system by default, else file_path is
+        memory mapped, not read in.
+        """
+        nchan = self.nchan() if nchan == "default" else nchan
+        if int(self.s0.data32) == 0:
+            nchan = nchan / 2 # "effective" nchan has halved if data is shorts.
+        nchan = int(nchan)
+
+        if file_path == "default":
+            src = np.array(self.read_muxed_data())
+        else:
+            src = file_path
+        samples = event_sample.as_samples(src, nchan)
+        sites = self.get_aggregator_sites()
+        try:
+            layout = SampleLayout.from_sites(self, sites, self.s0.spad)
+            offsets = event_sample.site_offsets(layout, nchan)
+        except AttributeError:
+            # no NCHAN, data32 on a site: assume equal sites
+            offsets = [ ii * (nchan // len(sites)) for ii in range(len(sites)) ]
+        return samples, offsets
+
+    def find_es(self, file_path="default", nchan="default", chunk=0x4000000, validate_sites=False):
+        """
+        Returns (indices, es), the sample index of each event sample, and a
+        structured array of the ES sample_count, clock_count.
+
+        See get_es_indices() for file_path, nchan. The search is vectorised,
+        chunk bytes at a time, on the magic in the first long of the sample.
+        validate_sites=True also requires the magic at the start of every
+        site, see event_sample.find_es().
+        """
+        samples, sites = self.es_samples(file_path, nchan)
+        return event_sample.find_es_file(samples, samples.shape[1], sites if validate_sites else (0,), chunk=chunk)
+
+    def get_bursts(self, file_path="default", nchan="default", chunk=0x4000000, validate_sites=False):
+        """
+        Returns event_sample.Bursts, the RGM/RTM bursts in the muxed data,
+        see find_es(). Each channel is then a (nburst, blen) view of the
+        samples held in bursts.samples, eg bursts.channel(0).
+        """
+        samples, sites = self.es_samples(file_path, nchan)
+        return event_sample.Bursts.from_samples(samples, sites if validate_sites else (0,), chunk=chunk)
+
+    def get_es_indices(self, file_path="default", nchan="default", human_readable=0, return_hex_string=0,
+                       validate_sites=False):
         """
         Returns the location of event samples.
 
@@ -954,66 +1292,44 @@ class Acq400:
         event sample data straight from the system.
 
         If human_readable is set to 1 then the function will return the hex
-        interpretations of the event sample data. The indices will remain
-        unchanged.
+        interpretations of the event sample data, split equally into one
+        group per aggregator site. The indices will remain unchanged.
 
         If return_hex_string is set to 1 (provided human_readable has ALSO been
         set) then the function will return one single string containing all of
         the event samples.
 
+        validate_sites: see find_es().
+
         Data returned by the function looks like:
         [  [Event sample indices], [Event sample data]  ]
         """
         # a function that return the location of event samples.
         # returns:
         # [ [event sample indices], [ [event sample 1], ...[event sample N] ] ]
-        indices = []
-        event_samples = []
-        nchan = self.nchan() if nchan == "default" else nchan
-
-        if file_path == "default":
-            data = self.read_muxed_data()
-            data = np.array(data)
-            if data.dtype == np.int16:
-                # convert shorts back to raw bytes and then to longs.
-                data = np.frombuffer(data.tobytes(), dtype=np.uint32)
-        else:
-            data = np.fromfile(file_path, dtype=np.uint32)
-
-        if int(self.s0.data32) == 0:
-            nchan = nchan / 2 # "effective" nchan has halved if data is shorts.
-        nchan = int(nchan)
-        for index, sample in enumerate(data[0::nchan]):
-            # if sample == np.int32(0xaa55f154): # aa55
-            if sample == np.uint32(0xaa55f154): # aa55
-                indices.append(index)
-                event_samples.append(data[index*nchan:index*nchan + nchan])
+        samples, sites = self.es_samples(file_path, nchan)
+        indices, es = event_sample.find_es_file(samples, samples.shape[1], sites if validate_sites else (0,))
+        event_samples = list(np.array(samples[indices]))
 
         if human_readable == 1:
-            # Change decimal to hex.
-            ii = 0
-            while ii < len(event_samples):
-                if type(event_samples[ii]) == np.ndarray:
-                    event_samples[ii] = event_samples[ii].tolist()
-                for indice, channel in enumerate(event_samples[ii]):
-                    event_samples[ii][indice] = '0x{0:08X}'.format(channel)
-                ll = int(len(event_samples[ii])/int(len(self.get_aggregator_sites())))
-                # print(event_samples[ii])
-                event_samples[ii] = [event_samples[ii][i:i + ll] for i in range(0, len(event_samples[ii]), ll)]
-                ii += 1
+            # Change decimal to hex, all at once: 8 hex digits per long.
+            digits = binascii.hexlify(np.array(event_samples, dtype='>u4').tobytes()).upper()
+            hexes = np.char.add(b'0x', np.frombuffer(digits, dtype='S8')).astype(str)
+            hexes = hexes.reshape(len(indices), samples.shape[1]).tolist()
+            # equal split, one group per aggregator site
+            ll = int(samples.shape[1]/int(len(self.get_aggregator_sites())))
+            event_samples = [ [row[i:i + ll] for i in range(0, len(row), ll)] for row in hexes ]
 
             if return_hex_string == 1:
                 # Make a single string containing the hex values.
-                es_string = ""
-                for num, sample in enumerate(event_samples):
+                lines = []
+                for sample in event_samples:
                     for i in range(len(sample[0])):
-                        for x in event_samples[num]:
-                            es_string = es_string + str(x[i]) + " "
-                        es_string = es_string + "\n"
-                    es_string = es_string + "\n"
-                event_samples = es_string
+                        lines.append("".join([ str(x[i]) + " " for x in sample ]) + "\n")
+                    lines.append("\n")
+                event_samples = "".join(lines)
 
-        return [indices, event_samples]
+        return [indices.tolist(), event_samples]
 
 
 class Acq2106(Acq400):
@@ -1022,9 +1338,9 @@ class Acq2106(Acq400):
     Defines features specific to ACQ2106
     """
 
-    def __init__(self, _uut, monitor=True, has_dsp=False):
+    def __init__(self, _uut, monitor=True, has_dsp=False, lazy=False):
         print("acq400_hapi.Acq2106 %s" % (_uut))
-        Acq400.__init__(self, _uut, monitor)
+        Acq400.__init__(self, _uut, monitor, lazy)
         self.mb_clk_min = 100000
 
         if has_dsp:
@@ -1033,20 +1349,22 @@ class Acq2106(Acq400):
             sn_map = (('cA', AcqSites.SITE_CA), ('cB', AcqSites.SITE_CB))
 
         for ( service_name, site ) in sn_map:
+            client = netclient.LazySiteclient if lazy else netclient.Siteclient
             try:
-                self.svc[service_name] = netclient.Siteclient(self.uut, AcqPorts.SITE0+site)
+                self.svc[service_name] = client(self.uut, AcqPorts.SITE0+site, fw=self.fw)
             except socket.error:
                 print("uut {} site {} not populated".format(_uut, site))
             self.mod_count += 1
 
     def set_mb_clk(self, hz=4000000, src="zclk", fin=1000000):
         print("set_mb_clk {} {} {}".format(hz, src, fin))
-        Acq400.set_mb_clk(self, hz, src, fin)
-        try:
-            self.s0.SYS_CLK_DIST_CLK_SRC = 'Si5326'
-        except AttributeError:
-            print("SYS_CLK_DIST_CLK_SRC, deprecated")
-        self.s0.SYS_CLK_OE_CLK1_ZYNQ = '1'
+        with self.batch('s0', 's1'):
+            Acq400.set_mb_clk(self, hz, src, fin)
+            try:
+                self.s0.SYS_CLK_DIST_CLK_SRC = 'Si5326'
+            except AttributeError:
+                print("SYS_CLK_DIST_CLK_SRC, deprecated")
+            self.s0.SYS_CLK_OE_CLK1_ZYNQ = '1'
 
     def set_sync_routing_slave(self):
         Acq400.set_sync_routing_slave(self)
@@ -1064,9 +1382,9 @@ class Acq2106_Mgtdram8(Acq2106):
     MGT_BLOCK_BYTES = 0x400000
     MGT_BLOCK_MULTIPLE = 16
 
-    def __init__(self, uut, monitor=True):
+    def __init__(self, uut, monitor=True, lazy=False):
         print("acq400_hapi.Acq2106_MgtDram8 %s" % (uut))
-        Acq2106.__init__(self, uut, monitor, has_dsp=True)
+        Acq2106.__init__(self, uut, monitor, has_dsp=True, lazy=lazy)
 
     def run_mgt(self, _filter = null_filter):
         pm = ProcessMonitor(self.uut, _filter)
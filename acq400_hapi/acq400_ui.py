@@ -80,14 +80,21 @@ class Acq400UI:
     @staticmethod   
     def exec_args(uut, args):
         """ and execute all the args
+
+        The trg and sim sets are independent, each group is batched and
+        flushed before the next, so every set is done, in order, before
+        the caller can arm or trigger.
         """
         print("exec_args" )
         if args.trg:
-            Acq400UI._exec_args_trg(uut, args, args.trg)
+            with uut.batch('s1'):
+                Acq400UI._exec_args_trg(uut, args, args.trg)
         if args.clk:
+            # set_mb_clk() batches its own sets
             Acq400UI._exec_args_clk(uut, args.clk)
         if args.sim:
-            Acq400UI._exec_args_sim(uut, args.sim)
+            with uut.batch(*['s%s' % (site) for site in uut.modules]):
+                Acq400UI._exec_args_sim(uut, args.sim)
         if args.trace:
             Acq400UI._exec_args_trace(uut, args.trace)
             
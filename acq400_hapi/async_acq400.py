@@ -0,0 +1,263 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+async_acq400.py asyncio interface to acq400 appliances
+
+- AsyncAcq400 : awaitable facade for one UUT, one event loop can drive a
+  rack of UUTs without a thread per site or per status monitor.
+- operations on many UUTs are plain gather()s, eg::
+
+       uuts = await AsyncAcq400.create_uuts(["acq2106_001", "acq2106_002"])
+       await asyncio.gather(*[u.s0.set_knob("set_arm", 1) for u in uuts])
+       await asyncio.gather(*[u.statmon.wait_armed() for u in uuts])
+       chx = await asyncio.gather(*[u.read_channels() for u in uuts])
+
+Python 3 only.
+"""
+
+import asyncio
+import os
+
+import numpy as np
+
+from .acq400 import AcqPorts, SF, Statusmonitor
+from .async_netclient import AsyncNetclient, AsyncLogclient, AsyncSiteclient
+
+
+class AsyncChannelClient(AsyncNetclient):
+    """handles post shot data for one channel.
+
+    Args:
+        addr (str) : ip address or dns name
+
+        ch (int) : channel number 1..N
+    """
+    def __init__(self, addr, ch):
+        AsyncNetclient.__init__(self, addr, AcqPorts.DATA0+ch)
+
+    async def read(self, ndata, data_size=2, maxbuf=0x400000):
+        """read ndata from channel data server, return as np array.
+
+        Args:
+            ndata (int): number of elements, 0 or -1: read to end of data
+
+            data_size : 2|4 short or int
+
+        Returns:
+            np: data array
+        """
+        _dtype = np.dtype('i4' if data_size == 4 else 'i2')
+        if int(ndata) > 0:
+            try:
+                buf = await self.reader.readexactly(int(ndata)*data_size)
+            except asyncio.IncompleteReadError as e:
+                buf = e.partial
+        else:
+            buf = bytearray()
+            while True:
+                rx = await self.reader.read(maxbuf)
+                if not rx:
+                    break
+                buf += rx
+        return np.frombuffer(buf, dtype=_dtype, count=len(buf)//data_size)
+
+
+class AsyncStatusmonitor:
+    """ monitors the status channel in a task on the event loop
+
+    wait_armed(), wait_stopped() are awaitable.
+    """
+    st_re = Statusmonitor.st_re
+    trace = int(os.getenv("STATUSMONITOR_TRACE", "0"))
+
+    def __init__(self, _uut, _status):
+        self.uut = _uut
+        self.status = _status
+        self.trace = AsyncStatusmonitor.trace
+        self.armed = asyncio.Event()
+        self.stopped = asyncio.Event()
+        self.error = None
+        self.logclient = None
+        self.task = None
+
+    def __repr__(self):
+        return repr(self.logclient)
+
+    async def start(self):
+        self.logclient = await AsyncLogclient.connect(self.uut, AcqPorts.TSTAT)
+        self.task = asyncio.ensure_future(self.st_monitor())
+
+    async def stop(self):
+        if self.task != None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+        if self.logclient != None:
+            await self.logclient.close()
+
+    async def st_monitor(self):
+        while True:
+            try:
+                st = await self.logclient.poll()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.error = "ERROR: %s status monitor lost %s" % (self.uut, repr(e))
+                print(self.error)
+                # wake any waiters, they raise on error
+                self.armed.set()
+                self.stopped.set()
+                return
+            match = self.st_re.search(st)
+            if match:
+                status1 = [int(x) for x in match.groups()]
+                if self.trace:
+                    print("%s <%s" % (repr(self), status1))
+                if self.status[SF.STATE] != 0 and status1[SF.STATE] == 0:
+                    print("%s STOPPED!" % (self.uut))
+                    self.stopped.set()
+                    self.armed.clear()
+                if status1[SF.STATE] == 1:
+                    print("%s ARMED!" % (self.uut))
+                    self.armed.set()
+                    self.stopped.clear()
+                if self.status[SF.STATE] == 0 and status1[SF.STATE] > 1:
+                    self.error = "ERROR: %s skipped ARM %d -> %d" % (self.uut, self.status[0], status1[0])
+                    print(self.error)
+                    # wake any waiters, they raise on error
+                    self.armed.set()
+                    self.stopped.set()
+                self.status = status1
+            elif self.trace > 1:
+                print("%s <%s>" % (repr(self), st))
+
+    def get_state(self):
+        return self.status[SF.STATE]
+
+    async def wait_event(self, ev, descr):
+        await ev.wait()
+        ev.clear()
+        if self.error != None:
+            raise RuntimeError("wait_%s %s" % (descr, self.error))
+
+    async def wait_armed(self):
+        """ blocks until uut is ARMED """
+        await self.wait_event(self.armed, "armed")
+
+    async def wait_stopped(self):
+        """ blocks until uut is STOPPED """
+        await self.wait_event(self.stopped, "stopped")
+
+
+class AsyncAcq400:
+    """
+    asyncio host-side proxy for Acq400 uut, create with create().
+
+    Site services are AsyncSiteclients, available as uut.sX
+
+    Args:
+        _uut (str) : ip-address or dns name
+    """
+    def __init__(self, _uut):
+        self.uut = _uut
+        self.trace = 0
+        self.svc = {}
+        self.modules = {}
+        self.mod_count = 0
+        self.awg_site = 0
+        self.fw = None
+        self.statmon = None
+
+    @classmethod
+    async def create(cls, _uut, monitor=True):
+        """factory: create and connect all site services concurrently.
+
+        Args:
+            monitor=True (bool) : set false to stub monitor
+        """
+        uut = cls(_uut)
+        await uut.connect(monitor)
+        return uut
+
+    @classmethod
+    async def create_uuts(cls, uut_names, monitor=True):
+        """create_uuts(): factory .. create them concurrently"""
+        return list(await asyncio.gather(*[cls.create(u, monitor) for u in uut_names]))
+
+    async def init_site_client(self, site):
+        svc = await AsyncSiteclient.connect(self.uut, AcqPorts.SITE0+site, fw=self.fw)
+        self.svc["s%d" % site] = svc
+        self.modules[site] = svc
+
+        if self.awg_site == 0 and (await svc.module_name).startswith("ao"):
+            self.awg_site = site
+        self.mod_count += 1
+
+    async def connect(self, monitor=True):
+        s0 = self.svc["s0"] = await AsyncSiteclient.connect(self.uut, AcqPorts.SITE0)
+        self.fw = s0.schema_key[3] if s0.schema_key != None else None
+        sl = (await s0.SITELIST).split(",")
+        sl.pop(0)
+        await asyncio.gather(*[self.init_site_client(int(sm.split("=").pop(0))) for sm in sl])
+
+        _status = [int(x) for x in (await s0.state).split(" ")]
+        if monitor:
+            self.statmon = AsyncStatusmonitor(self.uut, _status)
+            await self.statmon.start()
+
+    async def close(self):
+        if self.statmon != None:
+            await self.statmon.stop()
+        await asyncio.gather(*[svc.close() for svc in self.svc.values()])
+
+    def __getattr__(self, name):
+        svc = self.__dict__.get('svc')
+        if svc != None and svc.get(name) != None:
+            return svc.get(name)
+        msg = "'{0}' object has no attribute '{1}'"
+        raise AttributeError(msg.format(type(self).__name__, name))
+
+    def state(self):
+        return self.statmon.status[SF.STATE]
+    def post_samples(self):
+        return self.statmon.status[SF.POST]
+    def pre_samples(self):
+        return self.statmon.status[SF.PRE]
+    def elapsed_samples(self):
+        return self.statmon.status[SF.ELAPSED]
+    def samples(self):
+        return self.pre_samples() + self.post_samples()
+
+    async def nchan(self):
+        return int(await self.s0.NCHAN)
+
+    async def read_chan(self, chan, nsam=0, data32=None):
+        if chan != 0 and nsam == 0:
+            nsam = self.pre_samples()+self.post_samples()
+        if data32 == None:
+            data32 = await self.s0.data32
+        async with await AsyncChannelClient.connect(self.uut, chan) as cc:
+            return await cc.read(nsam, data_size=(4 if data32 == '1' else 2))
+
+    async def read_channels(self, channels=(), nsam=0, max_inflight=4):
+        """read channels post shot data, up to max_inflight at once.
+
+        Returns:
+            chx (list) of np arrays, in channel order.
+        """
+        if channels == ():
+            channels = list(range(1, await self.nchan()+1))
+        elif type(channels) == int:
+            channels = (channels,)
+
+        data32 = await self.s0.data32
+        inflight = asyncio.Semaphore(max_inflight)
+
+        async def read1(ch):
+            async with inflight:
+                return await self.read_chan(ch, nsam, data32)
+
+        return list(await asyncio.gather(*[read1(ch) for ch in channels]))
@@ -0,0 +1,223 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+async_netclient.py asyncio interface to client tcp socket
+
+- AsyncNetclient, AsyncLogclient, AsyncSiteclient : asyncio versions of
+  the netclient classes, one event loop drives any number of connections
+  without a thread per socket.
+- all I/O methods are coroutines, eg::
+
+       svc = await AsyncSiteclient.connect(uut, 4220)
+       print(await svc.MODEL)
+       await svc.set_knob("set_arm", 1)
+
+Python 3 only.
+"""
+
+import asyncio
+import re
+import os
+
+from . import netclient
+
+
+class AsyncNetclient:
+    """asyncio connection to defined port, create with connect().
+
+    Args:
+        addr (str) : ip-address or dns name on network
+        port (int) : server port number.
+    """
+    trace = int(os.getenv("NETCLIENT_TRACE", "0"))
+
+    def __init__(self, addr, port):
+        self.buffer = bytearray()
+        self.__addr = addr
+        self.__port = int(port)
+        self.reader = None
+        self.writer = None
+
+    @classmethod
+    async def connect(cls, addr, port, *args, **kwargs):
+        """factory: create and connect, a constructor can't await."""
+        client = cls(addr, port, *args, **kwargs)
+        await client.open()
+        return client
+
+    async def open(self):
+        if AsyncNetclient.trace:
+            print("AsyncNetclient(%s, %d) connect" % (self.__addr, self.__port))
+        self.reader, self.writer = await asyncio.open_connection(self.__addr, self.__port)
+
+    async def close(self):
+        if self.writer != None:
+            self.writer.close()
+            try:
+                await self.writer.wait_closed()
+            except (OSError, ConnectionError):
+                pass
+            self.writer = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+    async def receive_message(self, termex, maxlen=4096):
+        """Read the information from the socket line at a time.
+
+        Args:
+            termex (str): regex defines line terminator
+            maxlen (int): max read size
+
+        Returns:
+            string representing message
+        """
+        btermex = netclient.Netclient.bytes_termex(termex)
+        match = btermex.search(self.buffer)
+        while match == None:
+            scan = len(self.buffer) - netclient.Netclient.scan_overlap
+            rx = await self.reader.read(maxlen)
+            if not rx:
+                raise ConnectionError("%s connection closed" % (repr(self)))
+            self.buffer += rx
+            match = btermex.search(self.buffer, scan if scan > 0 else 0)
+
+        rc = self.buffer[:match.start(1)].decode("latin-1")
+        del self.buffer[:match.end(1)]
+        return rc
+
+    def addr(self):
+        return self.__addr
+
+    def port(self):
+        return self.__port
+
+    def __repr__(self):
+        return 'AsyncNetclient(%s, %d)' % (self.__addr, self.__port)
+
+
+class AsyncLogclient(AsyncNetclient):
+    """AsyncNetclient optimised for logging, line by line"""
+    def __init__(self, addr, port):
+        AsyncNetclient.__init__(self, addr, port)
+        self.termex = re.compile("(\r\n)")
+
+    async def poll(self):
+        return await self.receive_message(self.termex)
+
+
+class AsyncSiteclient(AsyncNetclient):
+    """AsyncNetclient for site service, may be multi-line response.
+
+    Autodetects all knobs, a knob attribute returns an awaitable query::
+
+        model = await svc.MODEL
+        await svc.set_knob("TRG", 1)
+
+    Commands on one connection are serialised, use sr_many() to pipeline.
+    The knob list is shared with Siteclient.schema_cache.
+    """
+    pat = re.compile(r":")
+    trace = int(os.getenv("SITECLIENT_TRACE", "0"))
+
+    def __init__(self, addr, port, fw=None):
+        AsyncNetclient.__init__(self, addr, port)
+        self.knobs = {}
+        self.fw = fw
+        self.schema_key = None
+        self.show_responses = False
+        self.termex = re.compile(r"\n(acq400.[0-9]+ ([0-9]+) >)")
+        self.lock = asyncio.Lock()
+
+    async def open(self):
+        await AsyncNetclient.open(self)
+        await self.load_knobs(self.fw)
+
+    async def sr(self, message):
+        """send a command and receive a reply
+
+        Args:
+            message (str) : command (query) to send
+
+        Returns:
+            rx (str): response string
+        """
+        return (await self.sr_many([message]))[0]
+
+    async def sr_many(self, messages):
+        """send a list of commands in one write, then receive the replies in order.
+
+        Returns:
+            rxs (list): response string per command
+        """
+        async with self.lock:
+            if self.trace:
+                for message in messages:
+                    print("%s >%s" % (repr(self), message.rstrip()))
+            self.writer.write("".join([message+"\n" for message in messages]).encode())
+            await self.writer.drain()
+            rxs = []
+            for message in messages:
+                rx = (await self.receive_message(self.termex)).rstrip()
+                if self.show_responses and len(rx) > 1:
+                    print(rx)
+                if self.trace:
+                    print("%s <%s" % (repr(self), rx))
+                rxs.append(rx)
+            return rxs
+
+    def build_knobs(self, knobstr):
+        self.knobs = dict((AsyncSiteclient.pat.sub(r"_", key), key) for key in knobstr.split())
+
+    async def load_knobs(self, fw=None):
+        """enumerate knobs, from Siteclient.schema_cache if the SchemaCache identity matches"""
+        cache = netclient.Siteclient.schema_cache
+        if not cache.root:
+            await self.sr("prompt on")
+            self.build_knobs(await self.sr("help"))
+            return
+        rx = await self.sr_many(netclient.SchemaCache.queries(fw))
+        self.schema_key = netclient.SchemaCache.key(self.addr(), self.port(), rx, fw)
+        knobstr = cache.load(self.schema_key)
+        if knobstr == None:
+            knobstr = await self.sr("help")
+            cache.save(self.schema_key, knobstr)
+        self.build_knobs(knobstr)
+
+    def help(self, regex=".*"):
+        """list available knobs, optionally filtered by regex."""
+        regex = re.compile(regex)
+        return [key for key in sorted(self.knobs) if regex.match(key)]
+
+    async def get_knob(self, name):
+        if self.knobs.get(name) == None:
+            msg = "'{0}' object has no attribute '{1}'"
+            raise AttributeError(msg.format(type(self).__name__, name))
+        return await self.sr(self.knobs.get(name))
+
+    async def set_knob(self, name, value):
+        if self.knobs.get(name) == None:
+            msg = "'{0}' object has no attribute '{1}'"
+            raise AttributeError(msg.format(type(self).__name__, name))
+        return await self.sr("%s=%s" % (self.knobs.get(name), value))
+
+    async def set_knobs(self, knobs):
+        """set a list of (name, value) pairs, pipelined, ~1 RTT"""
+        for (name, value) in knobs:
+            if self.knobs.get(name) == None:
+                msg = "'{0}' object has no attribute '{1}'"
+                raise AttributeError(msg.format(type(self).__name__, name))
+        return await self.sr_many(["%s=%s" % (self.knobs.get(name), value) for (name, value) in knobs])
+
+    def __getattr__(self, name):
+        knobs = self.__dict__.get('knobs')
+        if knobs != None and knobs.get(name) != None:
+            return self.get_knob(name)
+        msg = "'{0}' object has no attribute '{1}'"
+        raise AttributeError(msg.format(type(self).__name__, name))
+
+    def __repr__(self):
+        return 'AsyncSiteclient(%s, %d)' % (self.addr(), self.port())
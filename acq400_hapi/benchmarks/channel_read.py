@@ -0,0 +1,114 @@
+#!/usr/bin/env python
+
+"""
+benchmark: ChannelClient.read() and RawClient.read() throughput vs a local test server.
+
+A local server sends a payload and closes, as the channel data ports do post
+shot. Times the legacy bytes += reader against the recv_into() reader, both
+with known length (nsam) and read-to-end.
+
+usage::
+    channel_read.py [--sizes 1M,10M,100M] [--maxbuf 0x400000] [--repeat 3]
+
+example output::
+
+           bytes     nsam  legacy MB/s Channel MB/s     Raw MB/s
+         1048576    known        804.3       1833.8       2172.8
+       104857600    known        112.8       2106.1       2169.4
+       104857600   to end        103.5       1100.6       1135.2
+"""
+
+import acq400_hapi
+from acq400_hapi import acq400
+import argparse
+import numpy as np
+import socket
+import threading
+import timeit
+
+
+class TestServer:
+    """serves payload to each connection on a local ephemeral port"""
+    def __init__(self, payload):
+        self.payload = payload
+        self.sock = socket.socket()
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.sock.bind(("127.0.0.1", 0))
+        self.sock.listen(5)
+        self.port = self.sock.getsockname()[1]
+        self.thread = threading.Thread(target=self.serve)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def serve(self):
+        while True:
+            conn, addr = self.sock.accept()
+            try:
+                conn.sendall(self.payload)
+            except socket.error:
+                pass
+            conn.close()
+
+
+def legacy_read(sock, ndata, data_size=2, maxbuf=0x400000):
+    """the original ChannelClient.read(), for comparison"""
+    _dtype = np.dtype('i4' if data_size == 4 else 'i2')
+    total_buffer = buffer = sock.recv(maxbuf)
+
+    if int(ndata) == 0 or int(ndata) == -1:
+        while True:
+            buffer = sock.recv(maxbuf)
+            if not buffer:
+                return np.frombuffer(total_buffer, dtype=_dtype, count=-1)
+            total_buffer += buffer
+
+    while len(buffer) < ndata*data_size:
+        buffer += sock.recv(maxbuf)
+
+    return np.frombuffer(buffer, dtype=_dtype, count=ndata)
+
+
+def read_legacy(port, ndata, maxbuf):
+    with acq400_hapi.Netclient("127.0.0.1", port) as nc:
+        return legacy_read(nc.sock, ndata, 2, maxbuf)
+
+def read_channel(port, ndata, maxbuf):
+    with acq400_hapi.ChannelClient("127.0.0.1", port - acq400_hapi.AcqPorts.DATA0) as cc:
+        return cc.read(ndata, 2, maxbuf)
+
+def read_raw(port, ndata, maxbuf):
+    with acq400.RawClient("127.0.0.1", port) as rc:
+        return rc.read(ndata, 2, maxbuf=maxbuf)
+
+
+def time_read(server, reader, ndata, args):
+    best = None
+    for rpt in range(args.repeat):
+        t0 = timeit.default_timer()
+        data = reader(server.port, ndata, args.maxbuf)
+        tt = timeit.default_timer() - t0
+        assert len(data)*2 == len(server.payload)
+        best = tt if best == None else min(best, tt)
+    return len(server.payload)/best/1000000
+
+
+def run_bench(args):
+    print("%12s %8s %12s %12s %12s" % ("bytes", "nsam", "legacy MB/s", "Channel MB/s", "Raw MB/s"))
+    for nbytes in args.sizes.split(","):
+        nbytes = acq400_hapi.intSI_cvt(nbytes, decimal=False)
+        server = TestServer(np.arange(nbytes//2, dtype=np.int16).tobytes())
+        for (label, ndata) in (("known", nbytes//2), ("to end", 0)):
+            rates = [time_read(server, reader, ndata, args) for reader in (read_legacy, read_channel, read_raw)]
+            print("%12d %8s %12.1f %12.1f %12.1f" % tuple([nbytes, label] + rates))
+
+
+def run_main():
+    parser = argparse.ArgumentParser(description='channel data read benchmark')
+    parser.add_argument('--sizes', default="1M,10M,100M", help="payload sizes, comma separated")
+    parser.add_argument('--maxbuf', default=0x400000, type=lambda x: int(x, 0), help="max bytes per recv")
+    parser.add_argument('--repeat', default=3, type=int, help="repeat, report best time")
+    run_bench(parser.parse_args())
+
+
+if __name__ == '__main__':
+    run_main()
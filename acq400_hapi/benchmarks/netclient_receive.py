@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+
+"""
+microbenchmark: Netclient.receive_message() reply parsing cost vs reply size.
+
+Feeds a prompt terminated multi-line reply, as sent by a site service in
+response to "help" or "AI_CAL_ESLO", over a local socketpair, and times the
+parse, compared with the legacy str append + full re-scan algorithm.
+
+usage::
+    netclient_receive.py [--sizes 1k,10k,100k,1M] [--maxlen 4096] [--repeat 5]
+
+example output::
+
+           bytes    legacy ms       new ms   speedup
+            1024        0.011        0.012       0.9
+           10240        0.034        0.042       0.8
+          102400        1.235        0.170       7.2
+         1048576      110.154        2.169      50.8
+
+Short replies are dominated by fixed per-call overhead (~1us), the legacy
+cost grows as O(n^2) with reply size.
+"""
+
+import acq400_hapi
+import argparse
+import re
+import socket
+import threading
+import timeit
+
+
+PROMPT = b"\nacq400.1 123 >"
+
+
+class LegacyReceiver:
+    """the original algorithm, for comparison"""
+    def __init__(self, sock):
+        self.sock = sock
+        self.buffer = ""
+
+    def receive_message(self, termex, maxlen=4096):
+        match = termex.search(self.buffer)
+        while match == None:
+            self.buffer += self.sock.recv(maxlen).decode("latin-1")
+            match = termex.search(self.buffer)
+
+        rc = self.buffer[:match.start(1)]
+        self.buffer = self.buffer[match.end(1):]
+        return rc
+
+
+class SocketpairReceiver(acq400_hapi.Netclient):
+    """Netclient on one end of a socketpair, no connect"""
+    def __init__(self, sock):
+        self.buffer = bytearray(4096)
+        self._view = memoryview(self.buffer)
+        self._fill = 0
+        self.sock = sock
+
+
+def make_reply(nbytes):
+    line = b"0.000305176 0.000305176 0.000305176 0.000305176\n"
+    return (line * (nbytes // len(line) + 1))[:nbytes] + PROMPT
+
+
+def time_receiver(make_receiver, reply, maxlen, repeat):
+    termex = re.compile(r"\n(acq400.[0-9]+ ([0-9]+) >)")
+    best = None
+    for rpt in range(repeat):
+        tx, rx = socket.socketpair()
+        receiver = make_receiver(rx)
+        writer = threading.Thread(target=tx.sendall, args=(reply,))
+        writer.start()
+        t0 = timeit.default_timer()
+        msg = receiver.receive_message(termex, maxlen)
+        tt = timeit.default_timer() - t0
+        writer.join()
+        tx.close()
+        rx.close()
+        assert len(msg) == len(reply) - len(PROMPT) + 1     # keeps the newline
+        best = tt if best == None else min(best, tt)
+    return best
+
+
+def run_bench(args):
+    print("%12s %12s %12s %9s" % ("bytes", "legacy ms", "new ms", "speedup"))
+    for nbytes in args.sizes.split(","):
+        nbytes = acq400_hapi.intSI_cvt(nbytes, decimal=False)
+        reply = make_reply(nbytes)
+        t_old = time_receiver(LegacyReceiver, reply, args.maxlen, args.repeat)
+        t_new = time_receiver(SocketpairReceiver, reply, args.maxlen, args.repeat)
+        print("%12d %12.3f %12.3f %9.1f" % (nbytes, t_old*1000, t_new*1000, t_old/t_new))
+
+
+def run_main():
+    parser = argparse.ArgumentParser(description='Netclient.receive_message benchmark')
+    parser.add_argument('--sizes', default="1k,10k,100k,1M", help="reply sizes, comma separated")
+    parser.add_argument('--maxlen', default=4096, type=int, help="recv size")
+    parser.add_argument('--repeat', default=5, type=int, help="repeat, report best time")
+    run_bench(parser.parse_args())
+
+
+if __name__ == '__main__':
+    run_main()
@@ -0,0 +1,125 @@
+#!/usr/bin/env python
+
+"""
+benchmark: Siteclient command round trip, get vs set, TCP_NODELAY, sequential vs pipelined.
+
+Runs a UutEmulator in a child process and times knob reads and writes on
+one site service, with the round trips recorded in Siteclient.rtt, the
+same histograms SITECLIENT_RTT=1 collects on a real rack.
+
+- get, set : one command per round trip, sr()
+- batch : sets queued with Siteclient.batch(), one write for the lot,
+  sr_many(), us/cmd is the wall time / commands, p50/p99 per reply
+- get rtt off : the get loop with the instrumentation off, for its cost
+
+usage::
+    siteclient_latency.py [--count 2000] [--batch 10,100] [--host 127.0.0.30]
+                          [--uut UUT] [--site 1] [--knob TRG] [--json FILE] [--rtt_report 1]
+
+--uut measures a real uut instead of the emulator, note that set writes
+--knob with its current value.
+
+example output::
+
+    mode          nodelay  count    us/cmd   p50 us   p99 us  p999 us
+    get                 0   2000      42.1       40       63      120
+    get                 1   2000      41.5       40       60      118
+    set                 0   2000      43.0       41       66      131
+    batch 100           0   2000       6.2      310      612      640
+"""
+
+import acq400_hapi
+from acq400_hapi import netclient
+from acq400_hapi import uut_emulator
+import argparse
+import json
+import sys
+import timeit
+
+
+def connect(args, nodelay):
+    netclient.Netclient.nodelay = nodelay
+    return acq400_hapi.Siteclient(args.uut, acq400_hapi.AcqPorts.SITE0 + args.site)
+
+
+def run_get(sc, args, nbatch):
+    for ii in range(args.count):
+        sc.get_knob(args.knob)
+
+
+def run_set(sc, args, nbatch):
+    value = sc.get_knob(args.knob)
+    for ii in range(args.count):
+        sc.set_knob(args.knob, value)
+
+
+def run_batch(sc, args, nbatch):
+    value = sc.get_knob(args.knob)
+    for ii in range(args.count//nbatch):
+        with sc.batch():
+            for jj in range(nbatch):
+                sc.set_knob(args.knob, value)
+
+
+def measure(args, mode, nodelay, run, op, nbatch=1, rtt=1):
+    netclient.Siteclient.rtt_enable = rtt
+    sc = connect(args, nodelay)
+    try:
+        run(sc, args, nbatch)                   # warm up
+        netclient.Siteclient.rtt.reset()
+        t0 = timeit.default_timer()
+        run(sc, args, nbatch)
+        tt = timeit.default_timer() - t0
+    finally:
+        netclient.Siteclient.rtt_enable = 0
+        sc.sock.close()
+    count = args.count//nbatch*nbatch
+    hs = netclient.Siteclient.rtt.histogram(op=op).stats()
+    return { "mode": mode, "nodelay": nodelay, "count": count, "us/cmd": tt/count*1e6,
+             "p50_us": hs["p50"]*1e6, "p99_us": hs["p99"]*1e6, "p999_us": hs["p999"]*1e6 }
+
+
+def run_bench(args):
+    proc = None
+    if args.uut == None:
+        args.uut = args.host
+        proc = uut_emulator.start_process(args.host)
+    results = []
+    print("%-14s %7s %6s %9s %8s %8s %8s" % ("mode", "nodelay", "count", "us/cmd", "p50 us", "p99 us", "p999 us"))
+    try:
+        cases = [("get", run_get, "get", 1), ("set", run_set, "set", 1)]
+        cases += [("batch %d" % (nb), run_batch, "pset", nb) for nb in args.batch]
+        for nodelay in (0, 1):
+            for mode, run, op, nbatch in cases:
+                results.append(measure(args, mode, nodelay, run, op, nbatch))
+                if args.rtt_report:
+                    netclient.Siteclient.rtt.report()
+        results.append(measure(args, "get rtt off", 0, run_get, "get", rtt=0))
+    finally:
+        if proc != None:
+            proc.terminate()
+            proc.join()
+    for res in results:
+        print("%-14s %7d %6d %9.1f %8.0f %8.0f %8.0f" %
+              (res["mode"], res["nodelay"], res["count"], res["us/cmd"], res["p50_us"], res["p99_us"], res["p999_us"]))
+    if args.json:
+        with open(args.json, "w") as fp:
+            json.dump({ "uut": args.uut, "site": args.site, "knob": args.knob, "results": results }, fp, indent=2)
+
+
+def run_main():
+    parser = argparse.ArgumentParser(description='Siteclient latency benchmark')
+    parser.add_argument('--count', default=2000, type=int, help="commands per measurement")
+    parser.add_argument('--batch', default="10,100", type=lambda x: [int(n) for n in x.split(",")],
+                        help="pipelined batch sizes, comma separated")
+    parser.add_argument('--host', default="127.0.0.30", help="emulator address")
+    parser.add_argument('--uut', default=None, help="measure a real uut, default: emulator")
+    parser.add_argument('--site', default=1, type=int, help="site service")
+    parser.add_argument('--knob', default="TRG", help="knob to get and set")
+    parser.add_argument('--json', default=None, help="write results to JSON file")
+    parser.add_argument('--rtt_report', default=0, type=int, help="1: print the per knob RTT table per measurement")
+    run_bench(parser.parse_args())
+
+
+if __name__ == '__main__':
+    run_main()
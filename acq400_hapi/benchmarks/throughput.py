@@ -0,0 +1,311 @@
+#!/usr/bin/env python
+
+"""
+benchmark suite: data path throughput against local UutEmulator processes.
+
+Each emulator runs in a child process on its own 127.0.0.N address, so the
+server costs nothing in the measured process. Cases:
+
+- channel_read : ChannelClient.read(), one channel, per size and recv size (maxbuf)
+- raw_blocks : RawClient.get_blocks() from the stream port, per size and block size
+- read_channels : Acq400.read_channels(), per size, channel count and max_inflight
+- load_awg : Acq400.load_awg(), per size
+- stream_record : StreamRecorder, splice and recv, per size
+- stream_multi : MultiStreamRecorder, all the emulators at once, per size
+
+Each result has MB/s (median run), best MB/s, p50/p99 time per run and
+the process peak RSS after the case (ru_maxrss, it only grows: the first
+case to need the memory shows it).
+
+usage::
+    throughput.py [--cases CASES] [--sizes 1M,16M] [--nchan 8,32] [--maxbuf 64k,4M]
+                  [--inflight 1,4] [--repeat 5] [--host_base 127.0.0.20]
+                  [--root ROOT] [--json FILE] [--baseline FILE] [--tolerance 0.1]
+
+example::
+
+    PYTHONPATH=. python acq400_hapi/benchmarks/throughput.py --json base.json
+    # .. change something ..
+    PYTHONPATH=. python acq400_hapi/benchmarks/throughput.py --baseline base.json
+
+    with --baseline, each result is shown as a ratio to the baseline, exit
+    status 1 if any MB/s falls more than --tolerance below it.
+
+example output::
+
+    case           params                                        MB/s best MB/s   p50 ms   p99 ms   RSS MB
+    channel_read   bytes=4194304 maxbuf=4194304                2135.6    2358.4     1.96     2.16       43
+    read_channels  bytes=4194304 inflight=4 nchan=32            482.9     562.9     8.69     9.85       50
+    load_awg       bytes=4194304                               2118.4    2328.2     1.98     2.05       54
+"""
+
+import acq400_hapi
+from acq400_hapi import uut_emulator
+import argparse
+import contextlib
+import copy
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+import timeit
+
+import numpy as np
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+
+CASES = ("channel_read", "raw_blocks", "read_channels", "load_awg", "stream_record", "stream_multi")
+
+
+def peak_rss_mb():
+    if resource == None:
+        return 0.0
+    kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # bytes on macOS, kB on Linux
+    return kb/1000000.0 if sys.platform == "darwin" else kb/1000.0
+
+
+class Emulator:
+    """a UutEmulator in a child process, and an Acq400 client on it"""
+    def __init__(self, host, nchan):
+        profile = copy.deepcopy(uut_emulator.DEFAULT_PROFILE)
+        for site in ("0", "1"):
+            profile["sites"][site]["NCHAN"] = str(nchan)
+        self.host = host
+        self.nchan = nchan
+        self.nsam = 0
+        self.proc = uut_emulator.start_process(host, profile, speed=1000)
+        # no status monitor: it would outlive the emulator process
+        self.uut = acq400_hapi.Acq400(host, monitor=False)
+
+    def state(self):
+        return int(self.uut.s0.state.split(" ")[0])
+
+    def shot(self, nsam):
+        """run a shot of nsam samples, the data ports then serve nsam"""
+        if nsam != self.nsam:
+            self.uut.s0.transient = "PRE=0 POST=%d SOFT_TRIGGER=0" % (nsam)
+            self.uut.s0.set_arm = 1
+            while self.state() == acq400_hapi.acq400.STATE.IDLE:
+                time.sleep(0.01)
+            self.uut.s0.soft_trigger = 1
+            while self.state() != acq400_hapi.acq400.STATE.IDLE:
+                time.sleep(0.01)
+            self.nsam = nsam
+
+    def close(self):
+        self.proc.terminate()
+        self.proc.join()
+
+
+@contextlib.contextmanager
+def quiet():
+    """the clients print a line per connection, keep it off the results"""
+    with open(os.devnull, "w") as null:
+        with contextlib.redirect_stdout(null):
+            yield
+
+
+def measure(op, nbytes, repeat):
+    """time repeat runs of op(), which moves nbytes"""
+    op()            # warm up: connections, page faults
+    times = []
+    for rpt in range(repeat):
+        t0 = timeit.default_timer()
+        op()
+        times.append(timeit.default_timer() - t0)
+    times = np.array(times)
+    return { "MB/s": nbytes/np.median(times)/1000000, "best MB/s": nbytes/times.min()/1000000,
+             "p50_ms": np.percentile(times, 50)*1000, "p99_ms": np.percentile(times, 99)*1000,
+             "peak_rss_MB": peak_rss_mb() }
+
+
+def check_len(data, nelems):
+    if len(data) != nelems:
+        raise RuntimeError("short read %d/%d" % (len(data), nelems))
+
+
+def case_channel_read(emus, args):
+    emu = emus[-1]
+    for nbytes in args.sizes:
+        nsam = nbytes//2
+        emu.shot(nsam)
+        for maxbuf in args.maxbuf:
+            def op():
+                with acq400_hapi.ChannelClient(emu.host, 1) as cc:
+                    check_len(cc.read(nsam, 2, maxbuf), nsam)
+            yield { "bytes": nbytes, "maxbuf": maxbuf }, measure(op, nbytes, args.repeat)
+
+
+def case_raw_blocks(emus, args):
+    emu = emus[-1]
+    for nbytes in args.sizes:
+        for maxbuf in args.maxbuf:
+            def op():
+                total = 0
+                with acq400_hapi.acq400.RawClient(emu.host, acq400_hapi.AcqPorts.STREAM) as rc:
+                    for block in rc.get_blocks(maxbuf//2):
+                        total += block.nbytes
+                        if total >= nbytes:
+                            break
+            yield { "bytes": nbytes, "blocksize": maxbuf }, measure(op, nbytes, args.repeat)
+
+
+def case_read_channels(emus, args):
+    for emu in emus:
+        for nbytes in args.sizes:
+            nsam = nbytes//(2*emu.nchan)
+            emu.shot(nsam)
+            for inflight in args.inflight:
+                def op():
+                    chx = emu.uut.read_channels(nsam=nsam, max_inflight=inflight)
+                    check_len(chx, emu.nchan)
+                yield ({ "bytes": nsam*2*emu.nchan, "nchan": emu.nchan, "inflight": inflight },
+                       measure(op, nsam*2*emu.nchan, args.repeat))
+
+
+def case_load_awg(emus, args):
+    emu = emus[-1]
+    for nbytes in args.sizes:
+        data = np.zeros(nbytes//2, dtype=np.int16).tobytes()
+        yield { "bytes": nbytes }, measure(lambda: emu.uut.load_awg(data), nbytes, args.repeat)
+
+
+def case_stream_record(emus, args):
+    emu = emus[-1]
+    modes = ("splice", "recv") if hasattr(os, "splice") else ("recv",)
+    for nbytes in args.sizes:
+        for mode in modes:
+            def op():
+                root = tempfile.mkdtemp(dir=args.root) + "/"
+                try:
+                    rec = acq400_hapi.StreamRecorder(emu.host, root=root, filesize=min(nbytes, 0x1000000),
+                                                     totaldata=nbytes, mode=mode)
+                    st = rec.record()
+                    if st["bytes"] != nbytes:
+                        raise RuntimeError("short record %d/%d" % (st["bytes"], nbytes))
+                finally:
+                    shutil.rmtree(root)
+            yield { "bytes": nbytes, "mode": mode }, measure(op, nbytes, args.repeat)
+
+
+def case_stream_multi(emus, args):
+    for nbytes in args.sizes:
+        def op():
+            root = tempfile.mkdtemp(dir=args.root) + "/"
+            try:
+                msr = acq400_hapi.MultiStreamRecorder([emu.host for emu in emus], root=root,
+                                                      filesize=min(nbytes, 0x1000000), totaldata=nbytes)
+                st = msr.record()
+                if st["aggregate"]["bytes"] != nbytes*len(emus):
+                    raise RuntimeError("short record %d/%d" % (st["aggregate"]["bytes"], nbytes*len(emus)))
+            finally:
+                shutil.rmtree(root)
+        yield { "bytes": nbytes*len(emus), "uuts": len(emus) }, measure(op, nbytes*len(emus), args.repeat)
+
+
+def result_key(res):
+    return res["case"] + " " + " ".join(["%s=%s" % (k, res["params"][k]) for k in sorted(res["params"])])
+
+
+def print_result(res, base=None):
+    line = "%-14s %-40s %9.1f %9.1f %8.2f %8.2f %8.0f" % (
+        res["case"], result_key(res)[len(res["case"])+1:], res["MB/s"], res["best MB/s"],
+        res["p50_ms"], res["p99_ms"], res["peak_rss_MB"])
+    if base != None:
+        line += "  %5.2fx" % (res["MB/s"]/base["MB/s"])
+    print(line)
+    sys.stdout.flush()
+
+
+def compare(results, baseline, tolerance):
+    """returns the results more than tolerance slower than baseline"""
+    base = dict((result_key(res), res) for res in baseline["results"])
+    slow = []
+    for res in results:
+        ref = base.get(result_key(res))
+        if ref != None and res["MB/s"] < ref["MB/s"]*(1 - tolerance):
+            slow.append((res, ref))
+    return slow
+
+
+def run_bench(args):
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as fp:
+            baseline = json.load(fp)
+        base = dict((result_key(res), res) for res in baseline["results"])
+    host_base = args.host_base.split(".")
+    emus = []
+    results = []
+    try:
+        for ix, nchan in enumerate(args.nchan):
+            host = ".".join(host_base[:3] + [str(int(host_base[3]) + ix)])
+            with quiet():
+                emus.append(Emulator(host, nchan))
+        print("%-14s %-40s %9s %9s %8s %8s %8s%s" % ("case", "params", "MB/s", "best MB/s",
+              "p50 ms", "p99 ms", "RSS MB", "  vs base" if baseline else ""))
+        for case in args.cases:
+            cases = globals()["case_" + case](emus, args)
+            while True:
+                with quiet():
+                    params, res = next(cases, (None, None))
+                if params == None:
+                    break
+                res["case"] = case
+                res["params"] = params
+                results.append(res)
+                print_result(res, base.get(result_key(res)) if baseline else None)
+    finally:
+        for emu in emus:
+            emu.close()
+
+    if args.json:
+        meta = { "time": time.strftime("%Y-%m-%dT%H:%M:%S"), "host": platform.node(),
+                 "python": platform.python_version(), "numpy": np.__version__,
+                 "platform": platform.platform(), "repeat": args.repeat }
+        with open(args.json, "w") as fp:
+            json.dump({ "meta": meta, "results": results }, fp, indent=2)
+        print("results in {}".format(args.json))
+    if baseline:
+        slow = compare(results, baseline, args.tolerance)
+        for res, ref in slow:
+            print("REGRESSION %s %.1f MB/s, baseline %.1f MB/s" % (result_key(res), res["MB/s"], ref["MB/s"]))
+        if slow:
+            sys.exit(1)
+
+
+def int_list(arg):
+    return [acq400_hapi.intSI_cvt(x, decimal=False) for x in arg.split(",")]
+
+
+def run_main():
+    parser = argparse.ArgumentParser(description='data path throughput benchmark suite')
+    parser.add_argument('--cases', default=",".join(CASES), type=lambda x: x.split(","),
+                        help="comma separated, from {}".format(",".join(CASES)))
+    parser.add_argument('--sizes', default="1M,16M", type=int_list, help="bytes per run, comma separated")
+    parser.add_argument('--nchan', default="8,32", type=int_list, help="channel counts, one emulator each")
+    parser.add_argument('--maxbuf', default="64k,4M", type=int_list, help="recv sizes / block sizes")
+    parser.add_argument('--inflight', default="1,4", type=int_list, help="read_channels max_inflight levels")
+    parser.add_argument('--repeat', default=5, type=int, help="timed runs per result, after one warm up")
+    parser.add_argument('--host_base', default="127.0.0.20", help="first emulator address")
+    parser.add_argument('--root', default=None, help="directory for stream_record files, default: system temp")
+    parser.add_argument('--json', default=None, help="write results to JSON file")
+    parser.add_argument('--baseline', default=None, help="compare with a JSON results file")
+    parser.add_argument('--tolerance', default=0.1, type=float, help="baseline: allowed MB/s fraction below")
+    args = parser.parse_args()
+    for case in args.cases:
+        if case not in CASES:
+            parser.error("case {} not in {}".format(case, ",".join(CASES)))
+    run_bench(args)
+
+
+if __name__ == '__main__':
+    run_main()
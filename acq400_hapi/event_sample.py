@@ -0,0 +1,269 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+event_sample.py finds the event samples (ES) in muxed data
+
+- an ES replaces one sample in the stream at each event (burst start in
+  RGM/RTM, trigger in transient). In the 32 bit view of the sample each
+  site starts with the magic 0xaa55f154, and the first site block carries
+  the sample count (long 4, 5) and clock count (long 6, 7), eg::
+
+       aa55f154,aa55f154,aa55f154,aa55f154,00000001,00000001,000002a0,000002a0
+
+- find_es() : vectorised, a mask on the first long of a (nsam, nlongs) view,
+  then the candidates are checked for the magic at every site.
+- find_es_file() : the same, chunk-wise on a memory mapped file, so a
+  multi-GB capture is never read in whole, eg::
+
+       samples = as_samples("burst32-50Hz-512-3.bin", 32)
+       ix, es = find_es_file("burst32-50Hz-512-3.bin", 32)
+       first = samples[ix+1]                   # the sample after each ES
+       print(es["sample_count"], es["clock_count"])
+
+- Bursts : RGM/RTM burst segmentation. The ES positions and counts make a
+  burst table, and each channel is served as a zero-copy (nburst, blen)
+  strided view in its own type, eg int16, eg::
+
+       bursts = Bursts.from_samples(as_samples("burst.bin", 32))
+       ch01 = bursts.channel(0, dtype=np.int32)             # (nburst, blen)
+       print(bursts.table["sample_count"])
+
+  or from demuxed channel files, ES on the even channels, double width::
+
+       raw = [ np.memmap(fn, dtype=np.int16, mode='r') for fn in files ]
+       bursts = Bursts.from_channels(raw[1::8], raw[0::8])
+       ch17 = bursts.view(raw[16])
+"""
+
+import numpy as np
+
+
+ES_MAGIC = 0xaa55f154
+ES_SAMPLE_COUNT = 4
+ES_CLOCK_COUNT = 6
+ES_DTYPE = np.dtype([("sample_count", "<u4"), ("clock_count", "<u4")])
+BURST_DTYPE = np.dtype([("es", "<i8"), ("length", "<i8"), ("sample_count", "<u4"), ("clock_count", "<u4")])
+
+
+def as_samples(src, nlongs):
+    """returns src as a (nsam, nlongs) uint32 array, zero-copy.
+
+    Args:
+        src : file path (memory mapped, read only), or array / buffer
+
+        nlongs (int) : 32 bit words per sample
+
+    a partial sample at the end is left out.
+    """
+    if isinstance(src, str):
+        raw = np.memmap(src, dtype=np.uint32, mode='r')
+    elif isinstance(src, np.ndarray):
+        raw = src.reshape(-1).view(np.uint8)
+        raw = raw[:len(raw)//4*4].view(np.uint32)
+    else:
+        raw = np.frombuffer(src, dtype=np.uint32)
+    nsam = len(raw) // nlongs
+    return raw[:nsam*nlongs].reshape(nsam, nlongs)
+
+
+def site_offsets(layout, nlongs=None):
+    """long offset of each site in a SampleLayout sample, not spad.
+
+    Sites that do not start on a long, or start past nlongs, are left out.
+    """
+    offsets = []
+    for (name, tp, count) in layout.fields:
+        offset = layout.dtype.fields[name][1]
+        if name != "spad" and offset % 4 == 0 and (nlongs == None or offset//4 < nlongs):
+            offsets.append(offset//4)
+    return offsets
+
+
+def find_es(samples, sites=(0,), magic=ES_MAGIC, origin=0, verbose=0):
+    """find the ES in a (nsam, nlongs) uint32 array.
+
+    Args:
+        samples (ndarray) : from as_samples()
+
+        sites (list) : long offset of each site, the magic must repeat at each
+
+        magic (int) : ES magic
+
+        origin (int) : added to the indices, the first sample of a chunk
+
+    Returns:
+        (indices, es) : sample index of each ES, int64, and the ES payload,
+        a structured array of ES_DTYPE
+    """
+    nlongs = samples.shape[1]
+    sites = np.array(sites)
+    ix = np.flatnonzero(samples[:, 0] == magic)
+    cand = samples[ix]
+    valid = np.all(cand[:, sites] == magic, axis=1)
+    # the counts repeat in each site block, when the blocks are big enough
+    if len(sites) > 1 and np.diff(sites).min() > ES_CLOCK_COUNT and nlongs - sites[-1] > ES_CLOCK_COUNT:
+        valid &= np.all(cand[:, sites + ES_SAMPLE_COUNT] == cand[:, [ES_SAMPLE_COUNT]], axis=1)
+    if verbose and not valid.all():
+        print("find_es: %d candidates at %s failed validation" % (np.count_nonzero(~valid), ix[~valid][:8] + origin))
+    ix = ix[valid]
+    es = np.zeros(len(ix), dtype=ES_DTYPE)
+    if nlongs > ES_CLOCK_COUNT:
+        es["sample_count"] = cand[valid, ES_SAMPLE_COUNT]
+        es["clock_count"] = cand[valid, ES_CLOCK_COUNT]
+    return ix.astype(np.int64) + origin, es
+
+
+def find_es_file(src, nlongs, sites=(0,), magic=ES_MAGIC, chunk=0x4000000, verbose=0):
+    """find_es() on a file or buffer, chunk bytes at a time.
+
+    Args:
+        src : file path or buffer, see as_samples()
+
+        nlongs (int) : 32 bit words per sample
+
+        chunk (int) : bytes per pass, rounded to whole samples
+
+    Returns:
+        (indices, es) : as find_es()
+    """
+    samples = as_samples(src, nlongs)
+    step = max(chunk // (nlongs*4), 1)
+    ixs = [ np.zeros(0, dtype=np.int64) ]
+    ess = [ np.zeros(0, dtype=ES_DTYPE) ]
+    for r0 in range(0, len(samples), step):
+        ix, es = find_es(samples[r0:r0+step], sites, magic, origin=r0, verbose=verbose)
+        ixs.append(ix)
+        ess.append(es)
+    return np.concatenate(ixs), np.concatenate(ess)
+
+
+class Bursts:
+    """the bursts between event samples.
+
+    Args:
+        es (ndarray) : index of each ES, in column elements
+
+        payload (ndarray) : ES_DTYPE, one per ES
+
+        nelems (int) : column length, the last burst ends there
+
+        width (int) : column elements per ES
+
+    Attributes:
+        table (ndarray) : BURST_DTYPE, ES index, burst length after the ES, counts
+
+        blen (int) : shortest complete burst
+
+        period (int) : ES spacing, None if not regular, then view() copies
+
+        samples (ndarray) : the muxed samples, from_samples() only, for channel()
+    """
+    def __init__(self, es, payload, nelems, width=1):
+        self.width = width
+        self.table = np.zeros(len(es), dtype=BURST_DTYPE)
+        self.table["es"] = es
+        self.table["length"] = np.diff(np.append(es, nelems)) - width
+        self.table["sample_count"] = payload["sample_count"]
+        self.table["clock_count"] = payload["clock_count"]
+        # the last burst may be cut short by the end of the data
+        lengths = self.table["length"][:-1] if len(es) > 1 else self.table["length"]
+        self.blen = int(lengths.min()) if len(es) else 0
+        spacing = np.unique(np.diff(es))
+        self.period = int(spacing[0]) if len(spacing) == 1 else None
+        self.errors = 0
+        self.samples = None
+
+    def __repr__(self):
+        return "Bursts(nburst=%d, blen=%d, period=%s)" % (len(self.table), self.blen, self.period)
+
+    def __len__(self):
+        return len(self.table)
+
+    @staticmethod
+    def from_samples(samples, sites=(0,), magic=ES_MAGIC, chunk=0x4000000, verbose=0):
+        """bursts in muxed (nsam, nlongs) samples, see find_es_file()"""
+        es, payload = find_es_file(samples, samples.shape[1], sites, magic, chunk, verbose)
+        bursts = Bursts(es, payload, len(samples))
+        bursts.samples = samples
+        return bursts
+
+    @staticmethod
+    def from_channels(es_chans, count_chans=None, magic=ES_MAGIC, verbose=0):
+        """bursts in demuxed int16 channels, where the ES is two shorts wide.
+
+        Args:
+            es_chans (list) : int16 arrays, one channel per site with the magic
+
+            count_chans (list) : int16 arrays, the channel beside each with
+                the sample count, compared across sites
+
+        the burst count is the least over the sites. The ES must be at the
+        same index in every site, else ValueError.
+        """
+        ess = []
+        counts = []
+        for ic, ch in enumerate(es_chans):
+            ch32 = as_samples(ch, 1)[:, 0]
+            ix = np.flatnonzero(ch32 == magic)
+            ess.append(ix*2)
+            if count_chans is not None:
+                counts.append(as_samples(count_chans[ic], 1)[ix, 0])
+        nburst = min([ len(es) for es in ess ])
+        if verbose and max([ len(es) for es in ess ]) != nburst:
+            print("WARNING: burst count mismatch %s, min is %d" % ([ len(es) for es in ess ], nburst))
+        for ic, es in enumerate(ess[1:]):
+            bad = np.flatnonzero(es[:nburst] != ess[0][:nburst])
+            if len(bad):
+                raise ValueError("ES index mismatch, site %d burst %d at %d, site 0 at %d" %
+                                 (ic+1, bad[0], es[bad[0]], ess[0][bad[0]]))
+        payload = np.zeros(nburst, dtype=ES_DTYPE)
+        errors = 0
+        if counts:
+            counts = np.array([ cc[:nburst] for cc in counts ])
+            payload["sample_count"] = counts[0]
+            bad = np.flatnonzero(counts.min(axis=0) != counts.max(axis=0))
+            errors = len(bad)
+            if verbose and errors:
+                print("ERROR: count discrepancy at bursts %s" % (bad[:8]))
+        bursts = Bursts(ess[0][:nburst], payload, len(es_chans[0]), width=2)
+        bursts.errors = errors
+        return bursts
+
+    def view(self, column, blen=None, offset=None):
+        """returns the bursts in column as a (nburst, blen) array.
+
+        Args:
+            column (ndarray) : 1D, in the ES index units, may be strided
+
+            blen (int) : elements per burst, default the shortest burst,
+                longer runs into the next ES
+
+            offset (int) : burst start after the ES, default the ES width
+
+        a strided view of column, no copy, when the ES are regular, else a
+        copy. Bursts that run off the end of column are left out.
+        """
+        blen = self.blen if blen == None else blen
+        offset = self.width if offset == None else offset
+        starts = self.table["es"] + offset
+        nburst = np.count_nonzero(starts + blen <= len(column))
+        if nburst == 0:
+            return np.zeros((0, blen), dtype=column.dtype)
+        if self.period != None or nburst == 1:
+            step = column.strides[0]
+            period = self.period if self.period != None else 0
+            return np.lib.stride_tricks.as_strided(column[starts[0]:], shape=(nburst, blen),
+                                                   strides=(period*step, step), writeable=False)
+        return column[starts[:nburst, None] + np.arange(blen)]
+
+    def channel(self, ch, dtype=np.int16, blen=None, offset=None, samples=None):
+        """returns channel ch (from 0) of muxed samples as a (nburst, blen) view.
+
+        Args:
+            dtype : channel data type, int16 | int32
+
+            samples (ndarray) : (nsam, nlongs), default: the samples given
+                to from_samples()
+        """
+        samples = self.samples if samples is None else samples
+        return self.view(samples.view(dtype)[:, ch], blen, offset)
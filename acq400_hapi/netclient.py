@@ -13,6 +13,13 @@ import socket
 import re
 import sys
 import os
+import time
+import timeit
+import json
+import hashlib
+import atexit
+import contextlib
+import threading
 try:
     from future import builtins
     from builtins import input
@@ -37,22 +44,69 @@ class Netclient:
             
         Returns:
             string representing message        
-        """
 
-        match = termex.search(self.buffer)
+        Data is received with recv_into() to a reusable bytearray, and only the
+        newly arrived bytes (plus scan_overlap for a split terminator) are
+        searched, so a long multi-line reply costs O(n), not O(n^2).
+        Only the returned message is decoded.
+
+        The state lives in locals during the loop, and is stored once, direct
+        to __dict__, so the Siteclient knob proxy __setattr__ is not involved.
+        """
+        btermex = Netclient.bytes_termex(termex)
+        buffer = self.buffer
+        fill = self._fill
+        match = btermex.search(buffer, 0, fill)
         while match == None:
-            self.buffer += self.sock.recv(maxlen).decode("latin-1")
-            match = termex.search(self.buffer)
+            scan = fill - Netclient.scan_overlap
+            if len(buffer) - fill < maxlen:
+                buffer = self.grow_buffer(maxlen, fill)
+            nrx = self.sock.recv_into(self._view[fill:], maxlen)
+            if nrx == 0:
+                self.__dict__['_fill'] = fill
+                raise socket.error("%s connection closed" % (repr(self)))
+            fill += nrx
+            match = btermex.search(buffer, scan if scan > 0 else 0, fill)
 
-        rc = self.buffer[:match.start(1)]
-        self.buffer = self.buffer[match.end(1):]
+        end = match.end(1)
+        rc = buffer[:match.start(1)].decode("latin-1")
+        buffer[:fill-end] = buffer[end:fill]
+        self.__dict__['_fill'] = fill - end
         return rc
+
+    def grow_buffer(self, maxlen, fill=None):
+        """reallocate the receive buffer with room for at least maxlen more bytes, returns the buffer"""
+        fill = self._fill if fill == None else fill
+        buffer = bytearray(max(2*len(self.buffer), fill+maxlen))
+        buffer[:fill] = self.buffer[:fill]
+        self.__dict__['buffer'] = buffer
+        self.__dict__['_view'] = memoryview(buffer)
+        return buffer
+
+    # bytes of already scanned data to search again, must exceed the longest terminator
+    scan_overlap = 64
+    _bytes_termex = {}
+
+    @staticmethod
+    def bytes_termex(termex):
+        """returns termex compiled to match bytes, cached."""
+        btermex = Netclient._bytes_termex.get(termex)
+        if btermex == None:
+            if isinstance(termex.pattern, bytes):
+                btermex = termex
+            else:
+                btermex = re.compile(termex.pattern.encode("latin-1"), termex.flags & ~re.UNICODE)
+            Netclient._bytes_termex[termex] = btermex
+        return btermex
     
     trace = int(os.getenv("NETCLIENT_TRACE", "0"))   
+    nodelay = int(os.getenv("NETCLIENT_NODELAY", "0"))
                 
     def __init__(self, addr, port) :
         print("Netclient.init {} {}".format(addr, port))
-        self.buffer = ""
+        self.buffer = bytearray(4096)
+        self._view = memoryview(self.buffer)
+        self._fill = 0
         self.__addr = addr
         self.__port = int(port)
         try:
@@ -62,6 +116,8 @@ class Netclient:
             raise e
         if Netclient.trace:
             print("Netclient(%s, %d) connect" % (self.__addr, self.__port))
+        if Netclient.nodelay:
+            self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
         self.sock.connect((self.__addr, self.__port))
 
     def __enter__(self):
@@ -95,6 +151,313 @@ class Logclient(Netclient):
         return self.receive_message(self.termex)
 
 
+class KnobCache:
+    """value cache for read-only or slow-changing knobs.
+
+    Args:
+        ttls (list) : (regex, ttl) pairs, matched against the knob name,
+            first match wins. ttl in seconds, None: never expires.
+
+    Knobs that match no pattern are never cached.
+    """
+    DEFAULT_TTLS = (
+        (r"MODEL$", None),
+        (r"SITELIST$", None),
+        (r"module_name$", None),
+        (r"software_version$", None),
+        (r"NCHAN$", 10),
+        (r"data32$", 10),
+        (r"adc_18b$", 10),
+        (r"AI_CAL_", 60),
+    )
+
+    def __init__(self, ttls=DEFAULT_TTLS):
+        self.ttls = [(re.compile(regex), ttl) for (regex, ttl) in ttls]
+        self.policy = {}
+        self.values = {}
+        self.hits = 0
+        self.misses = 0
+
+    def ttl(self, name):
+        """return (True, ttl) if name is cacheable, else (False, None)"""
+        if name not in self.policy:
+            self.policy[name] = (False, None)
+            for (regex, ttl) in self.ttls:
+                if regex.match(name):
+                    self.policy[name] = (True, ttl)
+                    break
+        return self.policy[name]
+
+    def fetch(self, name, query):
+        """return cached value for name, on miss or expiry call query() and cache the result."""
+        (cacheable, ttl) = self.ttl(name)
+        if not cacheable:
+            return query()
+        entry = self.values.get(name)
+        if entry != None:
+            (value, expires) = entry
+            if expires == None or time.time() < expires:
+                self.hits += 1
+                return value
+        self.misses += 1
+        value = query()
+        self.values[name] = (value, None if ttl == None else time.time() + ttl)
+        return value
+
+    def invalidate(self, name=None):
+        """drop one entry, or all entries if name is None"""
+        if name == None:
+            self.values.clear()
+        else:
+            self.values.pop(name, None)
+
+    def stats(self):
+        return { "hits": self.hits, "misses": self.misses, "entries": len(self.values) }
+
+    def __repr__(self):
+        return 'KnobCache(hits=%d, misses=%d, entries=%d)' % (self.hits, self.misses, len(self.values))
+
+
+class SchemaCache:
+    """on-disk cache of the knob list per site, saves the "help" query on connect.
+
+    Opt in, off by default: set SITECLIENT_SCHEMA_CACHE=1 (~/.cache/acq400_hapi/knobs)
+    or =DIR, or pass schema_cache to Siteclient.
+
+    Entries are keyed on (uut, port, MODEL, software_version, fpga_version,
+    SITELIST), so a firmware update, a new FPGA image or a module swap
+    forces a fresh "help".
+
+    Args:
+        root (str) : cache directory, "" disables the cache.
+    """
+    # knobs that identify the knob list, besides software_version
+    IDENTITY = ("MODEL", "fpga_version", "SITELIST")
+    DEFAULT_ROOT = os.path.join(os.path.expanduser("~"), ".cache", "acq400_hapi", "knobs")
+
+    def __init__(self, root):
+        self.root = root
+
+    @staticmethod
+    def from_env(value):
+        """SchemaCache from a SITECLIENT_SCHEMA_CACHE value: ""|0: off, 1: DEFAULT_ROOT, else a directory"""
+        if value in ("", "0"):
+            return SchemaCache("")
+        return SchemaCache(SchemaCache.DEFAULT_ROOT if value == "1" else value)
+
+    @staticmethod
+    def queries(fw=None):
+        """the identity queries for key(), pipelined with "prompt on" """
+        return ["prompt on"] + list(SchemaCache.IDENTITY) + (["software_version"] if fw == None else [])
+
+    @staticmethod
+    def key(addr, port, rx, fw=None):
+        """key from the replies to queries(): (addr, port, MODEL, software_version, fpga_version, SITELIST)"""
+        nid = len(SchemaCache.IDENTITY)
+        ident = rx[1:1+nid]
+        return (addr, port, ident[0], fw if fw != None else rx[1+nid]) + tuple(ident[1:])
+
+    def path(self, key):
+        # readable part, then a digest of the whole key: SITELIST can be long
+        name = re.sub(r"[^\w.-]", "_", "_".join([str(k) for k in key[:4]]))
+        digest = hashlib.sha1("\n".join([str(k) for k in key]).encode()).hexdigest()[:12]
+        return os.path.join(self.root, "%s_%s.knobs" % (name, digest))
+
+    def load(self, key):
+        """returns knob string for key, or None on miss"""
+        if not self.root:
+            return None
+        try:
+            with open(self.path(key)) as fp:
+                knobstr = fp.read()
+        except (IOError, OSError):
+            return None
+        return knobstr if len(knobstr.split()) > 0 else None
+
+    def save(self, key, knobstr):
+        """store knob string for key, failure is not an error, the cache is optional"""
+        if not self.root:
+            return
+        try:
+            if not os.path.isdir(self.root):
+                os.makedirs(self.root)
+            tmp = "%s.%d" % (self.path(key), os.getpid())
+            with open(tmp, "w") as fp:
+                fp.write(knobstr)
+            getattr(os, "replace", os.rename)(tmp, self.path(key))
+        except (IOError, OSError) as e:
+            print("SchemaCache {} save fail {}".format(self.root, e))
+
+
+class RttHistogram:
+    """HDR style histogram of round trip times, fixed relative precision.
+
+    Times are counted in microseconds. Below 2**sub_bits us the buckets are
+    1 us wide, above, each power of two is split into 2**(sub_bits-1)
+    buckets, so a reported value is within 2**(1-sub_bits) of the truth
+    (1.6% at sub_bits=7) from 1 us to hours, in a few hundred counters.
+    """
+    def __init__(self, sub_bits=7):
+        self.sub_bits = sub_bits
+        self.counts = {}
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+
+    def index(self, us):
+        nsub = 1 << self.sub_bits
+        if us < nsub:
+            return us
+        shift = us.bit_length() - self.sub_bits
+        return nsub + (shift-1)*(nsub//2) + (us >> shift) - nsub//2
+
+    def value(self, index):
+        """returns the middle of bucket index, in us"""
+        nsub = 1 << self.sub_bits
+        if index < nsub:
+            return float(index)
+        shift = (index - nsub)//(nsub//2) + 1
+        low = ((index - nsub)%(nsub//2) + nsub//2) << shift
+        return low + ((1 << shift) - 1)/2.0
+
+    def record(self, seconds):
+        us = int(seconds*1000000)
+        ix = self.index(us)
+        self.counts[ix] = self.counts.get(ix, 0) + 1
+        self.count += 1
+        self.total += seconds
+        if self.min == None or seconds < self.min:
+            self.min = seconds
+        if self.max == None or seconds > self.max:
+            self.max = seconds
+
+    def merge(self, other):
+        for ix, n in other.counts.items():
+            self.counts[ix] = self.counts.get(ix, 0) + n
+        self.count += other.count
+        self.total += other.total
+        for x in (other.min, other.max):
+            if x != None:
+                self.min = x if self.min == None else min(self.min, x)
+                self.max = x if self.max == None else max(self.max, x)
+
+    def percentile(self, pc):
+        """returns the pc percentile in seconds, 0 if empty"""
+        if self.count == 0:
+            return 0.0
+        rank = pc/100.0*self.count
+        seen = 0
+        for ix in sorted(self.counts):
+            seen += self.counts[ix]
+            if seen >= rank:
+                return min(max(self.value(ix)/1000000, self.min), self.max)
+        return self.max
+
+    def stats(self):
+        """count, and min, mean, p50, p90, p99, p999, max in seconds"""
+        st = { "count": self.count, "min": self.min or 0.0, "max": self.max or 0.0,
+               "mean": self.total/self.count if self.count else 0.0 }
+        for pc in (50, 90, 99, 99.9):
+            st["p%s" % (str(pc).replace(".", ""))] = self.percentile(pc)
+        return st
+
+
+class RttStats:
+    """round trip time histograms per (addr, port, knob, op).
+
+    op is get or set for one command by sr(), pget, pset for a command
+    pipelined by sr_many(), timed from the send of the lot to its reply.
+    Thread safe, Siteclients in different threads may share one RttStats.
+    """
+    def __init__(self, sub_bits=7):
+        self.sub_bits = sub_bits
+        self.hists = {}
+        self.lock = threading.Lock()
+
+    def record(self, addr, port, knob, op, seconds):
+        key = (addr, port, knob, op)
+        with self.lock:
+            hist = self.hists.get(key)
+            if hist == None:
+                hist = self.hists[key] = RttHistogram(self.sub_bits)
+            hist.record(seconds)
+
+    def reset(self):
+        with self.lock:
+            self.hists = {}
+
+    def histogram(self, addr=None, port=None, knob=None, op=None):
+        """returns one RttHistogram, all the keys that match, None matches any"""
+        merged = RttHistogram(self.sub_bits)
+        with self.lock:
+            for key, hist in self.hists.items():
+                if all([want == None or want == got for (want, got) in zip((addr, port, knob, op), key)]):
+                    merged.merge(hist)
+        return merged
+
+    def stats(self):
+        """returns a list of (key, stats), slowest p99 first"""
+        with self.lock:
+            st = [(key, hist.stats()) for key, hist in self.hists.items()]
+        return sorted(st, key=lambda x: x[1]["p99"], reverse=True)
+
+    def report(self, limit=0, fp=sys.stdout):
+        """print a table, slowest p99 first, limit: rows, 0: all"""
+        st = self.stats()
+        fp.write("%-24s %-6s %-28s %-4s %8s %9s %9s %9s %9s\n" %
+                 ("addr", "port", "knob", "op", "count", "p50 us", "p99 us", "max us", "total s"))
+        for (addr, port, knob, op), hs in st[:limit] if limit else st:
+            fp.write("%-24s %-6d %-28s %-4s %8d %9.0f %9.0f %9.0f %9.3f\n" %
+                     (addr, port, knob, op, hs["count"], hs["p50"]*1e6, hs["p99"]*1e6,
+                      hs["max"]*1e6, hs["mean"]*hs["count"]))
+
+    def dump(self, path=None):
+        """returns the histograms as a dict, and writes it as JSON to path"""
+        with self.lock:
+            hists = [{ "addr": addr, "port": port, "knob": knob, "op": op, "stats": hist.stats(),
+                       "buckets": dict((str(hist.value(ix)), n) for ix, n in sorted(hist.counts.items())) }
+                     for (addr, port, knob, op), hist in self.hists.items()]
+        dump = { "unit": "us", "sub_bits": self.sub_bits, "histograms": hists }
+        if path:
+            with open(path, "w") as fp:
+                json.dump(dump, fp, indent=1)
+        return dump
+
+
+class KnobBatch:
+    """knob writes queued in order, on one or more Siteclients.
+
+    flush() sends each run of writes to the same service with one
+    sr_many(), so the order across services is kept, eg s0, s0, s1, s0
+    goes out as three writes.
+    """
+    def __init__(self):
+        self.writes = []
+
+    def __len__(self):
+        return len(self.writes)
+
+    def append(self, svc, message):
+        self.writes.append((svc, message))
+
+    def flush(self):
+        """send the queued writes in order, returns their replies"""
+        writes = self.writes
+        self.writes = []
+        rxs = []
+        while writes:
+            svc = writes[0][0]
+            nrun = 1
+            while nrun < len(writes) and writes[nrun][0] is svc:
+                nrun += 1
+            run = svc.sr_many([message for (sx, message) in writes[:nrun]])
+            svc.batch_rx.extend(run)
+            rxs.extend(run)
+            writes = writes[nrun:]
+        return rxs
+
+
 class Siteclient(Netclient):   
     """Netclient optimised for site service, may be multi-line response.
     
@@ -114,16 +477,107 @@ class Siteclient(Netclient):
         Returns:
             rx (str): response string
         """
+        if self.pending:
+            self.flush()
         if (self.trace):
             print("%s >%s" % (repr(self), message.rstrip()))
+        if Siteclient.rtt_enable:
+            t0 = timeit.default_timer()
         self.sock.send((message+"\n").encode())
         rx = self.receive_message(self.termex).rstrip()
+        if Siteclient.rtt_enable:
+            self.record_rtt(message, "", timeit.default_timer() - t0)
         if self.show_responses and len(rx) > 1:
             print(rx)
         if (self.trace):
             print("%s <%s" % (repr(self), rx))
         return rx
- 
+
+    def record_rtt(self, message, mode, seconds):
+        knob, op = message.split("=", 1)[0], "set"
+        if knob == message:
+            knob, op = message.split(" ", 1)[0], "get"
+        Siteclient.rtt.record(self.addr(), self.port(), knob.strip(), mode+op, seconds)
+
+    def sr_many(self, messages):
+        """send a list of commands in one write, then receive the replies in order.
+
+        Costs ~1 RTT for the lot, rather than one RTT per command.
+
+        Args:
+            messages (list) : commands (queries or knob=value) to send
+
+        Returns:
+            rxs (list): response string per command, including any error text
+        """
+        if len(messages) == 0:
+            return []
+        if (self.trace):
+            for message in messages:
+                print("%s >%s" % (repr(self), message.rstrip()))
+        if Siteclient.rtt_enable:
+            t0 = timeit.default_timer()
+        self.sock.sendall("".join([message+"\n" for message in messages]).encode())
+        rxs = []
+        for message in messages:
+            rx = self.receive_message(self.termex).rstrip()
+            if Siteclient.rtt_enable:
+                self.record_rtt(message, "p", timeit.default_timer() - t0)
+            if self.show_responses and len(rx) > 1:
+                print(rx)
+            if (self.trace):
+                print("%s <%s" % (repr(self), rx))
+            rxs.append(rx)
+        return rxs
+
+    def begin_batch(self, batch=None):
+        """queue knob writes until end_batch(), returns False if already batching
+
+        Args:
+            batch (KnobBatch) : queue shared with other services, keeps the
+                order of writes across them, default: a queue of our own
+        """
+        if self.pending != None:
+            return False
+        self.__dict__['pending'] = batch if batch != None else KnobBatch()
+        self.__dict__['batch_rx'] = []
+        return True
+
+    def flush(self):
+        """send queued knob writes, including those of services sharing the
+        batch, returns their replies"""
+        if not self.pending:
+            return []
+        return self.pending.flush()
+
+    def end_batch(self):
+        """flush queued knob writes and stop queueing, returns all batch replies"""
+        try:
+            self.flush()
+        finally:
+            self.__dict__['pending'] = None
+        return self.batch_rx
+
+    @contextlib.contextmanager
+    def batch(self):
+        """context: knob writes are queued and sent in one write on exit.
+
+        eg::
+
+            with uut.s1.batch() as rxs:
+                uut.s1.TRG = 1
+                uut.s1.TRG_DX = 0
+            # rxs holds one reply per write
+
+        A knob read inside the batch flushes the queue first, nested
+        batches are flushed by the outermost.
+        """
+        began = self.begin_batch()
+        try:
+            yield self.batch_rx
+        finally:
+            if began:
+                self.end_batch()
     
     def build_knobs(self, knobstr):
 # http://stackoverflow.com/questions/10967551/how-do-i-dynamically-create-properties-in-python
@@ -146,10 +600,24 @@ class Siteclient(Netclient):
         return hr
             
 
+    def enable_cache(self, ttls=KnobCache.DEFAULT_TTLS):
+        """cache values of slow-changing knobs, see KnobCache.
+
+        Set the env SITECLIENT_CACHE=1 to enable on all Siteclients.
+        """
+        self.__dict__['cache'] = KnobCache(ttls)
+        return self.cache
+
+    def disable_cache(self):
+        self.__dict__['cache'] = None
+
     def __getattr__(self, name):
         if self.knobs == None:
             return object.__setattr__(self, name)
         if self.knobs.get(name) != None:
+                cache = self.__dict__.get('cache')
+                if cache != None:
+                    return cache.fetch(name, lambda: self.sr(self.knobs.get(name)))
                 return self.sr(self.knobs.get(name))
         else:
                 msg = "'{0}' object has no attribute '{1}'"
@@ -159,6 +627,12 @@ class Siteclient(Netclient):
         if self.knobs == None:
             return object.__setattr__(self, name, value)                 
         if self.knobs.get(name) != None:
+            # write-through: drop the cached value, the UUT may adjust it
+            if self.__dict__.get('cache') != None:
+                self.cache.invalidate(name)
+            if self.__dict__.get('pending') != None:
+                self.pending.append(self, "%s=%s" % (self.knobs.get(name), value))
+                return None
             return self.sr("%s=%s" % (self.knobs.get(name), value))
         elif not self.prevent_autocreate or self.__dict__.get(name) != None:
             self.__dict__[name] = value
@@ -175,10 +649,57 @@ class Siteclient(Netclient):
         return 'Siteclient(%s, %d)' % (self.addr(), self.port())   
     
     trace = int(os.getenv("SITECLIENT_TRACE", "0"))
+    cache_enable = int(os.getenv("SITECLIENT_CACHE", "0"))
+    # SITECLIENT_RTT=1: record round trips in Siteclient.rtt, 2: and report at exit,
+    # SITECLIENT_RTT_DUMP=file: and dump the histograms as JSON at exit
+    rtt_enable = int(os.getenv("SITECLIENT_RTT", "0"))
+    rtt = RttStats()
+    # SITECLIENT_SCHEMA_CACHE=1|DIR: cache knob lists on disk, see SchemaCache
+    schema_cache = SchemaCache.from_env(os.getenv("SITECLIENT_SCHEMA_CACHE", ""))
+
+    def load_knobs(self, fw=None):
+        """enumerate knobs, from schema_cache if the SchemaCache identity matches.
+
+        The identity queries are pipelined with "prompt on", so a cache hit
+        costs one round trip, and no "help".
+        """
+        if not self.schema_cache.root:
+            self.sr("prompt on")
+            self.build_knobs(self.sr("help"))
+            return
+        rx = self.sr_many(SchemaCache.queries(fw))
+        self.schema_key = SchemaCache.key(self.addr(), self.port(), rx, fw)
+        knobstr = self.schema_cache.load(self.schema_key)
+        if knobstr == None:
+            knobstr = self.sr("help")
+            self.schema_cache.save(self.schema_key, knobstr)
+        self.build_knobs(knobstr)
+
+    def refresh_knobs(self):
+        """re-enumerate knobs with "help" and update the schema_cache"""
+        knobstr = self.sr("help")
+        if self.schema_key != None:
+            self.schema_cache.save(self.schema_key, knobstr)
+        self.build_knobs(knobstr)
     
-    def __init__(self, addr, port):
+    def __init__(self, addr, port, fw=None, schema_cache=None):
+        """
+        Args:
+            fw (str) : optional software_version, typically from site 0,
+                saves the query on sites that share the firmware.
+
+            schema_cache (SchemaCache|str) : knob list cache, or its
+                directory, default: Siteclient.schema_cache, off unless
+                SITECLIENT_SCHEMA_CACHE is set
+        """
 #        print("Siteclient.init")
         self.knobs = {}
+        self.schema_key = None
+        if schema_cache != None:
+            self.schema_cache = schema_cache if isinstance(schema_cache, SchemaCache) else SchemaCache(schema_cache)
+        self.cache = None
+        self.pending = None
+        self.batch_rx = []
         
         self.show_responses = False
         Netclient.__init__(self, addr, port) 
@@ -186,13 +707,71 @@ class Siteclient(Netclient):
         self.prevent_autocreate = False
         self.termex = re.compile(r"\n(acq400.[0-9]+ ([0-9]+) >)")
         self.trace = 1 if Siteclient.trace > 1 else 0
-        self.sr("prompt on")
-        self.build_knobs(self.sr("help"))
+        self.load_knobs(fw)
         self.trace = Siteclient.trace
+        if Siteclient.cache_enable:
+            self.enable_cache()
         self.prevent_autocreate = True
         #self.show_responses = True
 
 
+if Siteclient.rtt_enable > 1:
+    atexit.register(Siteclient.rtt.report)
+if Siteclient.rtt_enable and os.getenv("SITECLIENT_RTT_DUMP"):
+    atexit.register(Siteclient.rtt.dump, os.getenv("SITECLIENT_RTT_DUMP"))
+
+
+class LazySiteclient:
+    """proxy for a Siteclient, connects on first attribute access.
+
+    Saves the connection and knob enumeration for sites a script never touches.
+
+    Args:
+        addr, port, fw : as Siteclient
+    """
+    def __init__(self, addr, port, fw=None):
+        self.__dict__['_args'] = (addr, port, fw)
+        self.__dict__['_client'] = None
+        self.__dict__['_lock'] = threading.Lock()
+        self.__dict__['_ttls'] = None
+
+    def connect(self):
+        """connect now if not already connected, returns the Siteclient"""
+        with self._lock:
+            if self._client == None:
+                (addr, port, fw) = self._args
+                client = Siteclient(addr, port, fw=fw)
+                if self._ttls != None:
+                    client.enable_cache(self._ttls)
+                self.__dict__['_client'] = client
+        return self._client
+
+    def connected(self):
+        return self._client != None
+
+    def begin_batch(self, batch=None):
+        return self.connect().begin_batch(batch)
+
+    def enable_cache(self, ttls=KnobCache.DEFAULT_TTLS):
+        """enable the KnobCache now if connected, else when it connects"""
+        self.__dict__['_ttls'] = ttls
+        return self._client.enable_cache(ttls) if self._client != None else None
+
+    def disable_cache(self):
+        self.__dict__['_ttls'] = None
+        if self._client != None:
+            self._client.disable_cache()
+
+    def __getattr__(self, name):
+        return getattr(self.connect(), name)
+
+    def __setattr__(self, name, value):
+        setattr(self.connect(), name, value)
+
+    def __repr__(self):
+        return 'LazySiteclient(%s, %d)' % (self._args[0], self._args[1])
+
+
 def run_unit_test():
     SERVER_ADDRESS = 'acq2106_066'
     SERVER_PORT=4233
@@ -0,0 +1,110 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+sample_layout.py describes a muxed sample, mixed short and long fields
+
+- SampleLayout : an ordered list of fields, compiled to a numpy structured
+  dtype. A file or stream block is then one array of samples, each field
+  a zero-copy strided view, no per-sample loop, eg::
+
+       layout = SampleLayout.parse("CH:i2*16,DI32:u4,SAMPLE:u4,usec:u4,fill:u4")
+       data = layout.memmap("event-1-50000-50000.dat")
+       ch09 = data["CH"][:,8]
+       usec = data["usec"]
+
+  or from the uut: one field per aggregator site, NCHAN x i2|i4, then the
+  spad longs::
+
+       layout = SampleLayout.from_uut(uut)     # s1:i2*32,spad:u4*8
+       for block in uut.create_stream_client().blocks(0x400000):
+           spad = layout.view(block)["spad"]
+"""
+
+import numpy as np
+
+
+class SampleLayout:
+    """the fields of one sample, in order.
+
+    Args:
+        fields (list) : (name, type, count), type a numpy type string,
+            eg i2, i4, u4, count 1 is a scalar field, >1 an array field
+    """
+    def __init__(self, fields):
+        # type without byte order, the data is little endian
+        self.fields = [ (name, np.dtype(tp).str[1:], int(count)) for (name, tp, count) in fields ]
+        self.dtype = np.dtype([ (name, '<'+tp) if count == 1 else (name, '<'+tp, (count,))
+                                for (name, tp, count) in self.fields ])
+        self.sample_bytes = self.dtype.itemsize
+
+    def __repr__(self):
+        return "SampleLayout(%s)" % (self.spec())
+
+    def spec(self):
+        """returns the layout as a parse() string"""
+        return ",".join([ "%s:%s%s" % (name, tp, "*%d" % (count) if count > 1 else "")
+                          for (name, tp, count) in self.fields ])
+
+    @staticmethod
+    def parse(spec):
+        """layout from a string "NAME:TYPE[*COUNT],..", eg "CH:i2*4,INDEX:i4,FACET:i4" """
+        fields = []
+        for field in spec.split(","):
+            name, _, tp = field.strip().partition(":")
+            tp, _, count = tp.partition("*")
+            fields.append((name, tp, int(count) if count else 1))
+        return SampleLayout(fields)
+
+    @staticmethod
+    def from_sites(uut, sites, spad=None):
+        """layout of the sites, in order, plus spad.
+
+        Args:
+            uut (Acq400) : reads NCHAN, data32 per site
+
+            sites (str|list) : eg "1,2,3"
+
+            spad (str) : s0.spad format "1,N,0", N longs, None or "0,..": none
+        """
+        if isinstance(sites, str):
+            sites = sites.split(",")
+        fields = []
+        for site in sites:
+            svc = uut.svc['s{}'.format(site)]
+            fields.append(("s{}".format(site), 'i4' if svc.data32 == '1' else 'i2', int(svc.NCHAN)))
+        if spad != None:
+            en, nspad = spad.split(",")[:2]
+            if en != '0' and int(nspad) > 0:
+                fields.append(("spad", 'u4', int(nspad)))
+        return SampleLayout(fields)
+
+    @staticmethod
+    def from_uut(uut):
+        """layout of the aggregator sites and spad, as the uut is set now"""
+        return SampleLayout.from_sites(uut, uut.get_aggregator_sites(), uut.s0.spad)
+
+    def view(self, buf):
+        """returns buf as an array of samples, zero-copy, a partial sample at the end is left out"""
+        nsam = memoryview(buf).nbytes // self.sample_bytes
+        return np.frombuffer(buf, dtype=self.dtype, count=nsam)
+
+    def memmap(self, path, offset=0, mode='r'):
+        """returns the file from byte offset as a memory mapped array of samples"""
+        with open(path, 'rb') as fp:
+            fp.seek(0, 2)
+            nsam = (fp.tell() - offset) // self.sample_bytes
+        return np.memmap(path, dtype=self.dtype, mode=mode, offset=offset, shape=(nsam,))
+
+    def words(self, data, dtype=np.uint32):
+        """returns samples as a 2D (nsam, words) array of dtype, zero-copy, eg for hexdump"""
+        nwords = self.sample_bytes // np.dtype(dtype).itemsize
+        nsam = memoryview(data).nbytes // self.sample_bytes
+        return np.frombuffer(data, dtype=dtype, count=nsam*nwords).reshape(nsam, nwords)
+
+    def hexdump_format(self):
+        """returns a hexdump -e format, one line per sample, a sample count then each field in hex"""
+        fmt = '"%10_ad," '
+        for (name, tp, count) in self.fields:
+            size = np.dtype(tp).itemsize
+            fmt += '" " {}/{} "%0{}x," '.format(count, size, 2*size)
+        return fmt + '"\\n"'
@@ -159,9 +159,42 @@ class ShotController:
             ii = ii + 1
         return cmap
 
-    def read_channels(self, channels=()):
+    def read_channels(self, channels=(), max_connections=None):
+        """read channels from all uuts concurrently.
+
+        Args:
+            max_connections (int) : total channel connections in flight over
+              all uuts, shared evenly between them, default: each uut runs
+              its own Acq400.max_inflight (1: serial).
+
+        Returns:
+            (chx, nuut, nchan, nsam)
+        """
         cmap = self.map_channels(channels)
-        chx = [u.read_channels(cmap[u]) for u in self.uuts]
+        if max_connections == None:
+            inflight = [u.max_inflight for u in self.uuts]
+            max_connections = sum(inflight)
+        else:
+            share = max(1, -(-max_connections // len(self.uuts)))
+            inflight = [share for u in self.uuts]
+        # global cap, each uut is also held to its own inflight
+        budget = threading.BoundedSemaphore(max_connections)
+        chx = [None] * len(self.uuts)
+        errors = []
+
+        def upload(ix, u):
+            try:
+                chx[ix] = u.read_channels(cmap[u], max_inflight=inflight[ix], budget=budget)
+            except Exception as e:
+                errors.append(e)
+
+        uploaders = [threading.Thread(target=upload, args=(ix, u)) for (ix, u) in enumerate(self.uuts)]
+        for t in uploaders:
+            t.start()
+        for t in uploaders:
+            t.join()
+        if errors:
+            raise errors[0]
 
         if self.uuts[0].save_data:
             with open("%s/format" % (self.uuts[0].save_data), 'w') as fid:
@@ -0,0 +1,276 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+stream_demux.py demux the live stream as it arrives
+
+- StreamDemux : scatters each muxed block to per channel np.memmap files,
+  a dirfile: root/UUT_CC.dat plus root/format, the host_demux.py layout.
+  The channel data is complete when the stream ends, no second pass, eg::
+
+       dm = StreamDemux("DATA/acq2106_001", "acq2106_001", nchan=32)
+       for buf in StreamClient("acq2106_001").blocks(0x400000):
+           dm.write(buf)
+       dm.close()
+
+  or attach it to a recorder, raw files and dirfile in one pass::
+
+       StreamRecorder(uut, mode="recv", demux=dm).record()
+
+- demux_files() : the same for raw files already on disk, each file memory
+  mapped and demuxed a chunk at a time, memory use is one chunk however
+  big the capture, eg::
+
+       demux_files(sorted(glob.glob("DATA/acq2106_001/0000*/*")), dm)
+
+- demux_files_parallel() : the same with a process pool, each worker
+  demuxes a contiguous sample range to its own offset in the shared files.
+"""
+
+import multiprocessing
+import os
+import timeit
+
+import numpy as np
+
+from .acq400 import Acq400
+
+
+class StreamDemux:
+    """demux a muxed stream to per channel memory mapped files.
+
+    Each block is reshaped (nsam, nchan) and transposed in one copy, each
+    channel row then goes to its memmap. A partial sample at the end of a
+    block is carried to the next.
+
+    Args:
+        root (str) : dirfile directory
+
+        uut (str) : uut name, files are UUT_CC.dat
+
+        nchan (int) : channels per sample
+
+        data_size : 2|4 short or int
+
+        channels (list) : channels to keep, 1..nchan, default: all
+
+        nsam_hint (int) : expected samples, initial file size, files grow by doubling
+
+        origin (int) : None: a new dirfile. Else, fill in part of an existing
+            dirfile from sample origin, files are not grown or trimmed and
+            close() writes no format, see demux_files_parallel()
+    """
+    trace = int(os.getenv("STREAM_DEMUX_TRACE", "0"))
+
+    def __init__(self, root, uut, nchan, data_size=2, channels=(), nsam_hint=0x100000, origin=None):
+        self.root = root
+        self.uut = uut
+        self.nchan = nchan
+        self.data_size = data_size
+        self.dtype = np.dtype('<i4' if data_size == 4 else '<i2')
+        self.channels = list(channels) if len(channels) else list(range(1, nchan+1))
+        self.index = np.array([ch-1 for ch in self.channels])
+        self.sample_bytes = nchan * data_size
+        self.partial = bytearray()
+        self.nsam = 0
+        self.capacity = 0
+        self.maps = []
+        self.origin = origin
+        if origin != None:
+            # whole files, shared with other writers, write from origin
+            self.maps = [ np.memmap(self.path(ch), dtype=self.dtype, mode='r+') for ch in self.channels ]
+            self.capacity = len(self.maps[0]) - origin
+            return
+        try:
+            os.makedirs(root)
+        except OSError:
+            pass
+        self.grow(max(nsam_hint, 1))
+
+    def __repr__(self):
+        return "StreamDemux(%s, %s, %d)" % (self.root, self.uut, self.nchan)
+
+    @staticmethod
+    def for_uut(root, uut):
+        """StreamDemux to root, sample size from the uut, includes spad"""
+        u = Acq400(uut, monitor=False)
+        data_size = 4 if u.s0.data32 == '1' else 2
+        try:
+            nchan = int(u.s0.ssb) // data_size
+        except AttributeError:
+            nchan = int(u.s0.NCHAN)
+        return StreamDemux(root, uut, nchan, data_size=data_size)
+
+    def path(self, ch):
+        return "{}/{}_{:02d}.dat".format(self.root, self.uut, ch)
+
+    def grow(self, capacity):
+        """remap every channel file to hold capacity samples"""
+        for mm in self.maps:
+            mm.flush()
+        mode = 'r+' if self.capacity else 'w+'
+        self.maps = [ np.memmap(self.path(ch), dtype=self.dtype, mode=mode, shape=(capacity,))
+                      for ch in self.channels ]
+        self.capacity = capacity
+        if self.trace:
+            print("%s capacity %d" % (repr(self), capacity))
+
+    def put_samples(self, buf):
+        """demux whole samples, buf length is a multiple of sample_bytes"""
+        nsam = len(buf) // self.sample_bytes
+        if nsam == 0:
+            return
+        if self.nsam + nsam > self.capacity:
+            if self.origin != None:
+                raise ValueError("%s samples beyond the end of file" % (repr(self)))
+            capacity = self.capacity
+            while self.nsam + nsam > capacity:
+                capacity *= 2
+            self.grow(capacity)
+        block = np.frombuffer(buf, self.dtype, count=nsam*self.nchan).reshape(nsam, self.nchan)
+        chx = block.T[self.index]          # (nkeep, nsam), one copy
+        i0 = self.nsam if self.origin == None else self.origin + self.nsam
+        for mm, cx in zip(self.maps, chx):
+            mm[i0:i0+nsam] = cx
+        self.nsam += nsam
+
+    def write(self, buf):
+        """demux a block of any length, returns bytes taken"""
+        view = memoryview(buf)
+        nbytes = len(view)
+        if len(self.partial):
+            need = self.sample_bytes - len(self.partial)
+            self.partial += view[:need]
+            view = view[need:]
+            if len(self.partial) < self.sample_bytes:
+                return nbytes
+            self.put_samples(self.partial)
+            self.partial = bytearray()
+        whole = len(view) - len(view) % self.sample_bytes
+        self.put_samples(view[:whole])
+        self.partial += view[whole:]
+        return nbytes
+
+    def close(self):
+        """trim the files to the samples received, write the format file.
+
+        Returns:
+            nsam (int) : samples per channel
+        """
+        for mm in self.maps:
+            mm.flush()
+        self.maps = []
+        if self.origin != None:
+            return self.nsam
+        for ch in self.channels:
+            os.truncate(self.path(ch), self.nsam * self.data_size)
+        if len(self.partial):
+            print("%s dropped %d bytes, partial sample at end" % (repr(self), len(self.partial)))
+        with open("{}/format".format(self.root), 'w') as fmt:
+            fmt.write("# dirfile format file for {}\n".format(self.uut))
+            for ch in self.channels:
+                fmt.write("{}_{:02d}.dat RAW {} 1\n".format(self.uut, ch, 'S' if self.data_size == 4 else 's'))
+        return self.nsam
+
+
+def file_chunks(paths, r0=0, r1=None, chunk=0x4000000):
+    """yields memory mapped chunks of bytes r0..r1 of paths, end to end"""
+    base = 0
+    for path in paths:
+        size = os.path.getsize(path)
+        f0 = max(r0 - base, 0)
+        f1 = size if r1 == None else min(r1 - base, size)
+        base += size
+        if f1 <= f0:
+            continue
+        raw = np.memmap(path, dtype=np.uint8, mode='r', shape=(size,))
+        for offset in range(f0, f1, chunk):
+            yield path, raw[offset:min(offset+chunk, f1)]
+        del raw
+
+
+def demux_files(paths, demux, chunk=0x4000000, verbose=0):
+    """demux raw muxed files, in order, in bounded memory.
+
+    Each file is memory mapped and passed to demux.write() chunk bytes at a
+    time. A sample split across two files is carried over, so a file need
+    not hold whole samples, eg an AFHBA404 buffer of a 96 channel uut.
+
+    Args:
+        paths (list) : raw files, in stream order
+
+        demux (StreamDemux) : output, close() it after
+
+        chunk (int) : bytes per write, the transpose buffer size
+
+    Returns:
+        nbytes (int) : bytes demuxed
+    """
+    chunk = max(chunk - chunk % demux.sample_bytes, demux.sample_bytes)
+    nbytes = 0
+    for path, raw in file_chunks(paths, chunk=chunk):
+        demux.write(raw)
+        nbytes += len(raw)
+        if verbose:
+            print("%s %s %d bytes" % (repr(demux), path, len(raw)))
+    return nbytes
+
+
+def demux_part(job):
+    """demux_files_parallel() worker: samples s0..s1 of the stream"""
+    (wid, paths, root, uut, nchan, data_size, channels, s0, s1, chunk) = job
+    t0 = timeit.default_timer()
+    demux = StreamDemux(root, uut, nchan, data_size=data_size, channels=channels, origin=s0)
+    chunk = max(chunk - chunk % demux.sample_bytes, demux.sample_bytes)
+    for path, raw in file_chunks(paths, s0*demux.sample_bytes, s1*demux.sample_bytes, chunk):
+        demux.write(raw)
+    nsam = demux.close()
+    return { "worker": wid, "s0": s0, "s1": s1, "nsam": nsam, "bytes": nsam*demux.sample_bytes,
+             "seconds": timeit.default_timer() - t0, "pid": os.getpid() }
+
+
+def demux_files_parallel(paths, root, uut, nchan, data_size=2, channels=(), jobs=4,
+                         chunk=0x4000000, verbose=0):
+    """demux raw muxed files with a pool of jobs processes.
+
+    The stream is cut into jobs contiguous sample ranges, each worker
+    demuxes its range into the same per channel files, at its own offset.
+    The files are created full size first, so the workers never overlap.
+
+    Args:
+        paths (list) : raw files, in stream order
+
+        root, uut, nchan, data_size, channels : as StreamDemux
+
+        jobs (int) : worker processes
+
+    Returns:
+        (nsam, stats) : samples per channel, and per worker stats with
+            "aggregate" : bytes, seconds (wall), MB/s
+    """
+    sample_bytes = nchan * data_size
+    nsam = sum([os.path.getsize(path) for path in paths]) // sample_bytes
+    t0 = timeit.default_timer()
+    demux = StreamDemux(root, uut, nchan, data_size=data_size, channels=channels, nsam_hint=nsam)
+    for mm in demux.maps:
+        mm.flush()
+    demux.maps = []
+    bounds = [ nsam*ii//jobs for ii in range(jobs+1) ]
+    work = [ (ii, paths, root, uut, nchan, data_size, demux.channels, bounds[ii], bounds[ii+1], chunk)
+             for ii in range(jobs) if bounds[ii+1] > bounds[ii] ]
+    pool = multiprocessing.Pool(max(len(work), 1))
+    try:
+        stats = {}
+        for st in pool.imap_unordered(demux_part, work):
+            stats[st["worker"]] = st
+            if verbose:
+                print("%s worker %d samples %d..%d %.1f MB/s" %
+                      (repr(demux), st["worker"], st["s0"], st["s1"], st["bytes"]/1000000/max(st["seconds"], 1e-9)))
+    finally:
+        pool.close()
+        pool.join()
+    demux.nsam = nsam
+    demux.close()
+    tt = timeit.default_timer() - t0
+    nbytes = nsam * sample_bytes
+    stats["aggregate"] = { "bytes": nbytes, "seconds": tt, "MB/s": nbytes/1000000/max(tt, 1e-9) }
+    return nsam, stats
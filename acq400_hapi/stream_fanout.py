@@ -0,0 +1,253 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+stream_fanout.py republish one uut stream to many local clients
+
+- StreamFanout : holds the single upstream connection through a StreamTee,
+  serves any number of clients on UNIX-domain or TCP listeners. A client
+  sees a plain stream, exactly as from port 4210, eg::
+
+       fan = StreamFanout("acq2106_001", ["tcp:127.0.0.1:4210,policy=block",
+                                          "unix:/tmp/acq2106_001.plot,decimate=100"],
+                          nchan=32)
+       fan.run(report=10)
+
+- listener spec: unix:PATH[,opt=value..] or tcp:[HOST:]PORT[,opt=value..]
+
+  - decimate=N : every Nth sample, needs nchan, data_size
+  - policy=drop-oldest|block|decimate : slow client policy, see StreamTee.
+    Default drop-oldest: a slow client loses its oldest blocks, and never
+    stalls the upstream or the other clients. policy=block for a client
+    that must see every byte, eg an archive, at the risk of stalling all.
+  - depth=N : client queue depth in blocks
+
+- each client is fed by one sendmsg() per batch of queued blocks,
+  scatter-gather straight from the shared buffers, with a large SO_SNDBUF.
+"""
+
+import os
+import socket
+import threading
+import timeit
+
+import numpy as np
+
+from .acq400 import AcqPorts
+from .stream_tee import StreamTee
+
+
+def parse_listen(spec):
+    """parse a listener spec, see the module doc, policy default drop-oldest.
+
+    Returns:
+        (family, address, opts)
+    """
+    fields = spec.split(",")
+    kind, _, addr = fields[0].partition(":")
+    opts = { "decimate": 1, "policy": "drop-oldest", "depth": 8 }
+    for field in fields[1:]:
+        key, _, value = field.partition("=")
+        if key not in opts:
+            raise ValueError("listen %s: unknown option %s" % (spec, key))
+        opts[key] = value if key == "policy" else int(value)
+    if kind == "unix":
+        return (socket.AF_UNIX, addr, opts)
+    elif kind == "tcp":
+        host, _, port = addr.rpartition(":")
+        return (socket.AF_INET, (host or "127.0.0.1", int(port)), opts)
+    raise ValueError("listen %s: not unix:PATH or tcp:[HOST:]PORT" % (spec))
+
+
+class FanoutClient:
+    """one connected client, a TeeSubscriber and a sender thread."""
+    sndbuf = int(os.getenv("STREAM_FANOUT_SNDBUF", "0x400000"), 0)
+    maxbatch = 16
+
+    def __init__(self, fanout, conn, name, opts):
+        self.fanout = fanout
+        self.conn = conn
+        self.name = name
+        self.decimate = opts["decimate"]
+        self.sub = fanout.tee.subscribe(name, depth=opts["depth"], policy=opts["policy"])
+        self.nbytes = 0
+        self.nsam = 0
+        self.time0 = timeit.default_timer()
+        self.time1 = None
+        self.error = None
+        try:
+            conn.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, self.sndbuf)
+        except (OSError, IOError):
+            pass
+        self.thread = threading.Thread(target=self.run)
+        self.thread.daemon = True
+
+    def __repr__(self):
+        return "FanoutClient(%s)" % (self.name)
+
+    def decimated(self, blk):
+        """every Nth sample of blk, phase kept across blocks"""
+        data = self.fanout.tee.np_block(blk)
+        first = (-self.nsam) % self.decimate
+        self.nsam += len(data)
+        return memoryview(np.ascontiguousarray(data[first::self.decimate])).cast('B')
+
+    def send(self, bufs):
+        if hasattr(self.conn, "sendmsg"):
+            nsent = self.conn.sendmsg(bufs)
+        else:
+            nsent = 0
+        for buf in bufs:
+            # short sendmsg(), finish with sendall()
+            if nsent >= len(buf):
+                nsent -= len(buf)
+            else:
+                self.conn.sendall(buf[nsent:])
+                nsent = 0
+            self.nbytes += len(buf)
+
+    def run(self):
+        try:
+            while True:
+                blocks = []
+                blk = self.sub.get()
+                while blk != None:
+                    blocks.append(blk)
+                    if len(blocks) >= self.maxbatch:
+                        break
+                    blk = self.sub.get(timeout=0)
+                if len(blocks) == 0:
+                    break
+                try:
+                    if self.decimate > 1:
+                        self.send([self.decimated(b) for b in blocks])
+                    else:
+                        self.send([b.data for b in blocks])
+                finally:
+                    for b in blocks:
+                        self.sub.release(b)
+        except (OSError, IOError) as e:
+            self.error = e
+            print("%s disconnected %s" % (repr(self), e))
+        finally:
+            self.time1 = timeit.default_timer()
+            self.fanout.tee.unsubscribe(self.sub)
+            self.conn.close()
+
+    def rate(self):
+        t1 = self.time1 if self.time1 != None else timeit.default_timer()
+        return self.nbytes/1000000/max(t1 - self.time0, 1e-9)
+
+    def stats(self):
+        st = { "bytes": self.nbytes, "MB/s": self.rate(), "decimate": self.decimate,
+               "connected": self.time1 == None }
+        st.update(self.sub.stats())
+        return st
+
+
+class StreamFanout:
+    """republish the stream from one uut on local listeners.
+
+    Args:
+        uut (str) : ip address or dns name
+
+        listen (list) : listener specs, see module doc
+
+        nchan (int), data_size : sample layout, needed for decimate=N
+
+        blocksize (int), nbuffers (int) : as StreamTee
+
+        port (int) : upstream stream port
+    """
+    trace = int(os.getenv("STREAM_FANOUT_TRACE", "0"))
+
+    def __init__(self, uut, listen, nchan=None, data_size=2, blocksize=0x100000, nbuffers=64,
+                 port=AcqPorts.STREAM):
+        self.tee = StreamTee(uut, nchan=nchan, data_size=data_size, blocksize=blocksize,
+                             nbuffers=nbuffers, port=port)
+        self.listeners = []
+        self.clients = []
+        self.lock = threading.Lock()
+        self.nclients = 0
+        for spec in listen:
+            family, addr, opts = parse_listen(spec)
+            if opts["decimate"] > 1 and not nchan:
+                raise ValueError("listen %s: decimate needs nchan" % (spec))
+            if family == socket.AF_UNIX and os.path.exists(addr):
+                os.unlink(addr)
+            lsock = socket.socket(family, socket.SOCK_STREAM)
+            if family != socket.AF_UNIX:
+                lsock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            lsock.bind(addr)
+            lsock.listen(8)
+            self.listeners.append((spec, lsock, opts))
+
+    def __repr__(self):
+        return "StreamFanout(%s)" % (self.tee.uut)
+
+    def accept_loop(self, spec, lsock, opts):
+        while True:
+            try:
+                conn, peer = lsock.accept()
+            except (OSError, IOError):
+                return              # listener closed
+            with self.lock:
+                self.nclients += 1
+                name = "%s#%d" % (spec.split(",")[0], self.nclients)
+                client = FanoutClient(self, conn, name, opts)
+                self.clients.append(client)
+            print("%s connect %s" % (repr(self), name))
+            client.thread.start()
+
+    def start(self):
+        for spec, lsock, opts in self.listeners:
+            thread = threading.Thread(target=self.accept_loop, args=(spec, lsock, opts))
+            thread.daemon = True
+            thread.start()
+        self.tee.start()
+
+    def stop(self):
+        """close the listeners, stop the stream, clients see end of stream"""
+        for spec, lsock, opts in self.listeners:
+            lsock.close()
+            if lsock.family == socket.AF_UNIX:
+                family, addr, opts = parse_listen(spec)
+                if os.path.exists(addr):
+                    os.unlink(addr)
+        self.tee.stop()
+
+    def print_report(self):
+        st = self.tee.sc.stats()
+        print("%s upstream %.1f MB/s pool_misses %d" % (repr(self), st["MB/s"], st["pool_misses"]))
+        with self.lock:
+            clients = list(self.clients)
+        for client in clients:
+            st = client.stats()
+            print("  %s %.1f MB/s dropped %d skipped %d %s" %
+                  (client.name, st["MB/s"], st["dropped"], st["skipped"], "" if st["connected"] else "closed"))
+
+    def run(self, report=0):
+        """serve until the upstream stream ends or KeyboardInterrupt"""
+        self.start()
+        try:
+            while self.tee.thread.is_alive():
+                self.tee.thread.join(report if report else 1)
+                if report and self.tee.thread.is_alive():
+                    self.print_report()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.stop()
+            self.tee.join()
+            with self.lock:
+                clients = list(self.clients)
+            for client in clients:
+                client.thread.join()
+        if report or self.trace:
+            self.print_report()
+        return self.stats()
+
+    def stats(self):
+        st = self.tee.sc.stats() if self.tee.sc != None else {}
+        with self.lock:
+            st["clients"] = dict((client.name, client.stats()) for client in self.clients)
+        return st
@@ -0,0 +1,753 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+stream_recorder.py records the live stream to disk
+
+- StreamRecorder : moves the stream port straight to rollover files
+  root/uut/CCCCCC/NNNN, the acq400_stream.py layout, eg::
+
+       rec = StreamRecorder("acq2106_001", filesize=0x1000000, runtime=10)
+       rec.record()
+       print(rec.stats())
+
+- mode "splice" : os.splice() socket -> pipe -> file, the data never
+  enters user space. Linux, Python 3.10+.
+- mode "recv" : large recv_into() to a set of buffers, one writev() per set.
+- mode "auto" : splice where available, else recv.
+- write_behind=N : receive never waits for the disk, full buffers go
+  through a queue of depth N to a writer thread, files are preallocated
+  with posix_fallocate().
+
+- MultiStreamRecorder : records a rack of uuts from one process, a
+  selectors (epoll) loop services every stream port with non-blocking
+  recv_into(), each uut gets its own root/uut/CCCCCC/NNNN tree, eg::
+
+       rec = MultiStreamRecorder(["acq2106_001", "acq2106_002"], runtime=60)
+       for uut, st in rec.record().items():
+           print(uut, st)
+"""
+
+import errno
+import os
+import socket
+import struct
+import sys
+import threading
+import timeit
+
+from .acq400 import AcqPorts, StreamClient
+from .stream_demux import StreamDemux
+
+try:
+    import fcntl
+    import termios
+except ImportError:
+    fcntl = None
+
+try:
+    from queue import Queue
+except ImportError:
+    from Queue import Queue
+
+try:
+    import selectors
+except ImportError:
+    # MultiStreamRecorder needs Python 3
+    selectors = None
+
+F_SETPIPE_SZ = 1031
+F_GETPIPE_SZ = 1032
+
+
+def make_data_dir(directory, verbose=0):
+    try:
+        os.makedirs(directory)
+    except OSError:
+        if verbose:
+            print("Directory already exists")
+
+
+class FileWriter:
+    """writes the rollover files, in the caller's thread.
+
+    Args:
+        preallocate (bool) : posix_fallocate() each file to its full size,
+            trimmed on close
+    """
+    def __init__(self, preallocate=False):
+        self.preallocate = preallocate and hasattr(os, "posix_fallocate")
+        self.fd = None
+        self.size = 0
+        self.nwrites = 0
+        self.write_time = 0.0
+
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
+
+    def open(self, path, size):
+        self.fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+        self.size = 0
+        if self.preallocate and size > 0:
+            try:
+                os.posix_fallocate(self.fd, 0, size)
+                self.size = size
+            except OSError as e:
+                print("FileWriter: preallocate %s %s, off" % (path, e))
+                self.preallocate = False
+
+    def write(self, iov, release=None):
+        """write a list of buffers with one writev(), release(buf.obj) after"""
+        t0 = timeit.default_timer()
+        if hasattr(os, "writev"):
+            nwr = os.writev(self.fd, iov)
+        else:
+            nwr = 0
+        for buf in iov:
+            # short writev(), rare: finish with write()
+            if nwr >= len(buf):
+                nwr -= len(buf)
+            else:
+                buf = buf[nwr:]
+                nwr = 0
+                while len(buf):
+                    buf = buf[os.write(self.fd, buf):]
+        self.write_time += timeit.default_timer() - t0
+        self.nwrites += 1
+        if release != None:
+            for buf in iov:
+                release(buf.obj)
+
+    def close(self, path, nbytes):
+        """close the file, trim preallocation to nbytes, an empty file is removed"""
+        if self.size > nbytes:
+            os.ftruncate(self.fd, nbytes)
+        os.close(self.fd)
+        self.fd = None
+        if nbytes == 0:
+            os.unlink(path)
+
+    def stats(self):
+        return { "writes": self.nwrites, "write_time": self.write_time }
+
+
+class WriteBehind(FileWriter):
+    """FileWriter in a thread, fed through a bounded queue.
+
+    open(), write() and close() are queued, the receiver only waits when
+    the queue is full, that time is counted in put_wait.
+
+    Args:
+        depth (int) : queue depth in writes
+
+        preallocate (bool) : as FileWriter
+    """
+    def __init__(self, depth=8, preallocate=True):
+        FileWriter.__init__(self, preallocate)
+        self.depth = depth
+        self.q = Queue(depth)
+        self.thread = None
+        self.error = None
+        self.nputs = 0
+        self.q_sum = 0
+        self.q_hwm = 0
+        self.put_wait = 0.0
+
+    def run(self):
+        while True:
+            job = self.q.get()
+            if job == None:
+                return
+            if self.error != None:
+                continue        # drain after failure, error is raised in put()
+            try:
+                job[0](*job[1:])
+            except Exception as e:
+                self.error = e
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def put(self, job):
+        if self.error != None:
+            raise self.error
+        qsize = self.q.qsize()
+        self.nputs += 1
+        self.q_sum += qsize
+        if qsize > self.q_hwm:
+            self.q_hwm = qsize
+        t0 = timeit.default_timer()
+        self.q.put(job)
+        self.put_wait += timeit.default_timer() - t0
+
+    def stop(self):
+        """drain the queue and join the writer"""
+        if self.thread != None:
+            self.q.put(None)
+            self.thread.join()
+            self.thread = None
+        if self.error != None:
+            raise self.error
+
+    def open(self, path, size):
+        self.put((FileWriter.open, self, path, size))
+
+    def write(self, iov, release=None):
+        self.put((FileWriter.write, self, iov, release))
+
+    def close(self, path, nbytes):
+        self.put((FileWriter.close, self, path, nbytes))
+
+    def stats(self):
+        st = FileWriter.stats(self)
+        st.update({ "depth": self.depth, "q_hwm": self.q_hwm,
+                    "q_mean": float(self.q_sum)/self.nputs if self.nputs else 0.0,
+                    "put_wait": self.put_wait })
+        return st
+
+
+class StreamRecorder:
+    """records the stream from one uut to rollover files.
+
+    Args:
+        uut (str) : ip address or dns name
+
+        root (str) : prefix for the data tree, files are root+uut/CCCCCC/NNNN
+
+        filesize (int) : bytes per file
+
+        totaldata (int) : stop after totaldata bytes
+
+        runtime (int) : stop after runtime seconds, checked between chunks
+
+        mode (str) : auto|splice|recv
+
+        verbose (int) : print a line per file
+
+        files_per_cycle (int) : files per CCCCCC directory
+
+        write_behind (int) : >0 : queue depth of a WriteBehind writer
+            thread, mode is recv. 0 : write in the receive loop
+
+        preallocate (bool) : posix_fallocate() each file, default with write_behind
+
+        demux (StreamDemux) : also demux each block to a dirfile as it
+            arrives, closed at the end. mode is recv
+    """
+    trace = int(os.getenv("STREAM_RECORDER_TRACE", "0"))
+    chunk = int(os.getenv("STREAM_RECORDER_CHUNK", "0x100000"), 0)
+    niov = 4
+
+    def __init__(self, uut, root="", filesize=0x100000, totaldata=sys.maxsize,
+                 runtime=sys.maxsize, mode="auto", verbose=0, port=AcqPorts.STREAM,
+                 files_per_cycle=100, write_behind=0, preallocate=None, demux=None):
+        if (write_behind or demux != None) and mode != "recv":
+            if mode != "auto":
+                print("StreamRecorder: write_behind/demux, mode %s -> recv" % (mode))
+            mode = "recv"
+        if mode == "auto":
+            mode = "splice" if hasattr(os, "splice") else "recv"
+        elif mode == "splice":
+            if not hasattr(os, "splice"):
+                raise ValueError("mode splice needs os.splice(), Linux, Python 3.10+")
+        elif mode != "recv":
+            raise ValueError("mode %s not auto|splice|recv" % (mode))
+        self.uut = uut
+        self.root = root
+        self.totaldata = totaldata
+        self.filesize = min(filesize, totaldata)
+        self.runtime = runtime
+        self.mode = mode
+        self.verbose = verbose
+        self.port = port
+        self.files_per_cycle = files_per_cycle
+        self.cycle = 1
+        self.num = 0
+        self.nbytes = 0
+        self.nfiles = 0
+        self.time0 = None
+        self.time1 = None
+        self.pipe = None
+        self.sc = None
+        self.demux = demux
+        if preallocate == None:
+            preallocate = write_behind > 0
+        if write_behind:
+            self.writer = WriteBehind(write_behind, preallocate)
+        else:
+            self.writer = FileWriter(preallocate)
+        self.path = None
+        self.fbytes = 0
+        self.buf = None
+        self.bfill = 0
+        self.rcvbuf = 0
+        self.rxq_hwm = 0
+        self.rxq_full = 0
+        self.stalls = 0
+        self.stalled = False
+        self.eos = False
+        self.last_rx = None
+
+    def __repr__(self):
+        return "StreamRecorder(%s, %s)" % (self.uut, self.mode)
+
+    def cycle_dir(self):
+        return "{}{}/{:06d}".format(self.root, self.uut, self.cycle)
+
+    def next_file(self):
+        """returns path of the next file, making a new cycle directory when needed"""
+        if self.num >= self.files_per_cycle:
+            self.num = 0
+            self.cycle += 1
+        if self.num == 0:
+            make_data_dir(self.cycle_dir(), self.verbose)
+        path = "{}/{:04d}".format(self.cycle_dir(), self.num)
+        self.num += 1
+        return path
+
+    def open_pipe(self):
+        r, w = os.pipe()
+        size = self.chunk
+        if fcntl != None:
+            try:
+                fcntl.fcntl(w, F_SETPIPE_SZ, self.chunk)
+            except (OSError, IOError):
+                pass            # capped by /proc/sys/fs/pipe-max-size
+            try:
+                size = fcntl.fcntl(w, F_GETPIPE_SZ)
+            except (OSError, IOError):
+                size = 0x10000
+        self.pipe = (r, w, size)
+
+    def close_pipe(self):
+        if self.pipe != None:
+            os.close(self.pipe[0])
+            os.close(self.pipe[1])
+            self.pipe = None
+
+    def splice_chunk(self, fd, nbytes):
+        """splice up to nbytes from socket to fd, returns bytes moved, 0 at end of stream"""
+        r, w, size = self.pipe
+        nrx = os.splice(self.sc.sock.fileno(), w, min(nbytes, size),
+                        flags=os.SPLICE_F_MOVE | os.SPLICE_F_MORE)
+        togo = nrx
+        while togo > 0:
+            try:
+                togo -= os.splice(r, fd, togo, flags=os.SPLICE_F_MOVE)
+            except OSError as e:
+                if e.errno != errno.EINVAL:
+                    raise
+                # fd does not take splice, drain the pipe by copy
+                while togo > 0:
+                    buf = os.read(r, togo)
+                    togo -= len(buf)
+                    while len(buf):
+                        buf = buf[os.write(fd, buf):]
+                self.mode = "recv"
+        return nrx
+
+    def recv_chunk(self, nbytes):
+        """receive up to nbytes into a set of pool buffers for one writev(), returns bytes moved"""
+        iov = []
+        total = 0
+        for ii in range(self.niov):
+            want = min(self.chunk, nbytes - total)
+            if want <= 0:
+                break
+            buf = memoryview(self.sc.get_buffer(self.chunk))[:want]
+            nrx = self.sc.fill(buf)
+            if nrx:
+                iov.append(buf[:nrx])
+                total += nrx
+            else:
+                self.sc.release(buf)
+            if nrx < want:
+                break
+        if total:
+            if self.demux != None:
+                for buf in iov:
+                    self.demux.write(buf)
+            self.writer.write(iov, self.sc.release)
+        return total
+
+    def transfer(self, nbytes):
+        if self.mode == "splice":
+            try:
+                return self.splice_chunk(self.writer.fd, nbytes)
+            except OSError as e:
+                if e.errno not in (errno.EINVAL, errno.ENOSYS) or self.nbytes != 0:
+                    raise
+                print("%s splice not supported here, using recv" % (repr(self)))
+                self.mode = "recv"
+        return self.recv_chunk(nbytes)
+
+    def done(self):
+        return self.nbytes >= self.totaldata or \
+            (self.time0 != None and timeit.default_timer() - self.time0 >= self.runtime)
+
+    def connect(self):
+        nbuffers = self.niov
+        if isinstance(self.writer, WriteBehind):
+            nbuffers *= 1 + self.writer.depth       # buffers in the queue are out of the pool
+        self.sc = StreamClient(self.uut, port=self.port, nbuffers=nbuffers)
+        if self.mode == "splice":
+            self.open_pipe()
+        self.writer.start()
+        self.time0 = timeit.default_timer()
+
+    def finish(self):
+        """close the last file, drain the writer, close the demux"""
+        self.close_file()
+        self.writer.stop()
+        if self.demux != None:
+            self.demux.close()
+
+    def disconnect(self):
+        try:
+            self.finish()
+        finally:
+            self.time1 = timeit.default_timer()
+            self.close_pipe()
+            self.sc.sock.close()
+        if self.trace:
+            print("%s %s" % (repr(self), self.stats()))
+
+    def open_file(self):
+        self.path = self.next_file()
+        self.writer.open(self.path, min(self.filesize, self.totaldata - self.nbytes))
+        self.fbytes = 0
+
+    def close_file(self):
+        """close the current file, an empty file is removed"""
+        if self.path == None:
+            return
+        path = self.path
+        self.writer.close(path, self.fbytes)
+        self.path = None
+        if self.fbytes == 0:
+            self.num -= 1
+            return
+        self.nfiles += 1
+        if self.verbose:
+            print("New data file written. %s %d" % (path, self.fbytes))
+            print("Data Transferred: %d KB" % (self.nbytes//1024))
+            print("Streaming time remaining: %.1f" % (self.runtime - (timeit.default_timer() - self.time0)))
+            print("")
+
+    def record(self):
+        """record until totaldata, runtime or end of stream.
+
+        Returns:
+            stats (dict)
+        """
+        self.connect()
+        try:
+            eos = False
+            while not eos and not self.done():
+                self.open_file()
+                while self.fbytes < self.filesize and not self.done():
+                    nrx = self.transfer(min(self.filesize - self.fbytes, self.totaldata - self.nbytes))
+                    if nrx == 0:
+                        eos = True
+                        break
+                    self.fbytes += nrx
+                    self.nbytes += nrx
+                self.close_file()
+        finally:
+            self.disconnect()
+        return self.stats()
+
+    def record_blocks(self, source):
+        """record blocks from a StreamTee subscriber instead of the socket.
+
+        Blocks are split at file boundaries, each block is released back
+        to the tee when its last piece is written.
+
+        Args:
+            source (TeeSubscriber) : get() returns blocks, None at end
+
+        Returns:
+            stats (dict)
+        """
+        self.mode = "tee"
+        self.writer.start()
+        self.time0 = timeit.default_timer()
+        try:
+            while not self.done():
+                blk = source.get()
+                if blk == None:
+                    break
+                view = blk.data[:self.totaldata - self.nbytes]
+                if len(view) == 0:
+                    source.release(blk)
+                    continue
+                if self.demux != None:
+                    self.demux.write(view)
+                while len(view):
+                    if self.path == None:
+                        self.open_file()
+                    n = min(len(view), self.filesize - self.fbytes)
+                    last = n == len(view)
+                    self.writer.write([view[:n]], (lambda obj, blk=blk: source.release(blk)) if last else None)
+                    view = view[n:]
+                    self.fbytes += n
+                    self.nbytes += n
+                    if self.fbytes == self.filesize:
+                        self.close_file()
+        finally:
+            source.close()
+            try:
+                self.finish()
+            finally:
+                self.time1 = timeit.default_timer()
+        return self.stats()
+
+    def rx_queued(self):
+        """returns bytes waiting in the kernel socket receive queue"""
+        if fcntl == None:
+            return 0
+        try:
+            return struct.unpack("i", fcntl.ioctl(self.sc.sock.fileno(), termios.FIONREAD, b"\0\0\0\0"))[0]
+        except (OSError, IOError):
+            return 0
+
+    def start_nonblocking(self):
+        """connect for a select loop, data is received by receive()"""
+        self.mode = "recv"
+        self.connect()
+        self.sc.sock.setblocking(False)
+        self.rcvbuf = self.sc.sock.getsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF)
+        if isinstance(self.writer, WriteBehind):
+            self.sc.nbuffers = self.writer.depth + 2
+        self.buf = self.sc.get_buffer(self.chunk * self.niov)
+        self.last_rx = self.time0
+
+    def flush(self):
+        if self.bfill:
+            if self.demux != None:
+                self.demux.write(memoryview(self.buf)[:self.bfill])
+            self.writer.write([memoryview(self.buf)[:self.bfill]], self.sc.release)
+            self.buf = self.sc.get_buffer(len(self.buf))
+            self.bfill = 0
+
+    def receive(self):
+        """socket is readable: receive what is there, flush whole buffers or files.
+
+        The kernel receive queue is sampled first, rxq_hwm is its peak.
+        A queue at the socket buffer limit means the host has fallen
+        behind and the uut is being held off, counted in rxq_full.
+
+        Returns:
+            True while more data is wanted
+        """
+        rxq = self.rx_queued()
+        if rxq > self.rxq_hwm:
+            self.rxq_hwm = rxq
+        # Linux reports SO_RCVBUF doubled for bookkeeping overhead,
+        # and autotuning grows it, so check the current value
+        if self.rcvbuf and rxq >= self.rcvbuf//2:
+            self.rcvbuf = self.sc.sock.getsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF)
+            if rxq >= self.rcvbuf//2:
+                self.rxq_full += 1
+        if self.path == None:
+            self.open_file()
+        want = min(len(self.buf) - self.bfill, self.filesize - self.fbytes, self.totaldata - self.nbytes)
+        try:
+            nrx = self.sc.sock.recv_into(memoryview(self.buf)[self.bfill:], want)
+        except socket.error as e:
+            if e.errno in (errno.EAGAIN, errno.EWOULDBLOCK, errno.EINTR):
+                return True
+            raise
+        if nrx == 0:
+            self.eos = True
+            self.flush()
+            self.close_file()
+            return False
+        self.last_rx = timeit.default_timer()
+        self.stalled = False
+        self.bfill += nrx
+        self.fbytes += nrx
+        self.nbytes += nrx
+        if self.bfill == len(self.buf) or self.fbytes == self.filesize or self.nbytes == self.totaldata:
+            self.flush()
+        if self.fbytes == self.filesize:
+            self.close_file()
+        return self.nbytes < self.totaldata
+
+    def check_stall(self, now, timeout):
+        """count a stall when no data has arrived for timeout seconds"""
+        if not self.stalled and now - self.last_rx > timeout:
+            self.stalled = True
+            self.stalls += 1
+            print("%s STALLED: no data for %.1f s" % (repr(self), now - self.last_rx))
+
+    def rate(self):
+        """returns throughput in MB/s"""
+        if self.time0 == None:
+            return 0.0
+        t1 = self.time1 if self.time1 != None else timeit.default_timer()
+        return self.nbytes/1000000/max(t1 - self.time0, 1e-9)
+
+    def stats(self):
+        st = { "bytes": self.nbytes, "files": self.nfiles, "mode": self.mode, "MB/s": self.rate() }
+        if self.buf != None:
+            st.update({ "rxq_hwm": self.rxq_hwm, "rcvbuf": self.rcvbuf, "rxq_full": self.rxq_full,
+                        "stalls": self.stalls, "eos": self.eos })
+        if self.sc != None:
+            st["pool_misses"] = self.sc.pool_misses
+        st.update(self.writer.stats())
+        return st
+
+
+class MultiStreamRecorder:
+    """records the streams from many uuts in one process.
+
+    One selectors loop services all the stream sockets, one StreamRecorder
+    per uut handles the files and the counters. totaldata and runtime
+    apply per uut.
+
+    Drop detection: the uut buffers when the host falls behind, it can't
+    be seen on the wire, TCP doesn't drop. Look for rxq_full (receive
+    queue at the socket buffer limit, the uut is being held off), stalls
+    (no data for stall_timeout) and eos (stream closed before
+    totaldata/runtime).
+
+    Args:
+        uuts (list) : ip addresses or dns names
+
+        report (float) : print per uut and aggregate MB/s every report seconds, 0: off
+
+        stall_timeout (float) : seconds without data that count as a stall
+
+        write_behind (int) : >0 : a WriteBehind writer thread per uut, the
+            select loop never waits for the disk
+
+        demux (dict) : StreamDemux per uut, optional
+
+        other args as StreamRecorder
+    """
+    trace = int(os.getenv("STREAM_RECORDER_TRACE", "0"))
+
+    def __init__(self, uuts, root="", filesize=0x100000, totaldata=sys.maxsize,
+                 runtime=sys.maxsize, verbose=0, port=AcqPorts.STREAM,
+                 files_per_cycle=100, report=0, stall_timeout=2.0, write_behind=0, preallocate=None,
+                 demux=None):
+        if selectors == None:
+            raise RuntimeError("MultiStreamRecorder needs Python 3 selectors")
+        self.recorders = [ StreamRecorder(uut, root=root, filesize=filesize, totaldata=totaldata,
+                                          runtime=runtime, mode="recv", verbose=verbose, port=port,
+                                          files_per_cycle=files_per_cycle, write_behind=write_behind,
+                                          preallocate=preallocate, demux=(demux or {}).get(uut)) for uut in uuts ]
+        self.runtime = runtime
+        self.report = report
+        self.stall_timeout = stall_timeout
+        self.time0 = None
+        self.time1 = None
+
+    def print_report(self):
+        for rec in self.recorders:
+            print("%s %.1f MB/s rxq_hwm %d rxq_full %d stalls %d write_time %.2f" %
+                  (rec.uut, rec.rate(), rec.rxq_hwm, rec.rxq_full, rec.stalls, rec.writer.write_time))
+        print("aggregate %.1f MB/s" % (self.rate()))
+
+    def record(self):
+        """record all uuts until each reaches totaldata, runtime or end of stream.
+
+        Returns:
+            stats (dict) : per uut stats, with "aggregate"
+        """
+        sel = selectors.DefaultSelector()
+        try:
+            for rec in self.recorders:
+                rec.start_nonblocking()
+                sel.register(rec.sc.sock, selectors.EVENT_READ, rec)
+            self.time0 = timeit.default_timer()
+            next_report = self.time0 + self.report
+            active = len(self.recorders)
+            while active:
+                events = sel.select(timeout=min(self.stall_timeout, 1.0))
+                for key, mask in events:
+                    rec = key.data
+                    if not rec.receive():
+                        sel.unregister(key.fileobj)
+                        active -= 1
+                now = timeit.default_timer()
+                if now - self.time0 >= self.runtime:
+                    break
+                for key in list(sel.get_map().values()):
+                    key.data.check_stall(now, self.stall_timeout)
+                if self.report and now >= next_report:
+                    self.print_report()
+                    next_report = now + self.report
+        finally:
+            self.time1 = timeit.default_timer()
+            sel.close()
+            for rec in self.recorders:
+                if rec.sc != None:
+                    if rec.path != None:
+                        rec.flush()
+                    rec.disconnect()
+        if self.trace or self.report:
+            self.print_report()
+        return self.stats()
+
+    def rate(self):
+        """returns aggregate throughput in MB/s"""
+        if self.time0 == None:
+            return 0.0
+        t1 = self.time1 if self.time1 != None else timeit.default_timer()
+        return sum([rec.nbytes for rec in self.recorders])/1000000/max(t1 - self.time0, 1e-9)
+
+    def stats(self):
+        st = dict((rec.uut, rec.stats()) for rec in self.recorders)
+        st["aggregate"] = { "bytes": sum([rec.nbytes for rec in self.recorders]), "MB/s": self.rate() }
+        return st
+
+
+def add_recorder_args(parser):
+    """add the StreamRecorder options to an acq400_stream.py style parser, for run_recorder()"""
+    parser.add_argument('--recorder', default="none", choices=["none", "auto", "splice", "recv"],
+                        help="none: legacy loop, auto|splice|recv: StreamRecorder, socket to file without copies")
+    parser.add_argument('--write_behind', default=0, type=int,
+                        help="N>0: writer thread with queue depth N, preallocated files, receive never waits for disk")
+    parser.add_argument('--demux', default=0, type=int,
+                        help="1: demux as it streams, dirfile in root/uut/demux")
+    parser.add_argument('--report', default=0, type=float, help="several uuts: print MB/s every REPORT seconds")
+
+
+def run_recorder(args, demux=None):
+    """record args.uuts from parsed acq400_stream.py args, prints the stats.
+
+    One uut: StreamRecorder in mode args.recorder ("none": auto), several:
+    MultiStreamRecorder.
+
+    Args:
+        args : root, filesize, totaldata, runtime, verbose, report,
+            recorder, write_behind, demux, uuts. args.demux: each uut is
+            demuxed as it streams to root/uut/demux
+
+        demux (dict) : optional StreamDemux per uut, overrides args.demux
+    """
+    if demux == None:
+        demux = {}
+        if args.demux:
+            demux = dict((uut, StreamDemux.for_uut("{}{}/demux".format(args.root, uut), uut))
+                         for uut in args.uuts)
+    if len(args.uuts) > 1:
+        rec = MultiStreamRecorder(args.uuts, root=args.root, filesize=args.filesize,
+                                  totaldata=args.totaldata, runtime=args.runtime,
+                                  verbose=args.verbose, report=args.report,
+                                  write_behind=args.write_behind, demux=demux)
+    else:
+        rec = StreamRecorder(args.uuts[0], root=args.root, filesize=args.filesize,
+                             totaldata=args.totaldata, runtime=args.runtime,
+                             mode=args.recorder if args.recorder != "none" else "auto",
+                             verbose=args.verbose, write_behind=args.write_behind,
+                             demux=demux.get(args.uuts[0]))
+    st = rec.record()
+    print(st)
+    return st
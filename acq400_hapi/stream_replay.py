@@ -0,0 +1,217 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+stream_replay.py serves a stream port from recordings or synthetic data
+
+- StreamReplay : a local stand-in for the uut stream port (4210), so the
+  stream consumers can be run and timed without hardware, eg::
+
+       src = FileSource("DATA/acq2106_001")             # root/uut/CCCCCC/NNNN
+       src = RampSource(nchan=32, data_size=2)          # like simulate=1
+       StreamReplay(src, port=4210, rate=100e6).serve()
+
+- one client at a time, as the uut. rate in bytes/s, 0: as fast as the
+  client takes it, then the server throughput is the consumer throughput.
+- files go out with os.sendfile(), ramps from a precomputed period, the
+  server costs very little.
+"""
+
+import glob
+import os
+import socket
+import sys
+import time
+import timeit
+
+import numpy as np
+
+from .acq400 import AcqPorts
+
+
+class FileSource:
+    """replays recorded rollover files root/CCCCCC/NNNN, in order.
+
+    Args:
+        root (str) : uut directory of a StreamRecorder / acq400_stream tree
+
+        loop (bool) : start again at the end
+    """
+    def __init__(self, root, loop=False):
+        self.root = root
+        self.loop = loop
+        self.paths = sorted(glob.glob(os.path.join(root, "[0-9]" * 6, "[0-9]" * 4)))
+        if len(self.paths) == 0:
+            raise ValueError("FileSource: no files in %s/CCCCCC/NNNN" % (root))
+
+    def __repr__(self):
+        return "FileSource(%s) %d files" % (self.root, len(self.paths))
+
+
+class RampSource:
+    """synthetic data: channel ch, sample n is a ramp (n + 256*ch) & 0xffff.
+
+    32 bit data has the ramp in the upper 16 bits, left justified like the
+    ADC data. The data repeats every 65536 samples, one period is
+    precomputed and served by slicing.
+
+    Args:
+        nchan (int) : channels per sample
+
+        data_size : 2|4
+
+        totaldata (int) : bytes to serve
+    """
+    PERIOD = 0x10000
+
+    def __init__(self, nchan, data_size=2, totaldata=sys.maxsize):
+        self.nchan = nchan
+        self.data_size = data_size
+        self.totaldata = totaldata
+        ramp = (np.arange(self.PERIOD).reshape(-1, 1) + 256*np.arange(nchan)) & 0xffff
+        if data_size == 4:
+            data = (ramp.astype(np.uint32) << 16).view(np.int32)
+        else:
+            data = ramp.astype(np.uint16).view(np.int16)
+        # two periods: any slice up to one period is contiguous
+        self.buf = np.concatenate((data, data)).tobytes()
+        self.period_bytes = len(self.buf) // 2
+
+    def __repr__(self):
+        return "RampSource(%d, %d)" % (self.nchan, self.data_size)
+
+    def blocks(self, blocksize):
+        """yields successive memoryviews, totaldata in all"""
+        view = memoryview(self.buf)
+        blocksize = min(blocksize, self.period_bytes)
+        offset = 0
+        togo = self.totaldata
+        while togo > 0:
+            n = min(blocksize, togo)
+            yield view[offset:offset+n]
+            offset = (offset + n) % self.period_bytes
+            togo -= n
+
+
+class StreamReplay:
+    """serves a FileSource or RampSource on a stream port.
+
+    Args:
+        source : FileSource | RampSource
+
+        port (int) : listen port
+
+        host (str) : listen address
+
+        rate (float) : bytes/s, 0: max
+
+        blocksize (int) : bytes per send
+    """
+    trace = int(os.getenv("STREAM_REPLAY_TRACE", "0"))
+
+    def __init__(self, source, port=AcqPorts.STREAM, host="127.0.0.1", rate=0, blocksize=0x100000):
+        self.source = source
+        self.port = port
+        self.host = host
+        self.rate = rate
+        self.blocksize = blocksize
+        self.lsock = socket.socket()
+        self.lsock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.lsock.bind((host, port))
+        self.lsock.listen(1)
+        self.reset_stats()
+
+    def __repr__(self):
+        return "StreamReplay(%s:%d, %s)" % (self.host, self.port, repr(self.source))
+
+    def reset_stats(self):
+        self.nbytes = 0
+        self.send_time = 0.0
+        self.max_send = 0.0
+        self.time0 = None
+        self.time1 = None
+
+    def pace(self, n):
+        """account n bytes sent, sleep to hold rate"""
+        self.nbytes += n
+        if self.rate:
+            ahead = self.time0 + self.nbytes/float(self.rate) - timeit.default_timer()
+            if ahead > 0:
+                time.sleep(ahead)
+
+    def chunk(self):
+        # at a set rate, small sends pace smoothly
+        return min(self.blocksize, max(int(self.rate/100), 0x10000)) if self.rate else self.blocksize
+
+    def timed(self, send, *args):
+        t0 = timeit.default_timer()
+        n = send(*args)
+        dt = timeit.default_timer() - t0
+        self.send_time += dt
+        if dt > self.max_send:
+            self.max_send = dt
+        return n
+
+    def send_files(self, conn):
+        use_sendfile = hasattr(os, "sendfile")
+        while True:
+            for path in self.source.paths:
+                with open(path, "rb") as fp:
+                    size = os.fstat(fp.fileno()).st_size
+                    offset = 0
+                    while offset < size:
+                        n = min(self.chunk(), size - offset)
+                        if use_sendfile:
+                            n = self.timed(os.sendfile, conn.fileno(), fp.fileno(), offset, n)
+                        else:
+                            fp.seek(offset)
+                            self.timed(conn.sendall, fp.read(n))
+                        offset += n
+                        self.pace(n)
+            if not self.source.loop:
+                return
+
+    def send_ramp(self, conn):
+        for view in self.source.blocks(self.chunk()):
+            self.timed(conn.sendall, view)
+            self.pace(len(view))
+
+    def serve_client(self, conn):
+        """serve the whole source to one client, returns stats"""
+        self.reset_stats()
+        self.time0 = timeit.default_timer()
+        try:
+            if isinstance(self.source, FileSource):
+                self.send_files(conn)
+            else:
+                self.send_ramp(conn)
+        except (OSError, IOError) as e:
+            if self.trace:
+                print("%s client gone %s" % (repr(self), e))
+        finally:
+            self.time1 = timeit.default_timer()
+            conn.close()
+        return self.stats()
+
+    def serve(self, nclients=0):
+        """accept and serve clients one at a time, nclients=0: forever"""
+        served = 0
+        while nclients == 0 or served < nclients:
+            conn, peer = self.lsock.accept()
+            st = self.serve_client(conn)
+            served += 1
+            if self.trace:
+                print("%s %s %s" % (repr(self), peer, st))
+
+    def close(self):
+        self.lsock.close()
+
+    def rate_achieved(self):
+        if self.time0 == None:
+            return 0.0
+        t1 = self.time1 if self.time1 != None else timeit.default_timer()
+        return self.nbytes/1000000/max(t1 - self.time0, 1e-9)
+
+    def stats(self):
+        """bytes, MB/s, and the time blocked in send, the consumer holding off"""
+        return { "bytes": self.nbytes, "MB/s": self.rate_achieved(), "send_time": self.send_time,
+                 "max_send": self.max_send }
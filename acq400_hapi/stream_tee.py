@@ -0,0 +1,300 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+stream_tee.py one stream connection, many consumers
+
+- StreamTee : reads the stream port once, each block is shared, read only,
+  no copies, with a disk recorder and any number of in-process subscribers,
+  each with its own bounded queue, eg::
+
+       tee = StreamTee("acq2106_001", nchan=32)
+       tee.add_recorder(root="DATA/", filesize=0x1000000)
+       live = tee.subscribe("plot", depth=4, policy="drop-oldest")
+       tee.start()
+       for blk in live:
+           plot(tee.np_block(blk))          # read only (nsam, nchan) view
+       tee.join()
+
+- slow consumer policy, per subscriber:
+
+  - "block" : the tee waits for the subscriber, nothing is lost,
+    the recorder uses this.
+  - "drop-oldest" : a full queue discards its oldest block.
+  - "decimate" : a full queue drops the block and halves the rate offered
+    to the subscriber, the rate recovers as the queue empties.
+"""
+
+import collections
+import os
+import socket
+import threading
+import timeit
+
+from .acq400 import AcqPorts, StreamClient
+from .stream_recorder import StreamRecorder
+
+
+class TeeBlock:
+    """one stream block, shared by all subscribers until released.
+
+    Attributes:
+        seq (int) : block sequence number from 0
+
+        data (memoryview) : read only block data
+    """
+    __slots__ = ("seq", "buf", "data", "refs")
+
+    def __init__(self, seq, buf, nbytes):
+        self.seq = seq
+        self.buf = buf
+        self.data = memoryview(buf)[:nbytes]
+        if hasattr(self.data, "toreadonly"):
+            self.data = self.data.toreadonly()
+        self.refs = 1
+
+    def __len__(self):
+        return len(self.data)
+
+
+class TeeSubscriber:
+    """bounded queue of blocks for one consumer, create with StreamTee.subscribe().
+
+    Iterating yields blocks and releases each one on the next iteration.
+    A consumer that keeps blocks longer uses get() and release().
+    """
+    POLICIES = ("block", "drop-oldest", "decimate")
+
+    def __init__(self, tee, name, depth=8, policy="block", max_decimate=64):
+        if policy not in TeeSubscriber.POLICIES:
+            raise ValueError("policy %s not one of %s" % (policy, TeeSubscriber.POLICIES))
+        self.tee = tee
+        self.name = name
+        self.depth = depth
+        self.policy = policy
+        self.max_decimate = max_decimate
+        self.q = collections.deque()
+        self.cond = threading.Condition()
+        self.closed = False
+        self.factor = 1
+        self.delivered = 0
+        self.dropped = 0
+        self.skipped = 0
+        self.q_hwm = 0
+        self.wait_time = 0.0
+
+    def __repr__(self):
+        return "TeeSubscriber(%s, %s)" % (self.name, self.policy)
+
+    def offer(self, blk):
+        """called by the tee thread, queue blk according to policy"""
+        evicted = None
+        with self.cond:
+            if self.closed:
+                return
+            if self.policy == "decimate" and blk.seq % self.factor:
+                self.skipped += 1
+                return
+            if len(self.q) >= self.depth:
+                if self.policy == "block":
+                    t0 = timeit.default_timer()
+                    while len(self.q) >= self.depth and not self.closed:
+                        self.cond.wait()
+                    self.wait_time += timeit.default_timer() - t0
+                    if self.closed:
+                        return
+                elif self.policy == "drop-oldest":
+                    evicted = self.q.popleft()
+                    self.dropped += 1
+                else:
+                    self.dropped += 1
+                    self.factor = min(self.factor*2, self.max_decimate)
+                    return
+            elif self.policy == "decimate" and self.factor > 1 and len(self.q) < self.depth//2:
+                self.factor //= 2
+            self.tee.ref(blk)
+            self.q.append(blk)
+            if len(self.q) > self.q_hwm:
+                self.q_hwm = len(self.q)
+            self.cond.notify_all()
+        if evicted != None:
+            self.tee.unref(evicted)
+
+    def get(self, timeout=None):
+        """returns the next block, None at end of stream or timeout. release() it when done."""
+        with self.cond:
+            if not self.q and not self.closed:
+                self.cond.wait_for(lambda: self.q or self.closed, timeout)
+            if not self.q:
+                return None
+            blk = self.q.popleft()
+            self.delivered += 1
+            self.cond.notify_all()
+            return blk
+
+    def release(self, blk):
+        self.tee.unref(blk)
+
+    def close(self):
+        """stop receiving, queued blocks are released"""
+        with self.cond:
+            self.closed = True
+            blocks = list(self.q)
+            self.q.clear()
+            self.cond.notify_all()
+        for blk in blocks:
+            self.tee.unref(blk)
+
+    def __iter__(self):
+        blk = self.get()
+        while blk != None:
+            yield blk
+            self.release(blk)
+            blk = self.get()
+
+    def stats(self):
+        return { "policy": self.policy, "delivered": self.delivered, "dropped": self.dropped,
+                 "skipped": self.skipped, "q_hwm": self.q_hwm, "factor": self.factor,
+                 "wait_time": self.wait_time }
+
+
+class StreamTee:
+    """reads the stream once, shares each block with every subscriber.
+
+    Args:
+        uut (str) : ip address or dns name
+
+        nchan (int), data_size : as StreamClient, for np_block()
+
+        blocksize (int) : bytes per block
+
+        nbuffers (int) : pool size, a block returns to the pool when every
+            subscriber has released it. An empty pool allocates, counted in
+            pool_misses
+
+        port (int) : stream port
+    """
+    trace = int(os.getenv("STREAM_TEE_TRACE", "0"))
+
+    def __init__(self, uut, nchan=None, data_size=2, blocksize=0x400000, nbuffers=32,
+                 port=AcqPorts.STREAM):
+        self.uut = uut
+        self.nchan = nchan
+        self.data_size = data_size
+        self.blocksize = blocksize
+        self.nbuffers = nbuffers
+        self.port = port
+        self.sc = None
+        self.subscribers = []
+        self.recorders = []
+        self.lock = threading.Lock()
+        self.thread = None
+        self.stopped = False
+        self.error = None
+
+    def __repr__(self):
+        return "StreamTee(%s)" % (self.uut)
+
+    def subscribe(self, name, depth=8, policy="block", max_decimate=64):
+        """add a subscriber, before start()"""
+        sub = TeeSubscriber(self, name, depth, policy, max_decimate)
+        with self.lock:
+            self.subscribers.append(sub)
+        return sub
+
+    def unsubscribe(self, sub):
+        with self.lock:
+            if sub in self.subscribers:
+                self.subscribers.remove(sub)
+        sub.close()
+
+    def add_recorder(self, depth=8, **kwargs):
+        """add a StreamRecorder fed from the tee, policy block, kwargs as StreamRecorder.
+
+        Returns:
+            recorder (StreamRecorder)
+        """
+        rec = StreamRecorder(self.uut, port=self.port, **kwargs)
+        sub = self.subscribe("recorder", depth=depth, policy="block")
+        thread = threading.Thread(target=rec.record_blocks, args=(sub,))
+        thread.daemon = True
+        self.recorders.append((rec, thread))
+        return rec
+
+    def ref(self, blk):
+        with self.lock:
+            blk.refs += 1
+
+    def unref(self, blk):
+        with self.lock:
+            blk.refs -= 1
+            free = blk.refs == 0
+        if free:
+            self.sc.release(blk.buf)
+
+    def np_block(self, blk):
+        """returns blk as a read only (nsam, nchan) numpy view"""
+        return self.sc.np_block(blk.data)
+
+    def run(self):
+        try:
+            for buf in self.sc.blocks(self.blocksize, recycle=False):
+                if self.stopped:
+                    self.sc.release(buf)
+                    break
+                blk = TeeBlock(self.sc.nblocks-1, buf.obj if isinstance(buf, memoryview) else buf, len(buf))
+                with self.lock:
+                    subscribers = list(self.subscribers)
+                for sub in subscribers:
+                    sub.offer(blk)
+                self.unref(blk)
+        except Exception as e:
+            if not self.stopped:
+                self.error = e
+                print("%s ERROR %s" % (repr(self), e))
+        finally:
+            with self.lock:
+                subscribers = list(self.subscribers)
+            for sub in subscribers:
+                with sub.cond:
+                    sub.closed = True
+                    sub.cond.notify_all()
+
+    def start(self):
+        """connect and start the reader thread and any recorders"""
+        self.sc = StreamClient(self.uut, nchan=self.nchan, data_size=self.data_size,
+                               nbuffers=self.nbuffers, port=self.port)
+        for rec, thread in self.recorders:
+            thread.start()
+        self.thread = threading.Thread(target=self.run)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def stop(self):
+        """stop reading, subscribers see end of stream"""
+        self.stopped = True
+        try:
+            self.sc.sock.shutdown(socket.SHUT_RDWR)
+        except (OSError, IOError):
+            pass
+        with self.lock:
+            subscribers = list(self.subscribers)
+        for sub in subscribers:
+            with sub.cond:
+                sub.closed = True
+                sub.cond.notify_all()
+
+    def join(self):
+        """wait for end of stream and the recorders to finish"""
+        self.thread.join()
+        for rec, thread in self.recorders:
+            thread.join()
+        self.sc.sock.close()
+        if self.trace:
+            print("%s %s" % (repr(self), self.stats()))
+        if self.error != None:
+            raise self.error
+
+    def stats(self):
+        st = self.sc.stats() if self.sc != None else {}
+        st["subscribers"] = dict((sub.name, sub.stats()) for sub in self.subscribers)
+        return st
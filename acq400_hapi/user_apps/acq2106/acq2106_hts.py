@@ -75,17 +75,9 @@ def config_shot(uut, args):
         uut.s0.decimate = args.decimate
 
 def hexdump_string(uut, chan, sites, spad):
-    nspad = 0 if spad == None else int(spad.split(',')[1])
-    print("hexdump_string {} {} {}".format(chan, sites, nspad))
-    dumpstr = ("hexdump -ve '\"%10_ad,\" ")
-    for svc in ( uut.svc['s{}'.format(s)] for s in sites.split(',')):
-        d32 = svc.data32 == '1'
-        fmt = '" " {}/{} "%0{}x," '.format(svc.NCHAN, 4 if d32 else 2, 8 if d32 else 4)
-        dumpstr += fmt
-    if nspad:
-        fmt = '{}/4 "%08x," '.format(nspad)
-        dumpstr += fmt
-    dumpstr += '"\\n"\''
+    layout = acq400_hapi.SampleLayout.from_sites(uut, sites, spad)
+    print("hexdump_string {} {} {}".format(chan, sites, layout))
+    dumpstr = "hexdump -ve '{}'".format(layout.hexdump_format())
     print(dumpstr)
     with open("hexdump{}".format(chan), "w") as fp:
         fp.write("{} $*\n".format(dumpstr))
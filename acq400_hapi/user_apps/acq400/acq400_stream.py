@@ -13,12 +13,16 @@ Something like:
 usage::
     acq400_stream.py [-h] [--filesize FILESIZE] [--totaldata TOTALDATA]
                         [--root ROOT] [--runtime RUNTIME] [--verbose VERBOSE]
+                        [--recorder {none,auto,splice,recv}]
+                        [--write_behind WRITE_BEHIND] [--demux DEMUX]
+                        [--report REPORT]
                         uuts [uuts ...]
 
 acq400 stream
 
 positional arguments:
-  uuts                  uuts
+  uuts                  uuts, several uuts are recorded concurrently by
+                        MultiStreamRecorder
 
 optional arguments:
   -h, --help            show this help message and exit
@@ -29,6 +33,14 @@ optional arguments:
   --root ROOT           Location to save files
   --runtime RUNTIME     How long to stream data for
   --verbose VERBOSE     Prints status messages as the stream is running
+  --recorder {none,auto,splice,recv}
+                        none: legacy loop, auto|splice|recv: StreamRecorder,
+                        socket to file without copies
+  --write_behind WRITE_BEHIND
+                        N>0: writer thread with queue depth N, preallocated
+                        files, receive never waits for disk
+  --demux DEMUX         1: demux as it streams, dirfile in root/uut/demux
+  --report REPORT       several uuts: print MB/s every REPORT seconds
 
 
 Some usage examples are included below:
@@ -53,9 +65,20 @@ Some usage examples are included below:
 
     >>> python acq400_stream.py --verbose=1 --filesize=9999M --runtime=5 <module ip or name>
 
+5: As 1, at full link rate, os.splice() socket to file on Linux:
+
+
+    >>> python acq400_stream.py --recorder=auto --filesize=1M --totaldata=4M <module ip or name>
+
+6: Record a rack of uuts concurrently for 60 seconds, report every 5 seconds:
+
+
+    >>> python acq400_stream.py --filesize=16M --runtime=60 --report=5 <uut1> <uut2> <uut3>
+
 """
 
 import acq400_hapi
+from acq400_hapi import stream_recorder
 import numpy as np
 import os
 import time
@@ -73,6 +96,8 @@ def make_data_dir(directory, verbose):
 
 
 def run_stream(args):
+    if args.recorder != "none" or len(args.uuts) > 1 or args.write_behind or args.demux:
+        return stream_recorder.run_recorder(args)
     RXBUF_LEN = 4096
     cycle = 1
     root = args.root + args.uuts[0] + "/" + "{:06d}".format(cycle)
@@ -102,7 +127,7 @@ def run_stream(args):
 
         while time.time() < (start_time + args.runtime) and data_length < args.totaldata:
             rxbuf = RXBUF_LEN if bytestogo > RXBUF_LEN else bytestogo
-            loop_time = time.clock()
+            loop_time = time.time()
             data += skt.recv(rxbuf)
             bytestogo = args.filesize - len(data)
 
@@ -147,12 +172,13 @@ def run_main():
     #parser.add_argument('--filesize', default=1048576, type=int,
     #                    help="Size of file to store in KB. If filesize > total data then no data will be stored.")
     parser.add_argument('-filesize', '--filesize', default=0x100000, action=acq400_hapi.intSIAction, decimal=False)
-    parser.add_argument('-totaldata', '--totaldata', default=sys.maxint, action=acq400_hapi.intSIAction, decimal = False)
+    parser.add_argument('-totaldata', '--totaldata', default=sys.maxsize, action=acq400_hapi.intSIAction, decimal = False)
     #parser.add_argument('--totaldata', default=4194304, type=int, help="Total amount of data to store in KB")
     parser.add_argument('--root', default="", type=str, help="Location to save files. Default dir is UUT name.")
     parser.add_argument('--runtime', default=1000000, type=int, help="How long to stream data for")
     parser.add_argument('--verbose', default=0, type=int, help='Prints status messages as the stream is running')
-    parser.add_argument('uuts', nargs='+', help="uuts")
+    stream_recorder.add_recorder_args(parser)
+    parser.add_argument('uuts', nargs='+', help="uuts, several uuts are recorded concurrently by MultiStreamRecorder")
 
     run_stream(parser.parse_args())
 
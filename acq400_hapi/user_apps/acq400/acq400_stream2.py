@@ -11,24 +11,15 @@ Something like:
     >>> plt.show()
 
 usage::
-    acq400_stream.py [-h] [--filesize FILESIZE] [--totaldata TOTALDATA]
+    acq400_stream2.py [-h] [--filesize FILESIZE] [--totaldata TOTALDATA]
                         [--root ROOT] [--runtime RUNTIME] [--verbose VERBOSE]
+                        [--recorder {none,auto,splice,recv}]
+                        [--write_behind WRITE_BEHIND] [--demux DEMUX]
+                        [--report REPORT]
                         uuts [uuts ...]
 
-acq400 stream
-
-positional arguments:
-  uuts                  uuts
-
-optional arguments:
-  -h, --help            show this help message and exit
-  --filesize FILESIZE   Size of file to store in KB. If filesize > total data
-                        then no data will be stored.
-  --totaldata TOTALDATA
-                        Total amount of data to store in KB
-  --root ROOT           Location to save files
-  --runtime RUNTIME     How long to stream data for
-  --verbose VERBOSE     Prints status messages as the stream is running
+The options are as acq400_stream.py, which see. acq400_stream2.py also
+offers to delete stale data in root/uut before it starts.
 
 
 Some usage examples are included below:
@@ -57,6 +48,7 @@ Some usage examples are included below:
 
 
 import acq400_hapi
+from acq400_hapi import stream_recorder
 import os
 import time
 import argparse
@@ -67,12 +59,13 @@ from builtins import input
 
 
 def remove_stale_data(args):
-    if os.path.exists(args.root + args.uuts[0]):
-        answer = input("Stale data detected. Delete all contents in " + args.root + str(args.uuts[0]) + "? y/n ")
-        if answer == "y":
-            shutil.rmtree(args.root + args.uuts[0])
-        else:
-            pass
+    for uut in args.uuts:
+        if os.path.exists(args.root + uut):
+            answer = input("Stale data detected. Delete all contents in " + args.root + str(uut) + "? y/n ")
+            if answer == "y":
+                shutil.rmtree(args.root + uut)
+            else:
+                pass
 
 
 def make_data_dir(directory, verbose):
@@ -86,6 +79,8 @@ def make_data_dir(directory, verbose):
 
 def run_stream(args):
     remove_stale_data(args)
+    if args.recorder != "none" or len(args.uuts) > 1 or args.write_behind or args.demux:
+        return stream_recorder.run_recorder(args)
     data_len_so_far = 0
     RXBUF_LEN = 4096
     cycle = 1
@@ -140,7 +135,8 @@ def run_main():
     parser.add_argument('--root', default="", type=str, help="Location to save files. Default dir is UUT name.")
     parser.add_argument('--runtime', default=sys.maxsize, type=int, help="How long to stream data for")
     parser.add_argument('--verbose', default=0, type=int, help='Prints status messages as the stream is running')
-    parser.add_argument('uuts', nargs='+', help="uuts")
+    stream_recorder.add_recorder_args(parser)
+    parser.add_argument('uuts', nargs='+', help="uuts, several uuts are recorded concurrently by MultiStreamRecorder")
     run_stream(parser.parse_args())
 
 
@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+
+"""
+Holds the one stream connection to a UUT and republishes it to many local clients.
+
+The UUT serves port 4210 to one client, this lets a plotter, a QA checker and
+an archiver all see the live stream. Each client reads a plain stream, as
+from the UUT.
+
+usage::
+    acq400_stream_fanout.py [-h] [--listen LISTEN] [--nchan NCHAN]
+                            [--data32 DATA32] [--blocksize BLOCKSIZE]
+                            [--report REPORT]
+                            uut
+
+positional arguments:
+  uut                   uut
+
+optional arguments:
+  -h, --help            show this help message and exit
+  --listen LISTEN       unix:PATH[,opts] or tcp:[HOST:]PORT[,opts], repeat
+                        for more. opts: decimate=N
+                        policy=drop-oldest|block|decimate depth=N, default
+                        policy drop-oldest: a slow client loses data, it
+                        never stalls the others. block: lossless, for an
+                        archive, a slow client stalls all
+  --nchan NCHAN         channels per sample, for decimate, default: from the uut
+  --data32 DATA32       1: 32 bit data, default: from the uut
+  --blocksize BLOCKSIZE
+                        bytes per block
+  --report REPORT       print per client MB/s every REPORT seconds
+
+example::
+
+    acq400_stream_fanout.py --listen tcp:4210,policy=block \\
+        --listen unix:/tmp/acq2106_001.plot,decimate=100 acq2106_001
+
+    acq400_stream2.py --root /data/ localhost            # full rate archive
+    socat - UNIX-CONNECT:/tmp/acq2106_001.plot | plotter  # decimated preview
+"""
+
+import argparse
+import acq400_hapi
+
+
+def run_fanout(args):
+    if args.listen == None:
+        args.listen = ["tcp:127.0.0.1:4210"]
+    decimate = [spec for spec in args.listen if "decimate=" in spec]
+    if decimate and (args.nchan == 0 or args.data32 == None):
+        uut = acq400_hapi.Acq400(args.uut, monitor=False)
+        if args.data32 == None:
+            args.data32 = int(uut.s0.data32)
+        if args.nchan == 0:
+            try:
+                args.nchan = int(uut.s0.ssb) // (4 if args.data32 else 2)
+            except AttributeError:
+                args.nchan = int(uut.s0.NCHAN)
+    fan = acq400_hapi.StreamFanout(args.uut, args.listen, nchan=args.nchan or None,
+                                   data_size=4 if args.data32 else 2, blocksize=args.blocksize)
+    print(fan.run(report=args.report))
+
+
+def run_main():
+    parser = argparse.ArgumentParser(description='acq400 stream fanout')
+    parser.add_argument('--listen', action='append',
+                        help="unix:PATH[,opts] or tcp:[HOST:]PORT[,opts], repeat for more. "
+                             "opts: decimate=N policy=drop-oldest|block|decimate depth=N, "
+                             "default policy drop-oldest: a slow client loses data, it never stalls the others, "
+                             "block: lossless, for an archive, a slow client stalls all")
+    parser.add_argument('--nchan', default=0, type=int, help="channels per sample, for decimate, default: from the uut")
+    parser.add_argument('--data32', default=None, type=int, help="1: 32 bit data, default: from the uut")
+    parser.add_argument('--blocksize', default=0x100000, action=acq400_hapi.intSIAction, decimal=False,
+                        help="bytes per block")
+    parser.add_argument('--report', default=0, type=float, help="print per client MB/s every REPORT seconds")
+    parser.add_argument('uut', help="uut")
+    run_fanout(parser.parse_args())
+
+
+if __name__ == '__main__':
+    run_main()
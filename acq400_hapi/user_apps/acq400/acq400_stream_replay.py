@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+
+"""
+Serves a stream port from recorded files or synthetic ramps, no UUT needed.
+
+Use it to run and time the stream consumers (acq400_stream*.py, the MDSplus
+devices, host_demux.py) on any Linux box.
+
+usage::
+    acq400_stream_replay.py [-h] [--root ROOT] [--nchan NCHAN] [--data32 DATA32]
+                            [--totaldata TOTALDATA] [--rate RATE] [--loop LOOP]
+                            [--host HOST] [--port PORT] [--nclients NCLIENTS]
+
+optional arguments:
+  -h, --help            show this help message and exit
+  --root ROOT           uut directory of a recording, root/CCCCCC/NNNN,
+                        default: synthetic ramps
+  --nchan NCHAN         ramps: channels per sample
+  --data32 DATA32       ramps: 1: 32 bit data
+  --totaldata TOTALDATA
+                        ramps: bytes to serve
+  --rate RATE           bytes/s, 0: max
+  --loop LOOP           recording: 1: repeat
+  --host HOST           listen address
+  --port PORT           listen port
+  --nclients NCLIENTS   exit after NCLIENTS, 0: serve forever
+
+example::
+
+    acq400_stream_replay.py --nchan=32 --totaldata=4000M --rate=200M &
+    acq400_stream2.py --recorder=auto --filesize=16M localhost
+"""
+
+import argparse
+import sys
+import acq400_hapi
+
+
+def run_replay(args):
+    if args.root:
+        source = acq400_hapi.FileSource(args.root, loop=args.loop)
+    else:
+        source = acq400_hapi.RampSource(args.nchan, data_size=4 if args.data32 else 2, totaldata=args.totaldata)
+    replay = acq400_hapi.StreamReplay(source, port=args.port, host=args.host, rate=args.rate)
+    # report each client served
+    replay.trace = max(replay.trace, 1)
+    print("{} listening".format(replay))
+    try:
+        replay.serve(args.nclients)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        replay.close()
+
+
+def run_main():
+    parser = argparse.ArgumentParser(description='acq400 stream replay')
+    parser.add_argument('--root', default=None, help="uut directory of a recording, root/CCCCCC/NNNN, default: synthetic ramps")
+    parser.add_argument('--nchan', default=32, type=int, help="ramps: channels per sample")
+    parser.add_argument('--data32', default=0, type=int, help="ramps: 1: 32 bit data")
+    parser.add_argument('--totaldata', default=sys.maxsize, action=acq400_hapi.intSIAction, decimal=False,
+                        help="ramps: bytes to serve")
+    parser.add_argument('--rate', default=0, action=acq400_hapi.intSIAction, help="bytes/s, 0: max")
+    parser.add_argument('--loop', default=0, type=int, help="recording: 1: repeat")
+    parser.add_argument('--host', default="127.0.0.1", help="listen address")
+    parser.add_argument('--port', default=acq400_hapi.AcqPorts.STREAM, type=int, help="listen port")
+    parser.add_argument('--nclients', default=0, type=int, help="exit after NCLIENTS, 0: serve forever")
+    run_replay(parser.parse_args())
+
+
+if __name__ == '__main__':
+    run_main()
@@ -0,0 +1,70 @@
+#!/usr/bin/env python
+
+"""
+Runs one or more emulated UUTs on local addresses, no hardware needed.
+
+Each emulator serves the site services, the status port, the channel data
+ports and the stream port, so the usual clients run unmodified, see
+acq400_hapi/uut_emulator.py.
+
+usage::
+    acq400_uut_emulator.py [-h] [--profile PROFILE] [--dump_profile DUMP_PROFILE]
+                           [--speed SPEED] [--stream_rate STREAM_RATE]
+                           [hosts [hosts ...]]
+
+positional arguments:
+  hosts                 listen addresses, one uut each, default: 127.0.0.1
+
+optional arguments:
+  -h, --help            show this help message and exit
+  --profile PROFILE     JSON knob profile, default: acq2106 with one acq424
+  --dump_profile DUMP_PROFILE
+                        write the default profile to DUMP_PROFILE and exit
+  --speed SPEED         shot time scale, 10: shots run 10x faster
+  --stream_rate STREAM_RATE
+                        stream port bytes/s, 0: max
+
+example::
+
+    acq400_uut_emulator.py --speed=10 127.0.0.2 127.0.0.3 &
+    acq400_upload.py --save_data=DATA --trace_upload=1 127.0.0.2 127.0.0.3
+"""
+
+import argparse
+import json
+import time
+import acq400_hapi
+
+
+def run_emulators(args):
+    if args.dump_profile:
+        with open(args.dump_profile, "w") as fp:
+            json.dump(acq400_hapi.uut_emulator.DEFAULT_PROFILE, fp, indent=4, sort_keys=True)
+        return
+    emus = [acq400_hapi.UutEmulator(profile=args.profile, host=host, speed=args.speed,
+                                    stream_rate=args.stream_rate) for host in args.hosts]
+    for emu in emus:
+        emu.start()
+        print("{} listening".format(emu))
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for emu in emus:
+            emu.stop()
+
+
+def run_main():
+    parser = argparse.ArgumentParser(description='acq400 uut emulator')
+    parser.add_argument('--profile', default=None, help="JSON knob profile, default: acq2106 with one acq424")
+    parser.add_argument('--dump_profile', default=None, help="write the default profile to DUMP_PROFILE and exit")
+    parser.add_argument('--speed', default=1.0, type=float, help="shot time scale, 10: shots run 10x faster")
+    parser.add_argument('--stream_rate', default=0, action=acq400_hapi.intSIAction, help="stream port bytes/s, 0: max")
+    parser.add_argument('hosts', nargs='*', default=["127.0.0.1"], help="listen addresses, one uut each, default: 127.0.0.1")
+    run_emulators(parser.parse_args())
+
+
+if __name__ == '__main__':
+    run_main()
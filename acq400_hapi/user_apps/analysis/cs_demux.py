@@ -20,6 +20,11 @@ python .\cs_demux.py --plot_facets=4 --data_file="C:/acq2106_112/000001/0000"
 import numpy as np
 import matplotlib.pyplot as plt
 import argparse
+import acq400_hapi
+
+
+SAMPLE = acq400_hapi.SampleLayout.parse("CH:i2*4,INDEX:i4,FACET:i4,SAMPLE:i4,usec:i4")
+ES_LONGS = 24
 
 
 def find_zero_index(args):
@@ -29,57 +34,34 @@ def find_zero_index(args):
     # than the former. If the values do not increment then go to the next
     # event sample and repeat.
 
-    data = np.fromfile(args.data_file, dtype=np.uint32)
-    for long_pos, long_val in enumerate(data):
-        long = format(long_val, '08x')
-        if long_val == 0xaa55f154:
-            # Check current index
-            first_es_position = long_pos
-            break
-
-    # loop over all the event samples. Look at the "index" value before and
-    # after and check they have incremented.
-    counter = 0
-    for pos, f_long_in_es in enumerate(data):
-        if pos < first_es_position:
-            continue
-        if counter % (args.transient_length*6 + 24) == 0:
-            counter += 1
-            if data[pos - 3] + 1 == data[pos + 27]:
-                zero_index_long_pos = pos
-                return zero_index_long_pos
-        else:
-            counter += 1
-            continue
+    data = np.memmap(args.data_file, dtype=np.uint32, mode='r')
+    es = np.flatnonzero(data == 0xaa55f154)
+    if len(es) == 0:
+        return None
+
+    # every event sample position from the first, check the "index" value
+    # before and after has incremented.
+    period = args.transient_length*SAMPLE.sample_bytes//4 + ES_LONGS
+    pos = np.arange(es[0], len(data) - 27, period)
+    pos = pos[pos >= 3]
+    good = pos[data[pos - 3] + 1 == data[pos + 27]]
+    return good[0] if len(good) else None
 
 
 def demux_data(args, zero_index):
-    # Demuxes the data into a single dimension list that contains the data in
-    # sequence.
-    data = []
-    count = 0
-
-    with open(args.data_file, "rb") as f:
-        # throw away all data before the "zeroth" index (the first es)
-        chunk = np.fromfile(f, dtype=np.int32, count=int(zero_index))
-        while len(chunk) != 0: # if chunk size is zero we have run out of data
-
-            #throw away es
-            if count % args.transient_length == 0:
-                chunk = np.fromfile(f, dtype=np.int32, count=24) # strip es
-
-            # collect data into a new list
-            chunk = np.fromfile(f, dtype=np.int16, count=4)
-            data.extend(chunk)
-            chunk = np.fromfile(f, dtype=np.int32, count=4)
-            data.extend(chunk)
-            count += 1
-        f.close() # close file when all the data has been loaded.
-    return data
+    # Demuxes the data from the zeroth index, event samples stripped, to an
+    # array of samples, SAMPLE fields.
+    # one event sample, then transient_length samples, repeated
+    period = np.dtype([("es", "<i4", (ES_LONGS,)), ("samples", SAMPLE.dtype, (args.transient_length,))])
+    raw = np.memmap(args.data_file, dtype=np.uint8, mode='r', offset=int(zero_index)*4)
+    nper = len(raw) // period.itemsize
+    data = np.frombuffer(raw, dtype=period, count=nper)["samples"].reshape(-1)
+    tail = raw[nper*period.itemsize + ES_LONGS*4:]
+    return np.concatenate((data, SAMPLE.view(tail)))
 
 
 def save_data(args, data):
-    np.tofile("test_file", data)
+    data.tofile("test_file")
     return None
 
 
@@ -97,19 +79,16 @@ def plot_data(args, data):
     "usec Count",
     "Samples"]
 
+    columns = [ data["CH"][:,ch] for ch in range(4) ] + [ data[f] for f in ("INDEX", "FACET", "SAMPLE", "usec") ]
     f, plots = plt.subplots(8, 1)
     plots[0].set_title(axes[0])
 
     for sp in range(0,8):
         if args.plot_facets != -1:
-            try:
-                # Plot ((number of facets) * (rtm len)) - 1 from each channel
-                plots[sp].plot(data[sp:args.plot_facets * args.transient_length * 8 - 1:8])
-            except:
-                print "Data exception met. Plotting all data instead."
-                plots[sp].plot(data[sp:-1:8])
+            # Plot (number of facets) * (rtm len) from each channel
+            plots[sp].plot(columns[sp][:args.plot_facets * args.transient_length])
         else:
-            plots[sp].plot(data[sp:-1:8])
+            plots[sp].plot(columns[sp])
 
         plots[sp].set(ylabel=axes[sp+1], xlabel=axes[-1])
     plt.show()
@@ -130,7 +109,7 @@ def run_main():
     # system value index increments over the event sample.
     zero_index = find_zero_index(args)
 
-    # data = long list of CH01, CH02, CH03, CH04, INDEX, FACET, USEC
+    # data = samples, fields CH (CH01..CH04), INDEX, FACET, SAMPLE, usec
     data = demux_data(args, zero_index)
     if args.plot == 1:
         plot_data(args, data)
@@ -84,12 +84,11 @@ def show_transitions(args):
 
 
 
-def make_shorts(args, shorts):
-    args.shorts = np.reshape(shorts, (len(shorts)//args.SAMPLE_SIZE_SHORTS, args.SAMPLE_SIZE_SHORTS))[:,0:args.SHORTCOLS]
-
-def make_longs(args, longs):
-#    args.longs = np.reshape(longs, (len(longs)/args.SAMPLE_SIZE_LONGS, args.SAMPLE_SIZE_LONGS))[:,args.SHORTCOLS/2:]
-    args.longs = np.reshape(longs, (len(longs)//args.SAMPLE_SIZE_LONGS, args.SAMPLE_SIZE_LONGS))
+def make_views(args, raw):
+    # zero-copy: shorts (nsam, SHORTCOLS), longs (nsam, SAMPLE_SIZE_LONGS), the whole sample as longs
+    args.data = args.layout.view(raw)
+    args.shorts = args.data["CH"]
+    args.longs = args.layout.words(raw, np.uint32)
 
 def uut_file_print(fn):
     # event-012-1567350364-2048-2047.dat
@@ -102,11 +101,8 @@ def uut_file_print(fn):
 def load_data(args):
     uut_file_print(args.data_file)
 
-    with open(args.data_file, "rb") as bf:
-        args.raw = bf.read()
-
-    make_shorts(args, np.frombuffer(args.raw, dtype=np.int16))
-    make_longs(args, np.frombuffer(args.raw, dtype=np.uint32))
+    args.raw = np.memmap(args.data_file, dtype=np.uint8, mode='r')
+    make_views(args, args.raw)
 
 def uut_get_next(args, uut):
     port = acq400_hapi.AcqPorts.MULTI_EVENT_DISK if args.get_stick == 1 else acq400_hapi.AcqPorts.MULTI_EVENT_TMP
@@ -116,8 +112,7 @@ def uut_get_next(args, uut):
     args.data_file=os.path.basename(raw[:args.SAMPLE_SIZE_LONGS].tobytes()).strip()
     uut_file_print(args.data_file)
     args.raw = raw[args.SAMPLE_SIZE_LONGS:]
-    make_longs(args, args.raw)
-    make_shorts(args, np.frombuffer(args.raw.tobytes(), dtype=np.int16))
+    make_views(args, args.raw)
 
 def uut_get_oneshot(args, uut):
     client = acq400_hapi.ChannelClient(uut.uut, 0)
@@ -128,8 +123,7 @@ def uut_get_oneshot(args, uut):
     args.data_file='event-1-9999-4000000-1000000.dat'
     uut_file_print(args.data_file)
     args.raw = raw[args.SAMPLE_SIZE_LONGS:]
-    make_longs(args, args.raw)
-#    make_shorts(args, np.frombuffer(args.raw.tobytes(), dtype=np.int16))
+    make_views(args, args.raw)
    
 def run_main():
     parser = argparse.ArgumentParser(description='cs demux')
@@ -146,9 +140,9 @@ def run_main():
 
     args = parser.parse_args()
     args.SAMPLE_SIZE = int(args.SHORTCOLS*2 + args.LONGCOLS*4)
-    args.SAMPLE_SIZE_SHORTS = int(args.SHORTCOLS + 2*args.LONGCOLS)
     args.SAMPLE_SIZE_LONGS = int(args.SHORTCOLS//2 + args.LONGCOLS)
     args.L0 = int(args.SHORTCOLS//2)
+    args.layout = acq400_hapi.SampleLayout([("CH", "i2", args.SHORTCOLS), ("LW", "u4", args.LONGCOLS)])
     args.fn = "save_file"
     args.uut = None
     first_time = True
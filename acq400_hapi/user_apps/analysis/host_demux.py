@@ -3,7 +3,9 @@
 """ host_demux.py Demux Data on HOST Computer
 
   - data is stored locally, either from mgtdram/ftp or fiber-optic AFHBA404
-  - channelize the data
+  - channelize the data, out of core: each raw file is memory mapped and
+    demuxed a chunk at a time to per channel files (acq400_hapi.demux_files),
+    memory use does not grow with the capture size
   - optionally store file-per-channel
   - optionally plot in pykst
   - @@todo store to MDSplus as segments.
@@ -28,6 +30,9 @@ example usage::
         # plot egu (V vs s), specify interval, plot 4 cycles, plot 2 channels
         # uut
 
+    ./host_demux.py --nchan=32 --save=DATA --pchan=none --jobs=8 acq2106_067
+        # demux with 8 processes, each writes its own sample range of every channel file
+
     use of --src
         --src=/data                     # valid for FTP upload data
         --src=/data/ACQ400DATA/1 	# valid for SFP data, port 1
@@ -84,7 +89,8 @@ import numpy as np
 import os
 import re
 import argparse
-import subprocess
+import shutil
+import tempfile
 import acq400_hapi
 import time
 import matplotlib.pyplot as plt
@@ -102,20 +108,6 @@ def channel_required(args, ch):
 #    print("channel_required {} {}".format(ch, 'in' if ch in args.pc_list else 'out', args.pc_list))
     return args.save != None or args.double_up or ch in args.pc_list
 
-def create_npdata(args, nblk, nchn):
-    channels = []
-
-    for counter in range(nchn):
-       if channel_required(args, counter):
-           channels.append(np.zeros((nblk*args.NSAM), dtype=args.np_data_type))
-
-       else:
-           channels.append(np.zeros(16, dtype=args.np_data_type))
-    # print "length of data = ", len(total_data)
-    # print "npdata = ", npdata
-    return channels
-
-
 def make_cycle_list(args):
     if args.cycle == None:
         cyclist = os.listdir(args.uutroot)
@@ -161,104 +153,94 @@ def get_file_names(args):
 
     return fnlist
 
-def read_data(args, NCHAN):
-    # global NSAM
-    data_files = get_file_names(args)
-    for n, f in enumerate(data_files):
-        print(f)
-    if NCHAN % 3 == 0:
-        print("collect in groups of 3 to keep alignment")
-        GROUP = 3
+def get_saveroot(args):
+    if os.name == "nt": # if system is windows.
+        path = r'{}:\\demuxed\{}'.format(args.drive_letter, args.uut[0]) # raw string literal so we can use \ in path.
+        args.saveroot = path # set args.saveroot to windows style dir.
+    return args.saveroot
+
+def demux_direct(args):
+    # no reshuffle after demux: demux straight to the save directory
+    return args.save != None and not args.double_up and not args.stack_480
+
+def demux_files(args, NCHAN, data_files):
+    """demux data_files to per channel files, out of core.
+
+    Returns channel list, np.memmap on the demuxed file for a required
+    channel, else a short dummy.
+    """
+    channels = [ ch+1 for ch in range(NCHAN) if channel_required(args, ch) ]
+    total = sum([os.path.getsize(f) for f in data_files])
+    if demux_direct(args):
+        root = get_saveroot(args)
     else:
-        GROUP = 1
-
-
-    if args.NSAM == 0:
-        args.NSAM = GROUP*os.path.getsize(data_files[0])/args.WSIZE/NCHAN
-        print("NSAM set {}".format(args.NSAM))
-
-    NBLK = len(data_files)
-    if args.nblks > 0 and NBLK > args.nblks:
-        NBLK = args.nblks
-        data_files = [ data_files[i] for i in range(0,NBLK) ]
-
-    print("NBLK {} NBLK/GROUP {} NCHAN {}".format(NBLK, NBLK/GROUP, NCHAN))
-
-    raw_channels = create_npdata(args, NBLK/GROUP, NCHAN)
-    blocks = 0
-    i0 = 0
-    iblock = 0
-    for blknum, blkfile in enumerate(data_files):
-        if blocks >= NBLK:
-            break
-        if blkfile != "analysis.py" and blkfile != "root":
-
-            print blkfile, blknum
-            # concatenate 3 blocks to ensure modulo 3 channel align
-            if iblock == 0:
-                data = np.fromfile(blkfile, dtype=args.np_data_type)
-            else:
-                data = np.append(data, np.fromfile(blkfile, dtype=args.np_data_type))
-
-
-
-            iblock += 1
-            if iblock < GROUP:
-                continue
-
-            i1 = i0 + args.NSAM
-            for ch in range(NCHAN):
-                if channel_required(args, ch):
-                    raw_channels[ch][i0:i1] = (data[ch::NCHAN])
-                # print x
-            i0 = i1
-            blocks += 1
-            iblock = 0
-
-    print "length of data = ", len(raw_channels)
-    print "length of data[0] = ", len(raw_channels[0])
-    print "length of data[1] = ", len(raw_channels[1])
+        root = tempfile.mkdtemp(prefix="host_demux")
+        args.tmproot = root
+    t0 = time.time()
+    if args.jobs > 1:
+        nsam, stats = acq400_hapi.demux_files_parallel(data_files, root, args.uut[0], NCHAN, data_size=args.WSIZE,
+                                                       channels=channels, jobs=args.jobs)
+        for wid in sorted([k for k in stats if k != "aggregate"]):
+            st = stats[wid]
+            print("worker {} pid {} samples {}..{} {:.2f} s {:.1f} MB/s".format(
+                  wid, st["pid"], st["s0"], st["s1"], st["seconds"], st["bytes"]/1000000/max(st["seconds"], 1e-9)))
+        nbytes = stats["aggregate"]["bytes"]
+        path = lambda ch: "{}/{}_{:02d}.dat".format(root, args.uut[0], ch)
+    else:
+        dm = acq400_hapi.StreamDemux(root, args.uut[0], NCHAN, data_size=args.WSIZE, channels=channels,
+                                     nsam_hint=total//(NCHAN*args.WSIZE))
+        nbytes = acq400_hapi.demux_files(data_files, dm, verbose=args.verbose)
+        nsam = dm.close()
+        path = dm.path
+    tt = time.time() - t0
+    print("demux {} files {} bytes {} samples in {:.2f} s {:.1f} MB/s".format(
+          len(data_files), nbytes, nsam, tt, nbytes/1000000/max(tt, 1e-9)))
+    if demux_direct(args):
+        print("data saved to directory: {}".format(root))
+
+    raw_channels = [ np.zeros(16, dtype=args.np_data_type) for ch in range(NCHAN) ]
+    for ch in channels:
+        if nsam > 0:
+            raw_channels[ch-1] = np.memmap(path(ch), dtype=args.np_data_type, mode='r', shape=(nsam,))
+        else:
+            raw_channels[ch-1] = np.zeros(0, dtype=args.np_data_type)
     return raw_channels
 
-def read_data_file(args, NCHAN):
-    # NCHAN = args.nchan
-    data = np.fromfile(args.src, dtype=args.np_data_type)
-
-    nsam = len(data)/NCHAN
-    raw_channels = create_npdata(args, nsam, NCHAN)
-    for ch in range(NCHAN):
-        if channel_required(args, ch):
-            raw_channels[ch] = data[ch::NCHAN]
+def read_data(args, NCHAN):
+    data_files = get_file_names(args)
+    if args.verbose:
+        for n, f in enumerate(data_files):
+            print(f)
+    if args.nblks > 0 and len(data_files) > args.nblks:
+        data_files = data_files[:args.nblks]
+    # samples split across files (eg NCHAN % 3 == 0) are carried over by the demux
+    print("NBLK {} NCHAN {}".format(len(data_files), NCHAN))
+    return demux_files(args, NCHAN, data_files)
 
-    return raw_channels
+def read_data_file(args, NCHAN):
+    return demux_files(args, NCHAN, [args.src])
 
 def save_data(args, raw_channels):
-
-    if os.name == "nt": # if system is windows.
-        path = r'{}:\\demuxed\{}'.format(args.drive_letter, args.uut[0]) # raw string literal so we can use \ in path.
-        if not os.path.exists(path):
-            os.makedirs(path)
-        args.saveroot = path # set args.saveroot to windows style dir.
-
-    else:
-        subprocess.call(["mkdir", "-p", args.saveroot])
+    saveroot = get_saveroot(args)
+    if not os.path.exists(saveroot):
+        os.makedirs(saveroot)
 
     uutname = args.uut[0]
     for enum, channel in enumerate(raw_channels):
-        data_file = open("{}/{}_{:02d}.dat".format(args.saveroot, uutname, enum+1), "wb+")
-        channel.tofile(data_file, '')
+        with open("{}/{}_{:02d}.dat".format(saveroot, uutname, enum+1), "wb+") as data_file:
+            channel.tofile(data_file, '')
 
-    print "data saved to directory: {}".format(args.saveroot)
-    with open("{}/format".format(args.saveroot), 'w') as fmt:
+    print("data saved to directory: {}".format(saveroot))
+    with open("{}/format".format(saveroot), 'w') as fmt:
         fmt.write("# dirfile format file for {}\n".format(uutname))
         for enum, channel in enumerate(raw_channels):
-            fmt.write("{}_{:02d}.dat RAW s 1\n".format(uutname, enum+1))
+            fmt.write("{}_{:02d}.dat RAW {} 1\n".format(uutname, enum+1, 'S' if args.WSIZE == 4 else 's'))
 
     return raw_channels
 
 
 def plot_mpl(args, raw_channels):
-    print "Plotting with MatPlotLib. Subrate = {}".format(args.mpl_subrate)
+    print("Plotting with MatPlotLib. Subrate = {}".format(args.mpl_subrate))
     #real_len = len(raw_channels[0]) # this is the real length of the channel data
     num_of_ch = len(args.pc_list)
     f, plots = plt.subplots(num_of_ch, 1)
@@ -273,8 +255,8 @@ def plot_data_kst(args, raw_channels):
     llen = len(raw_channels[0])
     if args.egu == 1:
         if args.xdt == 0:
-            print "WARNING ##### NO CLOCK RATE PROVIDED. TIME SCALE measured by system."
-            raw_input("Please press enter if you want to continue with innacurate time base.")
+            print("WARNING ##### NO CLOCK RATE PROVIDED. TIME SCALE measured by system.")
+            input("Please press enter if you want to continue with innacurate time base.")
             time1 = float(args.the_uut.s0.SIG_CLK_S1_FREQ.split(" ")[-1])
             xdata = np.linspace(0, llen/time1, num=llen)
         else:
@@ -352,20 +334,25 @@ def process_data(args):
     NCHAN = args.nchan
     if args.double_up:
         NCHAN = args.nchan * 2
-        print "nchan = ", args.nchan
+        print("nchan = ", args.nchan)
 
+    args.tmproot = None
     raw_data = read_data(args, NCHAN) if not os.path.isfile(args.src) else read_data_file(args, NCHAN)
+    try:
+        if args.double_up:
+            raw_data = double_up(args, raw_data)
 
-    if args.double_up:
-	       raw_data = double_up(args, raw_data)
-
-    if args.stack_480:
-        raw_data = stack_480_shuffle(args, raw_data)
+        if args.stack_480:
+            raw_data = stack_480_shuffle(args, raw_data)
 
-    if args.save != None:
-        save_data(args, raw_data)
-    if len(args.pc_list) > 0:
-        plot_data(args, raw_data)
+        if args.save != None and not demux_direct(args):
+            save_data(args, raw_data)
+        if len(args.pc_list) > 0:
+            plot_data(args, raw_data)
+    finally:
+        if args.tmproot != None:
+            raw_data = None
+            shutil.rmtree(args.tmproot)
 
 def make_pc_list(args):
     # ch in 1.. (human)
@@ -428,11 +415,12 @@ def run_main():
     parser.add_argument('--mpl_end', type=int, default=-1, help='Control number of samples to plot with mpl.')
     parser.add_argument('--stack_480', type=str, default=None, help='Stack : 2x4, 2x8, 4x8, 6x8')
     parser.add_argument('--drive_letter', type=str, default="D", help="Which drive letter to use when on windows.")
+    parser.add_argument('--verbose', type=int, default=0, help='1: list files as they are demuxed')
+    parser.add_argument('--jobs', type=int, default=1, help='demux with a pool of JOBS processes, each a contiguous sample range')
     parser.add_argument('uut', nargs=1, help='uut')
     args = parser.parse_args()
     calc_stack_480(args)
     args.WSIZE = 2
-    args.NSAM = 0
     if args.data_type == 16:
         args.np_data_type = np.int16
         args.WSIZE = 2
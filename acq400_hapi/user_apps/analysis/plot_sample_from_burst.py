@@ -21,30 +21,24 @@ nc acq1001_343 4210 | pv > burst32-50Hz-512-3.bin
 import numpy as np
 import matplotlib.pyplot as plt
 import argparse
+import acq400_hapi
+from acq400_hapi import event_sample
 
 def raw2volts(xx):
-    return float(xx/256 * 10.0 / 0x1000000)
+    return xx/256 * 10.0 / 0x1000000
 
 def plot_data(args):
     fname = args.data[0]
-    # int32's are easier for math, uint's easier for ES detect.
-    # wasting memory keeping a copy, but, memory is cheap..
-    rawi = np.fromfile(fname, dtype=np.int32)
-    rawu = np.fromfile(fname, dtype=np.uint32)
-    ll = len(rawi)/args.nchan
-    lltrunc = ll * args.nchan
-    chxi = np.reshape(rawi[0:lltrunc], (ll, args.nchan))
-    chxu = np.reshape(rawu[0:lltrunc], (ll, args.nchan))
-    # extract the first sample in each burst. Approx ll/rtm_translen, ll is safe ..
-    chx = np.zeros((args.nchan, ll))
-    ss = 0
-    for ii in range(0, ll):
-        if chxu[ii][0] == 0xaa55f154 and chxu[ii][1] == 0xaa55f154:
-            for cc in range(0, args.nchan):
-                chx[cc][ss] = raw2volts(chxi[ii+1][cc])
-            ss += 1
-            if ss < 10:
-                print("{}, {}".format(ii, raw2volts(chxi[ii+1][0])))
+    # uint's for ES detect, int32's for the data, both views on the one memmap
+    samples = event_sample.as_samples(fname, args.nchan)
+    bursts = acq400_hapi.Bursts.from_samples(samples, sites=(0, 1))     # magic in the first two longs
+    # extract the first sample in each burst: the sample after the ES
+    first = bursts.table["es"] + 1
+    first = first[first < len(samples)]
+    chx = raw2volts(samples[first].view(np.int32).T)
+    ss = len(first)
+    for ii in range(min(ss, 10)):
+        print("{}, {}".format(first[ii]-1, chx[0][ii]))
 
     print("number of samples: {}".format(ss))
     plt.plot(chx[0][0:ss])
@@ -86,97 +86,40 @@ def get_src_names(root):
    
     return src_names
 
-def get_esi(chx):
-# calculate ES indices. Only look at ch2 on all boxes   
+def get_bursts(raw):
+# calculate ES indices. Only look at ch2 on all boxes, the count is on ch1
 # remember the ES is double width..
-    esn = len(chx)/8
-    esi = [ [] for ii in range(esn)]     # index
-    esc = [ [] for ii in range(esn)]     # count (ich+1)
- 
-    if VERBOSE:
-        print("sanity check, check we are looking at real data, rows with 2857759060 are es, rest is data32")
-        for ii in range(5):
-            print("{} {}".format(ii, [chx[ic][ii] for ic in range(len(chx))]))
- 
-    for ich, ch in enumerate(chx):
-#        print("ich {} len(chx) {}".format(ich, len(chx)))
-        if ich%8 == 1:
-            print("scanning ES on ich {}".format(ich))
-            for ii in range(0, len(ch)):
-                if ch[ii] == 0xaa55f154:
-#                    print("es at {}".format(ii))
-#                    if ich == 1:
-#                        print("es detail at {} {} {}".format(ich, ii, [chx[ic][ii] for ic in range(0,32,8)]))
-                # esi in shorts
-                    esi[ich/8].append(ii*2)
-                    esc[ich/8].append(chx[ich-1][ii])
-   
-    print("esi lengths {}".format([len(esi[ii]) for ii in range(0, len(esi))]))
-    
+    print("scanning ES on ich {}".format(list(range(1, len(raw), 8))))
+    bursts = acq400_hapi.Bursts.from_channels(raw[1::8], raw[0::8], verbose=1)
+
     if VERBOSE:
-        for ii, es in enumerate(esi):
-            deltac = [ es[jj]-esi[0][jj] for jj in range(esn) ]
-            deltas = [ es[jj] - es[jj-1] for jj in range(1, esn)]
-            print("difference between channels ii {} max {}".format(ii, max(deltac)))
-            print("difference between bursts ii {} min {} max {}".format(ii, min(deltas), max(deltas)))
-        
-    errors = 0  
-    print("scanning embedded counts..")
-    for icount in range(len(esc[0])):
-        cv = [esc[ic][icount] for ic in range(esn)]
-        if icount < 5:
-            print("ic {} {}".format(icount, cv))
-        if min(cv) != max(cv):
-            print("ERROR: count discrepancy at {} {}".format(icount, cv))
-            errors += 1
-        
-    print("scanned {}*{} counts, errors {}".format(esn, icount, errors))
-         
-              
-    lmin = len(esi[0])
-    truncate = False
-    
-    for ll in [ len(esi[ii]) for ii in range(1, len(esi))]:
-        if ll != lmin:
-            lmin = min(ll, lmin)
-            print("WARNING: burst count mismatch, min is {}".format(lmin))
-            truncate = True
+        print("sanity check, first bursts {}".format(bursts.table[:5]))
+        print("difference between bursts min {} max {}".format(bursts.blen, bursts.table["length"][:-1].max()))
 
-    bmin = esi[0][1] - esi[0][0]
-    
-    for bl in [ esi[0][ii]-esi[0][ii-1] for ii in range(2,len(esi))]:
-        if bl != bmin:
-            bmin = min(bl, bmin)
-            print("WARNING bmin set {}".format(bmin))
-    print("get_esi returns nbursts {} blen {} ".format(lmin, bmin))
-    return lmin, bmin, esi
+    print("scanned {}*{} counts, errors {}".format(len(raw[1::8]), len(bursts), bursts.errors))
+    if bursts.period == None:
+        print("WARNING bursts are not regular, blen set {}".format(bursts.blen))
+    print("get_bursts returns nbursts {} blen {} ".format(len(bursts), bursts.blen))
+    return bursts
 
 FRONTPORCH = 30
 
 def get_data(args):
     srcs = get_src_names(args.root)
-    nchan = len(srcs)
-    raw = [ np.fromfile("{}/{}".format(args.root, srcs[ii]), dtype=np.int16) for ii in range(0, nchan)]
-    nbursts, blen, esi = get_esi([ np.fromfile("{}/{}".format(args.root, srcs[ii]), dtype=np.uint32) for ii in range(0,nchan)])
-    chx = np.zeros((nchan, nbursts, blen+FRONTPORCH))
-    esi0 = esi[0]
-    
-    print("chx 01 3 dimension {}",len(chx[0,0]))
-    try:
-        for ic in range(nchan):
-            for ib in range(nbursts-2):
-                chx[ic, ib ] = raw[ic][esi0[ib]+2:esi0[ib]+2+blen+FRONTPORCH]
-
-    except IndexError as ie:
-        print("IndexError {} ic {} ib {} ii {}".format(ie, ic, ib, ii))
-              
-    print("chx 99 3 dimension {}",len(chx[0,0]))                
+    raw = [ np.memmap("{}/{}".format(args.root, src), dtype=np.int16, mode='r') for src in srcs ]
+    bursts = get_bursts(raw)
+    # one (nburst, blen) view per channel, no copy. Each burst runs FRONTPORCH into the next ES
+    blen = bursts.blen + bursts.width + FRONTPORCH
+    chx = [ bursts.view(ch, blen) for ch in raw ]
+    nbursts = min([ len(ch) for ch in chx ])
+    chx = [ ch[:nbursts] for ch in chx ]
+    print("chx {} channels {} bursts {} samples".format(len(chx), nbursts, blen))
     return chx
 
 VALUE_ERRORS = 0
 
 def fix_args(chx, args):
-    args.nburst = len(chx[0,:,0]) - VALUE_ERRORS
+    args.nburst = len(chx[0]) - VALUE_ERRORS
     bursts = range(0, args.nburst)
     if args.burst_list:
         ubursts = eval('('+args.burst_list+', )')
@@ -192,10 +135,10 @@ def fix_args(chx, args):
     args.bursts = bursts
 
 def plot_data(chx, args):
-    nchan = len(chx[:,0,0])
+    nchan = len(chx)
     bursts = args.bursts
 
-    blen = min(len(chx[0,0,:]), args.maxlen)
+    blen = min(chx[0].shape[1], args.maxlen)
     plotchan = eval('[' + args.plotchan + ']')
     print(plotchan)
     print("PLOT nchan {} nburst {} blen {}".format(nchan, args.nburst, blen))
@@ -215,7 +158,7 @@ def plot_data(chx, args):
         ich = int(ch)-1
     
         for ib in bursts:
-            plt.plot(chx[ich,ib,:blen]+args.stack_offset*ib, label="B{}".format(ib))
+            plt.plot(chx[ich][ib,:blen].astype(np.int32)+args.stack_offset*ib, label="B{}".format(ib))
             
         if len(bursts) < 9:                
             plt.legend()            
@@ -226,8 +169,8 @@ REBASE_COMP = ( 3, 3, 4, 4, 4, 4, 4, 4)
 REBASE_COMP = ( 3, 4, 3, 5, 3, 5, 3, 5)
 
 def store_chan(chx, args):
-    blen = min(len(chx[0,0,:]), args.maxlen)
-    nchan = len(chx[:,0,0])
+    blen = min(chx[0].shape[1], args.maxlen)
+    nchan = len(chx)
     try:
         os.mkdir(args.store_chan)
     except OSError as e:
@@ -235,30 +178,30 @@ def store_chan(chx, args):
 
     for ch in range(nchan):
         fn = "{}/CH{:02d}.dat".format(args.store_chan, ch+1)
-        chx[ch,args.bursts,:blen].astype('int16').tofile(fn)
+        chx[ch][list(args.bursts),:blen].tofile(fn)
 
 def rebase(chx, ib, ith):
     global VALUE_ERRORS
     nchan = len(chx)
     #print("rebase {}".format(ib))
-    blen =  len(chx[0, ib])
+    blen =  chx[0].shape[1]
     try:
         for ic in range(nchan):
-            ithc = ith - REBASE_COMP[ic/8]
-            chx[ic, ib, 0:blen-ithc] = chx[ic, ib, ithc:]
+            ithc = ith - REBASE_COMP[ic//8]
+            chx[ic][ib, 0:blen-ithc] = chx[ic][ib, ithc:]
     except ValueError as ve:
-        print("Value Error {} {} {} {} {}".format(ve, ic, ib, len(chx[ic,ib]), len(chx[ic,ib,ith:])))
+        print("Value Error {} {} {} {} {}".format(ve, ic, ib, len(chx[ic][ib]), len(chx[ic][ib,ith:])))
         VALUE_ERRORS += 1
             
 def realign_burst(chx, ib, iref):
     #print("realign on {}".format(iref))
-    baseline = np.mean(chx[iref, 0, 0:5])
-    tophat = np.mean(chx[iref, 0, FRONTPORCH:FRONTPORCH+5])
+    baseline = np.mean(chx[iref][0, 0:5])
+    tophat = np.mean(chx[iref][0, FRONTPORCH:FRONTPORCH+5])
     if tophat - baseline > 1000:
         threshold = baseline + (tophat-baseline)/10
         #print("iref {} baseline {} tophat {} th={}".format(iref, baseline, tophat, threshold))
         for ii in range(FRONTPORCH):
-            if chx[iref, ib, ii] > threshold:
+            if chx[iref][ib, ii] > threshold:
                 #print("iref {} ib {}  threshold crossed at {}".format(iref, ib, ii))
                 rebase(chx, ib, ii)
                 break
@@ -266,17 +209,18 @@ def realign_burst(chx, ib, iref):
         print("iref {} ERROR: enough amplitude baseline {} tophat {}".format(iref, baseline, tophat))
         
 def realign(chx, iref):
-    for ib in range(len(chx[0,:])):
+    for ib in range(len(chx[0])):
         realign_burst(chx, ib, iref)
         
 def process_data(args):
     chx = get_data(args)
     if args.alignref != None and args.alignref > 0:
-        # index from zero
+        # index from zero, realign works in place on a copy
+        chx = [ np.array(ch) for ch in chx ]
         realign(chx, args.alignref-1)
     fix_args(chx, args)
     if args.plotchan != '0':
-	plot_data(chx, args)
+        plot_data(chx, args)
     if args.store_chan:
         store_chan(chx, args)
     
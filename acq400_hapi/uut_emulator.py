@@ -0,0 +1,422 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+uut_emulator.py a local acq400 uut, pure Python, for tests and benchmarks
+
+- UutEmulator : serves the uut ports on a local address, so Acq400,
+  ShotController and the upload clients run unmodified without hardware:
+
+  - site services 4220+site : "prompt on", "help", knob get/set, the
+    knobs come from a profile (JSON), DEFAULT_PROFILE is an acq2106 with
+    one 32 channel acq424
+  - status 2235 : "STATE PRE POST ELAPSED 0 0" lines, a shot state machine
+    driven by set_arm, soft_trigger, set_abort and the transient knob
+  - channel data 53000+ch : the last shot, synthetic ramps, 53000: muxed
+  - stream 4210 : ramps, see stream_replay.RampSource
+  - awg 54201, 54202 : a sink, counts the bytes, replies DONE at end of file
+
+- eg, one emulator per loopback address::
+
+       with UutEmulator(host="127.0.0.2") as emu:
+           uut = acq400_hapi.Acq400("127.0.0.2")
+           uut.configure_post("master", post=100000)
+           ShotController([uut]).run_shot(soft_trigger=True)
+           chx = uut.read_channels()
+
+- start_process() runs one in a child process, for benchmarks.
+
+channel ch (1..NCHAN), sample n is (n + 256*(ch-1)) & 0xffff, 32 bit data
+left justified, the same samples as RampSource serves on 4210.
+"""
+
+import copy
+import json
+import multiprocessing
+import os
+import socket
+import sys
+import threading
+import time
+
+import numpy as np
+
+try:
+    from queue import Queue, Empty
+except ImportError:
+    from Queue import Queue, Empty
+
+from .acq400 import AcqPorts, STATE
+from .stream_replay import RampSource, StreamReplay
+
+
+DEFAULT_PROFILE = {
+    "sample_rate": 1000000,
+    "sites": {
+        "0": {
+            "MODEL": "acq2106", "HN": "acq2106_emu", "software_version": "uut_emulator",
+            "SITELIST": "500,1=acq424", "NCHAN": "32", "data32": "0", "ssb": "64",
+            "state": "0 0 0 0 0 0",
+            "aggregator": "threshold=16384 sites=1 on", "spad": "0,0,0",
+            "transient": "PRE=0 POST=100000 SOFT_TRIGGER=1",
+            "set_arm": "0", "set_abort": "0", "soft_trigger": "0",
+            "SIG_EVENT_SRC_0": "0", "SIG_ZCLK_SRC": "INT33M", "SYS_CLK_FPMUX": "ZCLK",
+            "SIG_CLK_MB_FIN": "33333000", "SIG_CLK_MB_SET": "1000000",
+            "SYS_CLK_OE_CLK1_ZYNQ": "1", "SIG_SRC_TRG_0": "EXT", "SIG_SRC_TRG_1": "STRIG",
+        },
+        "1": {
+            "MODEL": "ACQ424ELF-32", "module_name": "acq424elf", "NCHAN": "32", "data32": "0",
+            "shot": "0", "simulate": "0", "clkdiv": "1",
+            "TRG": "1", "TRG_DX": "1", "TRG_SENSE": "1",
+            "EVENT0": "0", "EVENT0_DX": "0", "EVENT0_SENSE": "0",
+            "RGM": "0", "RGM_DX": "0", "RGM_SENSE": "0",
+            "AI:CAL:ESLO": "0 0 0 " + " ".join(["0.000305"] * 32),
+            "AI:CAL:EOFF": "0 0 0 " + " ".join(["0"] * 32),
+        },
+    },
+}
+
+
+def ramp(ch, n0, nsam, data_size):
+    """samples n0..n0+nsam of channel index ch, from 0"""
+    x = (np.arange(n0, n0+nsam) + 256*ch) & 0xffff
+    if data_size == 4:
+        return (x.astype(np.uint32) << 16).view(np.int32)
+    return x.astype(np.uint16).view(np.int16)
+
+
+class UutEmulator:
+    """emulates one uut on a local address.
+
+    Args:
+        profile (dict|str) : knobs per site, or a JSON file, default DEFAULT_PROFILE
+
+        host (str) : listen address, use 127.0.0.N for several uuts
+
+        speed (float) : shot time scale, 10: shots run 10x faster than sample_rate
+
+        stream_rate (float) : 4210 bytes/s, 0: max
+    """
+    trace = int(os.getenv("UUT_EMULATOR_TRACE", "0"))
+    status_period = 0.5
+
+    def __init__(self, profile=None, host="127.0.0.1", speed=1.0, stream_rate=0):
+        if profile == None:
+            profile = DEFAULT_PROFILE
+        elif not isinstance(profile, dict):
+            with open(profile) as fp:
+                profile = json.load(fp)
+        self.profile = copy.deepcopy(profile)
+        self.knobs = dict((int(site), knobs) for site, knobs in self.profile["sites"].items())
+        self.host = host
+        self.speed = speed
+        self.stream_rate = stream_rate
+        self.sample_rate = float(self.profile.get("sample_rate", 1000000))
+        self.lock = threading.Lock()
+        self.status = [0, 0, 0, 0, 0, 0]
+        self.status_clients = []
+        self.trigger = threading.Event()
+        self.abort = threading.Event()
+        self.shot_thread = None
+        self.nsam = 0
+        self.awg_bytes = 0
+        self.chan_cache = {}
+        self.listeners = []
+        self.stream = None
+        self.commands = 0
+        self.quit = False
+
+    def __repr__(self):
+        return "UutEmulator(%s)" % (self.host)
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def nchan(self):
+        return int(self.knobs[0].get("NCHAN", "32"))
+
+    def data_size(self):
+        return 4 if self.knobs[0].get("data32", "0") == "1" else 2
+
+    # site service
+
+    def command(self, site, line):
+        """execute one command line on site, returns the reply"""
+        knobs = self.knobs[site]
+        if line == "help":
+            return "\n".join(sorted(knobs))
+        for sep in ("=", " "):
+            if sep in line:
+                key, value = [x.strip() for x in line.split(sep, 1)]
+                if key not in knobs:
+                    return "ERROR: %s not found" % (key)
+                with self.lock:
+                    knobs[key] = value
+                self.action(site, key, value)
+                return ""
+        if line == "state" and site == 0:
+            with self.lock:
+                return " ".join([str(x) for x in self.status])
+        if line not in knobs:
+            return "ERROR: %s not found" % (line)
+        return knobs[line]
+
+    def action(self, site, key, value):
+        if site != 0:
+            return
+        if key == "set_arm" and value != "0":
+            self.arm()
+        elif key == "soft_trigger" and value != "0":
+            self.trigger.set()
+        elif key == "set_abort" and value != "0":
+            self.abort.set()
+            self.trigger.set()
+
+    def site_handler(self, conn, site):
+        prompt = False
+        count = 0
+        fp = conn.makefile("rb")
+        for raw in fp:
+            line = raw.decode("latin-1").strip()
+            if not line:
+                continue
+            if line == "prompt on":
+                prompt = True
+                rx = ""
+            elif line == "prompt off":
+                prompt = False
+                rx = ""
+            else:
+                rx = self.command(site, line)
+            self.commands += 1
+            count += 1
+            if self.trace:
+                print("%s s%d >%s <%s" % (repr(self), site, line, rx[:60]))
+            if prompt:
+                reply = "%s\nacq400.%d %d >" % (rx, site, count) if rx else "\nacq400.%d %d >" % (site, count)
+            else:
+                reply = rx + "\n" if rx else ""
+            if reply:
+                conn.sendall(reply.encode("latin-1"))
+
+    # status and shot state machine
+
+    def set_status(self, state, pre, post, elapsed):
+        with self.lock:
+            self.status = [state, pre, post, elapsed, 0, 0]
+            for q in self.status_clients:
+                q.put(list(self.status))
+
+    def status_handler(self, conn, site):
+        """every status change, in order, and a repeat each status_period"""
+        q = Queue()
+        with self.lock:
+            self.status_clients.append(q)
+            status = list(self.status)
+        try:
+            while not self.quit:
+                conn.sendall((" ".join([str(x) for x in status]) + "\r\n").encode())
+                try:
+                    status = q.get(timeout=self.status_period)
+                except Empty:
+                    pass
+        finally:
+            with self.lock:
+                self.status_clients.remove(q)
+
+    def transient(self):
+        """returns (pre, post, soft) from the transient knob"""
+        fields = dict(f.split("=", 1) for f in self.knobs[0].get("transient", "").split() if "=" in f)
+        return (int(fields.get("PRE", 0)), int(fields.get("POST", 100000)), int(fields.get("SOFT_TRIGGER", 1)))
+
+    def run_for(self, state, nsam, pre, post, n0):
+        """advance elapsed by nsam at the sample rate, False on abort"""
+        t0 = time.time()
+        duration = nsam / self.sample_rate / self.speed
+        done = 0
+        while done < nsam:
+            if self.abort.wait(min(0.1, max(duration, 0.001))):
+                return False
+            done = min(nsam, int((time.time() - t0) / duration * nsam) if duration else nsam)
+            if state == STATE.RUNPRE:
+                self.set_status(state, done, 0, n0+done)
+            else:
+                self.set_status(state, pre, done, n0+done)
+        return True
+
+    def shot(self):
+        pre, post, soft = self.transient()
+        self.trigger.clear()
+        self.abort.clear()
+        self.set_status(STATE.ARM, 0, 0, 0)
+        time.sleep(0.05)
+        ok = True
+        if pre:
+            ok = self.run_for(STATE.RUNPRE, pre, pre, post, 0)
+        if ok and not soft:
+            self.trigger.wait()
+            ok = not self.abort.is_set()
+        if ok:
+            ok = self.run_for(STATE.RUNPOST, post, pre, post, pre)
+        if ok:
+            self.set_status(STATE.POPROCESS, pre, post, pre+post)
+            time.sleep(0.05)
+            self.nsam = pre + post
+            if "shot" in self.knobs.get(1, {}):
+                with self.lock:
+                    self.knobs[1]["shot"] = str(int(self.knobs[1]["shot"]) + 1)
+            self.set_status(STATE.IDLE, pre, post, pre+post)
+        else:
+            self.set_status(STATE.IDLE, 0, 0, 0)
+        if self.trace:
+            print("%s shot %s nsam %d" % (repr(self), "done" if ok else "aborted", self.nsam))
+
+    def arm(self):
+        if self.shot_thread != None and self.shot_thread.is_alive():
+            print("%s set_arm: busy" % (repr(self)))
+            return
+        self.shot_thread = threading.Thread(target=self.shot)
+        self.shot_thread.daemon = True
+        self.shot_thread.start()
+
+    # data
+
+    def chan_data(self, ch, nsam):
+        """channel ch of the last shot, cached so the port serves at socket speed"""
+        cache = self.chan_cache
+        if cache.get("nsam") != nsam:
+            cache = self.chan_cache = { "nsam": nsam }
+        if ch not in cache:
+            cache[ch] = ramp(ch-1, 0, nsam, self.data_size()).tobytes()
+        return cache[ch]
+
+    def data_handler(self, conn, ch):
+        nsam = self.nsam
+        if ch != 0:
+            conn.sendall(self.chan_data(ch, nsam))
+            return
+        data_size = self.data_size()
+        nchan = self.nchan()
+        step = 0x100000 // max(nchan, 1)
+        for n0 in range(0, nsam, step):
+            n = min(step, nsam - n0)
+            block = np.stack([ramp(c, n0, n, data_size) for c in range(nchan)], axis=1)
+            conn.sendall(memoryview(np.ascontiguousarray(block)).cast('B'))
+
+    def awg_handler(self, conn, port):
+        nbytes = 0
+        buf = bytearray(0x100000)
+        while True:
+            n = conn.recv_into(buf)
+            if n == 0:
+                break
+            nbytes += n
+        self.awg_bytes = nbytes
+        conn.sendall(b"DONE\n")
+
+    # servers
+
+    def listen(self, port, handler, arg):
+        lsock = socket.socket()
+        lsock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        lsock.bind((self.host, port))
+        lsock.listen(16)
+        self.listeners.append(lsock)
+
+        def serve(conn):
+            try:
+                handler(conn, arg)
+            except (OSError, IOError):
+                pass
+            finally:
+                conn.close()
+
+        def accept_loop():
+            while not self.quit:
+                try:
+                    conn, peer = lsock.accept()
+                except (OSError, IOError):
+                    return
+                conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                thread = threading.Thread(target=serve, args=(conn,))
+                thread.daemon = True
+                thread.start()
+
+        thread = threading.Thread(target=accept_loop)
+        thread.daemon = True
+        thread.start()
+
+    def serve_stream(self):
+        try:
+            self.stream.serve()
+        except (OSError, IOError):
+            pass                    # stopped
+
+    def start(self):
+        for site in self.knobs:
+            self.listen(AcqPorts.SITE0+site, self.site_handler, site)
+        self.listen(AcqPorts.TSTAT, self.status_handler, 0)
+        for ch in range(0, self.nchan()+1):
+            self.listen(AcqPorts.DATA0+ch, self.data_handler, ch)
+        for port in (AcqPorts.AWG_ONCE, AcqPorts.AWG_AUTOREARM):
+            self.listen(port, self.awg_handler, port)
+        self.stream = StreamReplay(RampSource(self.nchan(), self.data_size()), port=AcqPorts.STREAM,
+                                   host=self.host, rate=self.stream_rate)
+        self.listeners.append(self.stream.lsock)
+        thread = threading.Thread(target=self.serve_stream)
+        thread.daemon = True
+        thread.start()
+        if self.trace:
+            print("%s started, %d ports" % (repr(self), len(self.listeners)))
+
+    def stop(self):
+        self.quit = True
+        self.abort.set()
+        self.trigger.set()
+        for lsock in self.listeners:
+            try:
+                lsock.shutdown(socket.SHUT_RDWR)
+            except (OSError, IOError):
+                pass
+            lsock.close()
+        self.listeners = []
+
+    def serve_forever(self):
+        self.start()
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.stop()
+
+
+def run_emulator(host, profile, speed, stream_rate):
+    sys.stdout = open(os.devnull, "w")
+    UutEmulator(profile=profile, host=host, speed=speed, stream_rate=stream_rate).serve_forever()
+
+
+def start_process(host, profile=None, speed=1.0, stream_rate=0, timeout=10):
+    """run a UutEmulator in a child process, out of the way of a client
+    being measured. Returns when the site 0 port accepts.
+
+    Returns:
+        multiprocessing.Process, terminate() to stop
+    """
+    proc = multiprocessing.Process(target=run_emulator, args=(host, profile, speed, stream_rate))
+    proc.daemon = True
+    proc.start()
+    t0 = time.time()
+    while True:
+        try:
+            socket.create_connection((host, AcqPorts.SITE0), timeout=1).close()
+            return proc
+        except (OSError, IOError):
+            if time.time() - t0 > timeout or not proc.is_alive():
+                proc.terminate()
+                raise
+            time.sleep(0.05)
@@ -0,0 +1,60 @@
+"""ShotController.read_channels connection limits, with fake uuts, no hardware."""
+
+import threading
+import time
+
+import numpy as np
+
+from acq400_hapi import Acq400, ShotController
+
+
+class FakeUut:
+    """just enough Acq400 for Acq400.read_channels(), read_chan() records concurrency"""
+    read_channels = Acq400.read_channels
+    trace = 0
+    save_data = None
+
+    class Site:
+        data32 = 0
+
+    def __init__(self, name, max_inflight=1, nchan=4):
+        self.uut = name
+        self.s0 = FakeUut.Site()
+        self.max_inflight = max_inflight
+        self._nchan = nchan
+        self.lock = threading.Lock()
+        self.active = 0
+        self.peak = 0
+
+    def nchan(self):
+        return self._nchan
+
+    def read_chan(self, ch, nsam=0, data32=None):
+        with self.lock:
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+        time.sleep(0.02)
+        with self.lock:
+            self.active -= 1
+        return np.full(8, ch, dtype=np.int16)
+
+
+def test_default_serial_per_uut():
+    uuts = [FakeUut("uut%d" % i) for i in range(3)]
+    chx, nuut, nchan, nsam = ShotController(uuts).read_channels()
+    assert (nuut, nchan, nsam) == (3, 4, 8)
+    assert [u.peak for u in uuts] == [1, 1, 1]
+    assert [list(c[0] for c in cx) for cx in chx] == [[1, 2, 3, 4]] * 3
+
+
+def test_default_own_max_inflight():
+    uuts = [FakeUut("uut0", max_inflight=1), FakeUut("uut1", max_inflight=3)]
+    ShotController(uuts).read_channels()
+    assert uuts[0].peak == 1
+    assert 1 < uuts[1].peak <= 3
+
+
+def test_max_connections_shared():
+    uuts = [FakeUut("uut%d" % i, nchan=8) for i in range(2)]
+    ShotController(uuts).read_channels(max_connections=4)
+    assert all([1 < u.peak <= 2 for u in uuts])